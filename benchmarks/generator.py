@@ -0,0 +1,280 @@
+"""闲鱼搜索结果合成数据生成器
+
+生成与 JsonProcessor.process_items 解析结构一致的 resultList 响应,规模、地区/类别
+分布的倾斜程度和价格分布均可配置,用于基准测试和本地调试:
+
+    python benchmarks/generator.py --items 1000000 --output /tmp/goofish_corpus
+    python benchmarks/generator.py --items 10000000 --workers 8 --output /tmp/goofish_10m
+    python benchmarks/generator.py --items 10000 --format json --location-skew 0
+    python benchmarks/generator.py --items 100000 --relist-rate 0.2 --output /tmp/goofish_relisted
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional
+
+LOCATIONS = [
+    '杭州', '上海', '北京', '深圳', '广州', '成都', '南京', '武汉', '苏州', '西安',
+    '重庆', '天津', '长沙', '郑州', '青岛', '宁波', '厦门', '合肥', '福州', '济南',
+    '昆明', '沈阳', '大连', '无锡', '东莞', '佛山', '南昌', '贵阳', '南宁', '石家庄'
+]
+
+# (类别ID, 淘宝类别ID, 价格中位数, 标题素材)
+CATEGORIES = [
+    ('50025', '1512', 3000.0, ['iPhone 13', 'iPhone 14 Pro', '华为 Mate 60', '小米 14', 'OPPO Find X7']),
+    ('50024', '1101', 4500.0, ['MacBook Air', 'ThinkPad X1', '拯救者 Y9000P', 'Surface Pro', 'iPad Pro']),
+    ('50012', '50012', 300.0, ['耐克 Air Force 1', '阿迪达斯 Samba', 'New Balance 574', '匡威 1970s']),
+    ('50008', '50008', 80.0, ['乐高积木', '泡泡玛特盲盒', '三体全集', '哈利波特原版书']),
+    ('50013', '50013', 1200.0, ['索尼 A7M3 机身', '富士 X100V', '大疆 Mini 3', 'GoPro 12']),
+    ('50020', '50020', 150.0, ['宜家书桌', '人体工学椅', '戴森吹风机', '小米空气净化器']),
+]
+
+CONDITIONS = ['全新未拆封', '99新', '95新', '9成新', '自用', '国行', '成色好', '有划痕', '急出', '可小刀']
+CAPACITIES = ['64G', '128G', '256G', '512G', '1T', '']
+
+
+class SyntheticResponseGenerator:
+    """合成搜索结果响应生成器
+
+    地区和类别按Zipf分布抽样,skew 为0时为均匀分布,越大越集中在前几个取值;
+    价格在类别中位数附近服从对数正态分布。相同 seed 生成相同数据。
+    relist_rate 大于0时,按该比例把最近生成的商品以新的商品ID重新发布:卖家和类别不变,
+    标题稍作修改,价格略降,一半沿用原主图的缩略图地址,用于测试重复商品检测。
+    """
+
+    def __init__(self, seed: int = 42, keywords: Optional[List[str]] = None,
+                 location_skew: float = 1.1, category_skew: float = 0.8,
+                 price_sigma: float = 0.8, sellers: int = 50000, id_offset: int = 0, relist_rate: float = 0.0):
+        """初始化生成器
+
+        Args:
+            seed: 随机数种子
+            keywords: 搜索关键词,每页响应使用其中一个
+            location_skew: 地区分布的Zipf指数
+            category_skew: 类别分布的Zipf指数
+            price_sigma: 价格对数正态分布的sigma
+            sellers: 卖家数量
+            id_offset: 商品ID偏移量,并行生成时保证各分片的ID不重复
+            relist_rate: 重新发布已有商品的比例
+        """
+        self.rng = random.Random(seed)
+        self.keywords = keywords or ['iphone', '笔记本', '球鞋', '相机', '乐高']
+        self.location_weights = self._cumulative_zipf_weights(len(LOCATIONS), location_skew)
+        self.category_weights = self._cumulative_zipf_weights(len(CATEGORIES), category_skew)
+        self.price_sigma = price_sigma
+        self.sellers = sellers
+        self.next_item_id = 700000000000 + id_offset
+        self.relist_rate = relist_rate
+        # 可以被重新发布的最近商品 (类别, 地区, 价格, 卖家ID, 标题, 主图)
+        self._recent = deque(maxlen=10000)
+
+    @staticmethod
+    def _cumulative_zipf_weights(count: int, skew: float) -> List[float]:
+        weights, total = [], 0.0
+        for rank in range(1, count + 1):
+            total += 1.0 / (rank ** skew)
+            weights.append(total)
+        return weights
+
+    def item(self, keyword: str, search_id: str) -> Dict[str, Any]:
+        """生成 resultList 中的单个元素"""
+        rng = self.rng
+        # 随机数的调用顺序与不重新发布时相同,relist_rate 为0时相同 seed 生成的数据不变
+        source = None
+        if self.relist_rate and self._recent and rng.random() < self.relist_rate:
+            source = rng.choice(self._recent)
+        if source is None:
+            category = rng.choices(CATEGORIES, cum_weights=self.category_weights)[0]
+            location = rng.choices(LOCATIONS, cum_weights=self.location_weights)[0]
+            price = round(max(1.0, rng.lognormvariate(0, self.price_sigma) * category[2]), 2)
+        else:
+            category, location, price = source[:3]
+            price = round(max(1.0, price * rng.uniform(0.85, 1.0)), 2)
+        category_id, tb_category_id, _, titles = category
+        original_price = round(price * rng.uniform(1.1, 2.5), 2)
+        seller_id = str(2200000000 + rng.randrange(self.sellers)) if source is None else source[3]
+        item_id = str(self.next_item_id)
+        self.next_item_id += 1
+
+        if source is None:
+            title = ' '.join(part for part in (
+                rng.choice(titles), rng.choice(CAPACITIES), rng.choice(CONDITIONS), rng.choice(CONDITIONS)
+            ) if part)
+        else:
+            title = f'{source[4]} {rng.choice(CONDITIONS)}' if rng.random() < 0.5 else f'{source[4]}!'
+        tags = ['freeship'] if rng.random() < 0.4 else []
+        label_tags = [{'data': {'content': f'{rng.randrange(0, 2000)}条评价'}}]
+        if rng.random() < 0.8:
+            label_tags.append({'data': {'content': f'好评率{rng.randrange(80, 101)}%'}})
+        if source is not None and rng.random() < 0.5:
+            pic_url = f'{source[5]}_300x300.jpg'
+        else:
+            pic_url = f'https://img.alicdn.com/bao/uploaded/i{rng.randrange(4)}/{item_id}.jpg'
+        if self.relist_rate and source is None:
+            self._recent.append((category, location, price, seller_id, title, pic_url))
+
+        return {
+            'data': {
+                'item': {
+                    'main': {
+                        'exContent': {
+                            'itemId': item_id,
+                            'title': title,
+                            'price': [{'text': '¥'}, {'text': f'{price:g}'}],
+                            'oriPrice': f'¥{original_price:.2f}',
+                            'area': location,
+                            'picUrl': pic_url,
+                            'userNickName': f'闲鱼用户{seller_id[-6:]}',
+                            'userAvatarUrl': f'https://gw.alicdn.com/avatar/{seller_id}.jpg',
+                            'userFishShopLabel': {'tagList': label_tags},
+                            'fishTags': {'r3': {'tagList': [
+                                {'data': {'content': f'{rng.randrange(0, 300)}人想要'}}
+                            ]}},
+                            'detailParams': {'itemId': item_id, 'soldPrice': f'{price:g}'},
+                            'richTitle': [{'data': {'text': title}}],
+                        },
+                        'clickParam': {
+                            'args': {
+                                'id': item_id,
+                                'cCatId': category_id,
+                                'tbCatId': tb_category_id,
+                                'item_type': 'item',
+                                'seller_id': seller_id,
+                                'tag': ','.join(tags),
+                                'search_id': search_id,
+                                'biz_type': 'item',
+                                'publishTime': str(1700000000000 + rng.randrange(0, 31536000000)),
+                                'keyword': keyword,
+                            }
+                        },
+                        'targetUrl': f'fleamarket://item?id={item_id}',
+                    }
+                }
+            }
+        }
+
+    def page(self, page_size: int = 30) -> Dict[str, Any]:
+        """生成一页搜索结果响应"""
+        keyword = self.rng.choice(self.keywords)
+        search_id = f'{self.rng.getrandbits(64):016x}'
+        return {
+            'api': 'mtop.taobao.idlemtopsearch.pc.search',
+            'ret': ['SUCCESS::调用成功'],
+            'v': '1.0',
+            'data': {
+                'resultInfo': {
+                    'sqiControlFields': {'userInputOriginalSearchKeywords': keyword},
+                    'searchId': search_id,
+                    'hasNextPage': True,
+                },
+                'resultList': [self.item(keyword, search_id) for _ in range(page_size)],
+            }
+        }
+
+    def iter_pages(self, total_items: int, page_size: int = 30) -> Iterator[Dict[str, Any]]:
+        """逐页生成共 total_items 个商品的响应"""
+        remaining = total_items
+        while remaining > 0:
+            size = min(page_size, remaining)
+            remaining -= size
+            yield self.page(size)
+
+    def write_corpus(self, output_dir: str, total_items: int, page_size: int = 30,
+                     pages_per_file: int = 100, file_format: str = 'jsonl.gz', prefix: str = '') -> List[str]:
+        """将响应写入目录,每次只在内存中保留一页
+
+        Args:
+            output_dir: 输出目录
+            total_items: 商品总数
+            page_size: 每页商品数
+            pages_per_file: JSON-lines格式下每个文件的页数
+            file_format: json(每页一个文件)、jsonl 或 jsonl.gz
+            prefix: 文件名前缀
+
+        Returns:
+            写入的文件路径列表
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        handle = None
+        for index, page in enumerate(self.iter_pages(total_items, page_size)):
+            if file_format == 'json':
+                path = os.path.join(output_dir, f'{prefix}page-{index:07d}.json')
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(page, f, ensure_ascii=False)
+                paths.append(path)
+                continue
+
+            if index % pages_per_file == 0:
+                if handle is not None:
+                    handle.close()
+                path = os.path.join(output_dir, f'{prefix}pages-{index // pages_per_file:05d}.{file_format}')
+                opener = gzip.open if file_format.endswith('.gz') else open
+                handle = opener(path, 'wt', encoding='utf-8')
+                paths.append(path)
+            handle.write(json.dumps(page, ensure_ascii=False))
+            handle.write('\n')
+        if handle is not None:
+            handle.close()
+        return paths
+
+
+def write_shard(shard: int, items: int, output_dir: str, options: Dict[str, Any]) -> List[str]:
+    """在工作进程中生成一个分片,每个分片使用不同的种子和ID区间"""
+    generator = SyntheticResponseGenerator(
+        seed=options['seed'] + shard,
+        location_skew=options['location_skew'],
+        category_skew=options['category_skew'],
+        price_sigma=options['price_sigma'],
+        id_offset=shard * options['items_per_shard'],
+        relist_rate=options['relist_rate']
+    )
+    return generator.write_corpus(output_dir, items, options['page_size'], options['pages_per_file'],
+                                  options['file_format'], prefix=f'shard{shard:03d}-')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10000, help='商品总数')
+    parser.add_argument('--output', default='data/raw/synthetic', help='输出目录')
+    parser.add_argument('--format', dest='file_format', default='jsonl.gz', choices=['json', 'jsonl', 'jsonl.gz'])
+    parser.add_argument('--page-size', type=int, default=30, help='每页商品数')
+    parser.add_argument('--pages-per-file', type=int, default=100, help='JSON-lines文件的页数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--location-skew', type=float, default=1.1, help='地区Zipf指数,0为均匀分布')
+    parser.add_argument('--category-skew', type=float, default=0.8, help='类别Zipf指数,0为均匀分布')
+    parser.add_argument('--price-sigma', type=float, default=0.8, help='价格对数正态分布的sigma')
+    parser.add_argument('--relist-rate', type=float, default=0.0, help='以新商品ID重新发布最近商品的比例')
+    parser.add_argument('--workers', type=int, default=1, help='并行生成的进程数')
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        generator = SyntheticResponseGenerator(
+            seed=args.seed,
+            location_skew=args.location_skew,
+            category_skew=args.category_skew,
+            price_sigma=args.price_sigma,
+            relist_rate=args.relist_rate
+        )
+        paths = generator.write_corpus(args.output, args.items, args.page_size, args.pages_per_file,
+                                       args.file_format)
+    else:
+        items_per_shard = -(-args.items // args.workers)
+        options = dict(vars(args), items_per_shard=items_per_shard)
+        shards = [
+            (shard, min(items_per_shard, args.items - shard * items_per_shard))
+            for shard in range(args.workers)
+            if args.items > shard * items_per_shard
+        ]
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(write_shard, shard, items, args.output, options) for shard, items in shards]
+            paths = [path for future in futures for path in future.result()]
+    print(f'Wrote {args.items} items to {len(paths)} files in {args.output}')
+
+
+if __name__ == '__main__':
+    main()
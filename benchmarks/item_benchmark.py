@@ -0,0 +1,99 @@
+"""商品表示的构造时间与内存占用基准
+
+比较 Item 数据类和 JsonProcessor 实际产出的字段值元组(iter_rows)、字典(iter_items)
+保存同样商品数据时的开销:
+
+    python benchmarks/item_benchmark.py --items 100000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from models.item import Item, ITEM_FIELDS  # noqa: E402
+
+
+def make_rows(count: int):
+    """生成按 ITEM_FIELDS 排列的商品字段值列表"""
+    timestamp = datetime.now().isoformat()
+    return [
+        [
+            str(1000000 + i), f'测试商品 {i}', float(i % 5000), '', f'https://img.example.com/{i}.jpg',
+            timestamp, timestamp, 1700000000000 + i, '50025', '50026', 'normal', str(i % 997),
+            f'卖家{i % 997}', f'https://img.example.com/avatar/{i % 997}.jpg', None, i % 300, '98%',
+            str(i % 50), i % 2 == 0, f'https://img.example.com/{i}.jpg', '杭州', '1999.00',
+            float(i % 5000), 'iphone', 'search', 'normal'
+        ]
+        for i in range(count)
+    ]
+
+
+def build_items(rows):
+    """原有处理流程:创建 Item,调用 update,再转换为字典,保留 Item 对象"""
+    items = []
+    for row in rows:
+        values = dict(zip(ITEM_FIELDS, row))
+        item = Item(item_id=values.pop('item_id'), title=values.pop('title'), price=values.pop('price'))
+        values.pop('created_at')
+        values.pop('updated_at')
+        item.update(**values)
+        items.append(item)
+    return items
+
+
+def build_dicts(rows):
+    """原有处理流程的输出:每个商品一个字典"""
+    return [build_items([row])[0].to_dict() for row in rows]
+
+
+def build_rows(rows):
+    """JsonProcessor.iter_rows 的输出:每个商品一个字段值元组"""
+    return [tuple(row) for row in rows]
+
+
+def build_row_dicts(rows):
+    """JsonProcessor.iter_items 的输出:由字段值直接构造字典"""
+    return [dict(zip(ITEM_FIELDS, row)) for row in rows]
+
+
+def measure(name, builder, rows):
+    """返回构造耗时和构造结果占用的内存"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = builder(rows)
+    seconds = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {
+        'name': name,
+        'seconds': seconds,
+        'bytes_per_item': current / len(rows),
+        'us_per_item': seconds / len(rows) * 1e6
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100000, help='商品数量')
+    args = parser.parse_args()
+
+    rows = make_rows(args.items)
+    results = [
+        measure('Item', build_items, rows),
+        measure('Item.to_dict', build_dicts, rows),
+        measure('iter_rows', build_rows, rows),
+        measure('iter_items', build_row_dicts, rows)
+    ]
+
+    print(f"{'representation':<16}{'us/item':>10}{'bytes/item':>12}")
+    for result in results:
+        print(f"{result['name']:<16}{result['us_per_item']:>10.2f}{result['bytes_per_item']:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
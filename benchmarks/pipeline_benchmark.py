@@ -0,0 +1,258 @@
+"""ingest → store → analyze → plot 全流程基准测试
+
+对 main.main() 中的每个阶段分别计时并记录 tracemalloc 峰值内存,结果保存为JSON,
+可以与之前的运行结果对比:
+
+    python benchmarks/pipeline_benchmark.py --items 100000 --output bench/run.json
+    python benchmarks/pipeline_benchmark.py --corpus /tmp/goofish_corpus --mongo-uri mongodb://localhost:27017/
+    python benchmarks/pipeline_benchmark.py --items 100000 --compare bench/run.json
+
+不指定 --corpus 时先用 generator.py 在临时目录生成数据;不指定 --mongo-uri 时跳过
+insert_many 阶段(或使用 --mongomock 在内存中模拟)。
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
+
+import matplotlib  # noqa: E402
+
+matplotlib.use('Agg')
+
+from loguru import logger  # noqa: E402
+
+from generator import SyntheticResponseGenerator  # noqa: E402
+from data import codec  # noqa: E402
+from data.processor import JsonProcessor, JSON_LINES_SUFFIXES  # noqa: E402
+from data.parallel import ParallelParser  # noqa: E402
+from analysis.analyzer import DataAnalyzer  # noqa: E402
+from visualization.visualizer import DataVisualizer  # noqa: E402
+
+
+class StageRecorder:
+    """按阶段累计耗时和峰值内存"""
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        """记录一次阶段执行,同名阶段多次执行时耗时累加、峰值取最大
+
+        产出该阶段的记录字典,调用方可以在阶段内累加 items 等计数。
+        """
+        record = self.stages.setdefault(name, {'seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0,
+                                               'items': 0, 'peak_bytes': 0})
+        record['items'] += items
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            cpu_seconds = time.process_time() - cpu_start
+            peak = tracemalloc.get_traced_memory()[1] - baseline if self.trace_memory else None
+            record['seconds'] += seconds
+            record['cpu_seconds'] += cpu_seconds
+            record['calls'] += 1
+            if peak is not None:
+                record['peak_bytes'] = max(record['peak_bytes'], peak)
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        for record in self.stages.values():
+            record['items_per_second'] = record['items'] / record['seconds'] if record['seconds'] and record['items'] else None
+        return self.stages
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _read_payloads(file_path) -> List[bytes]:
+    """读取文件中每个文档的原始字节"""
+    with JsonProcessor._open_raw_file(file_path) as f:
+        if file_path.name.endswith(JSON_LINES_SUFFIXES):
+            return [line for line in (line.strip() for line in f) if line]
+        return [f.read()]
+
+
+def run(args) -> Dict[str, Any]:
+    recorder = StageRecorder(trace_memory=not args.no_tracemalloc)
+    workdir = tempfile.mkdtemp(prefix='goofish-bench-')
+
+    corpus = args.corpus
+    if corpus is None:
+        corpus = os.path.join(workdir, 'raw')
+        generator = SyntheticResponseGenerator(seed=args.seed, location_skew=args.location_skew,
+                                               category_skew=args.category_skew)
+        with recorder.stage('generate', args.items):
+            generator.write_corpus(corpus, args.items, file_format='json')
+
+    # 读取和解析
+    items = []
+    for file_path in JsonProcessor.iter_raw_files(corpus):
+        with recorder.stage('read_json_file') as record:
+            documents = list(JsonProcessor.iter_documents(file_path))
+            record['bytes'] = record.get('bytes', 0) + os.path.getsize(file_path)
+        for data in documents:
+            with recorder.stage('process_items') as record:
+                processed = JsonProcessor.process_items(data)
+                record['items'] += len(processed)
+            items.extend(processed)
+        del documents
+
+    # 各JSON后端的解码速度,lazy 只解码提取商品需要的部分(只有支持部分解码的后端才单独测量)
+    payloads = [payload for file_path in JsonProcessor.iter_raw_files(corpus) for payload in _read_payloads(file_path)]
+    payload_bytes = sum(len(payload) for payload in payloads)
+    for backend in args.json_backends:
+        json_codec = codec.get_codec(backend)
+        partial = type(json_codec).loads_search_result is not codec.JsonCodec.loads_search_result
+        for lazy in ((False, True) if partial else (False,)):
+            loads = json_codec.loads_search_result if lazy else json_codec.loads
+            with recorder.stage(f"decode({json_codec.name}{', lazy' if lazy else ''})") as record:
+                for payload in payloads:
+                    record['items'] += len(JsonProcessor.process_items(loads(payload)))
+                record['bytes'] = payload_bytes
+    del payloads
+
+    # 并行解析的扩展性
+    for workers in args.parallel_workers:
+        with recorder.stage(f'ParallelParser(workers={workers})') as record:
+            for result in ParallelParser(workers).iter_results(corpus):
+                record['items'] += len(result.items)
+
+    # 写入MongoDB
+    if args.mongo_uri or args.mongomock:
+        from database.mongodb import MongoDB
+
+        client = None
+        if args.mongomock:
+            import mongomock
+
+            client = mongomock.MongoClient()
+        collection_name = f"benchmark_{datetime.now():%Y%m%d%H%M%S}"
+        db = MongoDB(args.mongo_uri or '', 'goofish_benchmark', collection_name, client=client)
+        try:
+            documents = [dict(item) for item in items]
+            with recorder.stage('insert_many', len(documents)):
+                db.insert_many(documents)
+            del documents
+        finally:
+            db.collection.drop()
+            db.close()
+
+    # 数据分析
+    with recorder.stage('DataAnalyzer.__init__', len(items)):
+        analyzer = DataAnalyzer(items)
+    for method in ('basic_statistics', 'price_distribution', 'location_analysis'):
+        with recorder.stage(f'DataAnalyzer.{method}', len(items)):
+            getattr(analyzer, method)()
+    with recorder.stage('DataAnalyzer.chart_summaries', len(items)):
+        summaries = analyzer.chart_summaries()
+
+    # 数据可视化,与分析器共用同一个DataFrame
+    output_dir = os.path.join(workdir, 'output')
+    with recorder.stage('DataVisualizer.from_analyzer', len(items)):
+        visualizer = DataVisualizer.from_analyzer(analyzer, output_dir)
+    del analyzer
+    for method in ('plot_price_distribution', 'plot_location_distribution',
+                   'plot_category_distribution', 'plot_price_by_location'):
+        with recorder.stage(f'DataVisualizer.{method}', len(items)):
+            getattr(visualizer, method)()
+
+    # 基于汇总数据绘图
+    summary_visualizer = DataVisualizer.from_summaries(summaries, os.path.join(output_dir, 'summaries'))
+    for method in ('plot_price_distribution', 'plot_location_distribution',
+                   'plot_category_distribution', 'plot_price_by_location'):
+        with recorder.stage(f'DataVisualizer.{method}(summaries)'):
+            getattr(summary_visualizer, method)()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'items': len(items),
+            'corpus': corpus,
+            'tracemalloc': not args.no_tracemalloc,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        },
+        'stages': recorder.results()
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """打印与基线结果的对比"""
+    print(f"{'stage':<44}{'baseline s':>12}{'current s':>12}{'ratio':>8}")
+    for name, record in current['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None or not base.get('seconds'):
+            continue
+        ratio = record['seconds'] / base['seconds']
+        print(f"{name:<44}{base['seconds']:>12.4f}{record['seconds']:>12.4f}{ratio:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10000, help='生成的商品数量')
+    parser.add_argument('--corpus', help='已有的原始数据目录或glob,指定后不再生成数据')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--location-skew', type=float, default=1.1)
+    parser.add_argument('--category-skew', type=float, default=0.8)
+    parser.add_argument('--mongo-uri', help='用于 insert_many 阶段的MongoDB地址')
+    parser.add_argument('--mongomock', action='store_true', help='使用mongomock执行 insert_many 阶段')
+    parser.add_argument('--parallel-workers', type=lambda value: [int(v) for v in value.split(',')], default=[],
+                        help='逗号分隔的进程数列表,例如 1,2,4,8,分别测量 ParallelParser 的吞吐量')
+    parser.add_argument('--json-backends', type=lambda value: value.split(','),
+                        default=[name for name, (_, available) in codec.BACKENDS.items() if available()],
+                        help='逗号分隔的JSON后端列表,分别测量解码和提取的吞吐量,默认为全部已安装的后端')
+    parser.add_argument('--no-tracemalloc', action='store_true', help='不记录内存,减少计时干扰')
+    parser.add_argument('--output', help='结果JSON文件路径')
+    parser.add_argument('--compare', help='用于对比的基线结果JSON文件')
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    result = run(args)
+    print(f"{'stage':<44}{'calls':>8}{'seconds':>12}{'items/s':>14}{'peak MB':>10}")
+    for name, record in result['stages'].items():
+        rate = f"{record['items_per_second']:.0f}" if record.get('items_per_second') else '-'
+        peak = f"{record['peak_bytes'] / 1e6:.1f}" if result['meta']['tracemalloc'] else '-'
+        print(f"{name:<44}{record['calls']:>8}{record['seconds']:>12.4f}{rate:>14}{peak:>10}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
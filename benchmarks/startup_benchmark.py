@@ -0,0 +1,161 @@
+"""启动耗时基准测试
+
+在新的解释器中用 python -X importtime 导入各个入口模块,记录导入耗时、解释器总耗时
+以及是否加载了 pandas、matplotlib 等重量级依赖,结果保存为JSON,可以与之前的运行结果对比:
+
+    python benchmarks/startup_benchmark.py --output bench/startup.json
+    python benchmarks/startup_benchmark.py --modules main,analysis.analyzer --repeat 10
+    python benchmarks/startup_benchmark.py --compare bench/startup.json
+
+每个模块重复测量 --repeat 次,取中位数。只导入和写入数据的进程只需要 main,
+不应加载 HEAVY_MODULES 中的任何模块。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 默认测量的入口模块
+DEFAULT_MODULES = ('main', 'cli', 'analysis.analyzer', 'visualization.visualizer')
+
+# 只在分析、绘图和列式存储中用到的依赖
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'seaborn', 'pyarrow')
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """解析 -X importtime 的输出
+
+    Returns:
+        每个被导入模块的 {'module', 'self_us', 'cumulative_us', 'depth'},按导入完成的顺序排列
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        stripped = name.lstrip(' ')
+        records.append({
+            'module': stripped.strip(),
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'depth': (len(name) - len(stripped) - 1) // 2
+        })
+    return records
+
+
+def measure(module: str, env: Dict[str, str]) -> Dict[str, Any]:
+    """在新的解释器中导入一次模块
+
+    Returns:
+        导入耗时、解释器总耗时、导入的模块数、加载的重量级依赖和最慢的直接依赖
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True
+    )
+    wall_seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}: {completed.stderr.strip().splitlines()[-1]}")
+
+    records = parse_importtime(completed.stderr)
+    top = next(record for record in reversed(records) if record['module'] == module and record['depth'] == 0)
+    modules = {record['module'] for record in records}
+    children = sorted((record for record in records if record['depth'] == 1 and record['module'] != module),
+                      key=lambda record: record['cumulative_us'], reverse=True)
+    return {
+        'import_seconds': top['cumulative_us'] / 1e6,
+        'wall_seconds': wall_seconds,
+        'modules': len(modules),
+        'heavy_modules': [name for name in HEAVY_MODULES if name in modules],
+        'slowest': [{'module': record['module'], 'seconds': record['cumulative_us'] / 1e6} for record in children[:5]]
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.join(BASE_DIR, 'src'), BASE_DIR] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else [])
+    )
+
+    results = {}
+    for module in args.modules:
+        # 先导入一次生成字节码缓存,之后的测量不包含编译耗时
+        measure(module, env)
+        runs = [measure(module, env) for _ in range(args.repeat)]
+        results[module] = {
+            'import_seconds': statistics.median(run['import_seconds'] for run in runs),
+            'wall_seconds': statistics.median(run['wall_seconds'] for run in runs),
+            'modules': runs[-1]['modules'],
+            'heavy_modules': runs[-1]['heavy_modules'],
+            'slowest': runs[-1]['slowest']
+        }
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat
+        },
+        'modules': results
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """打印与基线结果的对比"""
+    print(f"{'module':<32}{'baseline s':>12}{'current s':>12}{'ratio':>8}")
+    for name, record in current['modules'].items():
+        base = baseline['modules'].get(name)
+        if base is None or not base.get('import_seconds'):
+            continue
+        ratio = record['import_seconds'] / base['import_seconds']
+        print(f"{name:<32}{base['import_seconds']:>12.4f}{record['import_seconds']:>12.4f}{ratio:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', type=lambda value: value.split(','), default=list(DEFAULT_MODULES),
+                        help='逗号分隔的模块列表,默认为 main、cli 以及分析和绘图模块')
+    parser.add_argument('--repeat', type=int, default=5, help='每个模块的测量次数,取中位数')
+    parser.add_argument('--output', help='结果JSON文件路径')
+    parser.add_argument('--compare', help='用于对比的基线结果JSON文件')
+    args = parser.parse_args()
+
+    result = run(args)
+    print(f"{'module':<32}{'import s':>10}{'wall s':>10}{'modules':>9}  heavy dependencies")
+    for name, record in result['modules'].items():
+        heavy = ', '.join(record['heavy_modules']) or '-'
+        print(f"{name:<32}{record['import_seconds']:>10.4f}{record['wall_seconds']:>10.4f}{record['modules']:>9}  {heavy}")
+        for child in record['slowest']:
+            print(f"    {child['module']:<36}{child['seconds']:>10.4f}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
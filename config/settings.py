@@ -12,15 +12,122 @@ MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
 MONGODB_DB = os.getenv('MONGODB_DB', 'goofish_data')
 MONGODB_COLLECTION = os.getenv('MONGODB_COLLECTION', 'search_results')
 
+# 写入配置
+# WRITE_MODE: insert 直接插入所有文档(默认); upsert 按 UPSERT_KEYS 去重写入,需要在集合上创建唯一索引
+WRITE_MODE = os.getenv('WRITE_MODE', 'insert')
+UPSERT_KEYS = tuple(key.strip() for key in os.getenv('UPSERT_KEYS', 'item_id').split(',') if key.strip())
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '1000'))
+# 集合中已有 UPSERT_KEYS 重复的文档(例如之前用 insert 模式写入)时,是否只保留每个键最新的文档后再创建唯一索引
+UPSERT_REMOVE_DUPLICATES = os.getenv('UPSERT_REMOVE_DUPLICATES', 'false').lower() in ('1', 'true', 'yes')
+
 # 目录配置
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 RAW_DATA_DIR = os.path.join(DATA_DIR, 'raw')
 OUTPUT_DIR = os.path.join(DATA_DIR, 'output')
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
+PARQUET_DIR = os.getenv('PARQUET_DIR', os.path.join(DATA_DIR, 'parquet'))
+
+# 数据导入配置
+# INGEST_MODE: file 只处理 RAW_DATA_DIR/response.json; stream 流式处理 RAW_DATA_SOURCE 下的所有文件;
+# crawl 按 CRAWL_KEYWORDS 抓取搜索结果
+INGEST_MODE = os.getenv('INGEST_MODE', 'file')
+RAW_DATA_SOURCE = os.getenv('RAW_DATA_SOURCE', RAW_DATA_DIR)
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '1000'))
+# 为True时只解析和写入数据,跳过分析和绘图,适合频繁运行的定时任务
+INGEST_ONLY = os.getenv('INGEST_ONLY', 'false').lower() in ('1', 'true', 'yes')
+
+# 抓取配置,INGEST_MODE=crawl 时按 CRAWL_KEYWORDS 从 CRAWL_ENDPOINT 抓取搜索结果
+CRAWL_ENDPOINT = os.getenv('CRAWL_ENDPOINT', '')
+CRAWL_KEYWORDS = [keyword.strip() for keyword in os.getenv('CRAWL_KEYWORDS', '').split(',') if keyword.strip()]
+# 请求头,例如登录后的Cookie
+CRAWL_COOKIE = os.getenv('CRAWL_COOKIE', '')
+CRAWL_MAX_PAGES = int(os.getenv('CRAWL_MAX_PAGES', '10'))
+CRAWL_PAGE_SIZE = int(os.getenv('CRAWL_PAGE_SIZE', '30'))
+CRAWL_FETCH_CONCURRENCY = int(os.getenv('CRAWL_FETCH_CONCURRENCY', '4'))
+CRAWL_PARSE_CONCURRENCY = int(os.getenv('CRAWL_PARSE_CONCURRENCY', '1'))
+CRAWL_STORE_CONCURRENCY = int(os.getenv('CRAWL_STORE_CONCURRENCY', '1'))
+# 阶段之间队列的容量,决定了存储变慢时最多积压的响应页数
+CRAWL_QUEUE_SIZE = int(os.getenv('CRAWL_QUEUE_SIZE', '16'))
+CRAWL_MAX_RETRIES = int(os.getenv('CRAWL_MAX_RETRIES', '3'))
+CRAWL_TIMEOUT = float(os.getenv('CRAWL_TIMEOUT', '10'))
+# 调度:每个主机每秒的请求数和突发容量,并发上限在 CRAWL_FETCH_CONCURRENCY 和
+# CRAWL_MAX_CONCURRENCY 之间根据延迟(目标 CRAWL_LATENCY_TARGET 秒)和错误率自动调整
+CRAWL_HOST_RATE = float(os.getenv('CRAWL_HOST_RATE', '1.0'))
+CRAWL_HOST_BURST = float(os.getenv('CRAWL_HOST_BURST', '5'))
+CRAWL_MAX_CONCURRENCY = int(os.getenv('CRAWL_MAX_CONCURRENCY', '16'))
+CRAWL_LATENCY_TARGET = float(os.getenv('CRAWL_LATENCY_TARGET', '2.0'))
+# 关键词重新抓取的间隔秒数,结果变化越频繁的关键词间隔越接近最小值
+CRAWL_MIN_INTERVAL = float(os.getenv('CRAWL_MIN_INTERVAL', '600'))
+CRAWL_MAX_INTERVAL = float(os.getenv('CRAWL_MAX_INTERVAL', '86400'))
+# 调度队列状态文件,重启后从中恢复
+CRAWL_STATE_FILE = os.getenv('CRAWL_STATE_FILE', os.path.join(OUTPUT_DIR, 'crawl_state.json'))
+# 是否将抓取到的原始响应保存到 RAW_DATA_DIR/crawl
+CRAWL_SAVE_RAW = os.getenv('CRAWL_SAVE_RAW', 'false').lower() in ('1', 'true', 'yes')
+
+# 变化检测:在 CHANGE_INDEX_FILE 中保存每个商品的指纹,与上次写入相比没有变化的商品
+# 不再写入MongoDB、Parquet和增量统计
+CHANGE_DETECTION = os.getenv('CHANGE_DETECTION', 'false').lower() in ('1', 'true', 'yes')
+CHANGE_INDEX_FILE = os.getenv('CHANGE_INDEX_FILE', os.path.join(DATA_DIR, 'change_index.sqlite'))
+
+# 价格历史:将新商品和已变化商品的 (item_id, 时间, 价格, 想要人数) 追加到 PRICE_HISTORY_DIR,
+# 并维护每个关键词每天的价格汇总,分析结果中包含降价检测
+PRICE_HISTORY = os.getenv('PRICE_HISTORY', 'false').lower() in ('1', 'true', 'yes')
+PRICE_HISTORY_DIR = os.getenv('PRICE_HISTORY_DIR', os.path.join(DATA_DIR, 'price_history'))
+
+# 标题搜索:将新商品和已变化商品的标题、价格和地区写入 SEARCH_INDEX_FILE 中的倒排索引,
+# 用 src/search.py 按关键词、价格区间和地区查询
+SEARCH_INDEX = os.getenv('SEARCH_INDEX', 'false').lower() in ('1', 'true', 'yes')
+SEARCH_INDEX_FILE = os.getenv('SEARCH_INDEX_FILE', os.path.join(DATA_DIR, 'search_index.sqlite'))
+
+# 重复商品检测:用MinHash和LSH找出标题相似度不低于 DEDUP_THRESHOLD、且卖家或主图相同的重新发布商品,
+# 签名和簇保存在 DEDUP_INDEX_FILE,写入MongoDB时在 duplicate_of 字段记录同簇中最先出现的商品
+DEDUP = os.getenv('DEDUP', 'false').lower() in ('1', 'true', 'yes')
+DEDUP_INDEX_FILE = os.getenv('DEDUP_INDEX_FILE', os.path.join(DATA_DIR, 'dedup_index.sqlite'))
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.7'))
+# 为True时分析前去掉 duplicate_of 不为空的商品,每个簇只统计一次
+DEDUP_COLLAPSE = os.getenv('DEDUP_COLLAPSE', 'false').lower() in ('1', 'true', 'yes')
+
+# 是否同时将处理后的商品导出到 PARQUET_DIR 下的Parquet列式存储
+PARQUET_EXPORT = os.getenv('PARQUET_EXPORT', 'false').lower() in ('1', 'true', 'yes')
+
+# 并行解析配置,PARSE_WORKERS=0 表示使用全部CPU核
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '1'))
+PARSE_CHUNK_SIZE = int(os.getenv('PARSE_CHUNK_SIZE', '8'))
+# 命令行运行器 src/cli.py 保存阶段状态和中间结果的目录,失败后从这里恢复
+RUN_STATE_DIR = os.getenv('RUN_STATE_DIR', os.path.join(OUTPUT_DIR, 'run'))
+# JSON后端: auto 在已安装 orjson 时使用 orjson,否则使用标准库 json;simdjson 只部分解码原始响应,需要显式指定
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')
+
+# 分析配置:文档数超过该阈值时改用MongoDB聚合管道计算统计
+ANALYZER_PUSHDOWN_THRESHOLD = int(os.getenv('ANALYZER_PUSHDOWN_THRESHOLD', '500000'))
+# ANALYSIS_MODE: full 每次重新计算; incremental 将新批次合并到 ANALYSIS_STATE_FILE 中保存的统计状态
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'full')
+ANALYSIS_STATE_FILE = os.getenv('ANALYSIS_STATE_FILE', os.path.join(OUTPUT_DIR, 'analysis_state.json'))
+
+# 图表渲染进程数,0表示取图表数与CPU核数中的较小值,1表示在主进程中依次渲染
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', '0'))
+
+# 结果缓存:输入数据、代码和配置都没有变化时直接复用上次的分析结果和图表
+CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(OUTPUT_DIR, '.cache'))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1000'))
+# 输入文件指纹默认只比较大小和修改时间,设为true时对文件内容求摘要
+CACHE_HASH_CONTENTS = os.getenv('CACHE_HASH_CONTENTS', 'false').lower() in ('1', 'true', 'yes')
+
+# 运行指标:每个阶段的耗时、吞吐量、MongoDB往返次数和峰值RSS,后缀为 .prom 时导出Prometheus文本格式,否则为JSON
+METRICS_FILE = os.getenv('METRICS_FILE', os.path.join(OUTPUT_DIR, 'metrics.json'))
+# 用 tracemalloc 记录每个阶段的内存分配峰值,会明显拖慢程序
+METRICS_TRACE_MEMORY = os.getenv('METRICS_TRACE_MEMORY', 'false').lower() in ('1', 'true', 'yes')
+# 设置后用 cProfile 分析每个顶层阶段,结果保存为该目录下的 .prof 文件
+METRICS_PROFILE_DIR = os.getenv('METRICS_PROFILE_DIR', '')
+
+
+def ensure_directories() -> None:
+    """确保所有必要目录存在,由程序入口调用,导入配置时不创建目录"""
+    for directory in [RAW_DATA_DIR, OUTPUT_DIR, LOGS_DIR]:
+        os.makedirs(directory, exist_ok=True)
 
-# 确保所有必要目录存在
-for directory in [RAW_DATA_DIR, OUTPUT_DIR, LOGS_DIR]:
-    os.makedirs(directory, exist_ok=True)
 
 # 日志配置
 LOG_CONFIG = {
@@ -1,19 +1,86 @@
-from typing import Dict, Any, List
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Union
 import pandas as pd
 import numpy as np
 from loguru import logger
+from analysis.pushdown import MongoAnalyzer, box_summary
+from data.frame import FRAME_COLUMNS, build_frame, read_parquet_frame
+from telemetry import metrics
 
 
 class DataAnalyzer:
-    def __init__(self, data: List[Dict[str, Any]]):
+    # 分析用到的字段
+    COLUMNS = FRAME_COLUMNS
+
+    def __init__(self, data: Union[pd.DataFrame, Iterable[Union[Dict[str, Any], tuple]]]):
         """初始化数据分析器
         
         Args:
-            data: 要分析的数据列表
+            data: 要分析的DataFrame,或商品字典/字段值元组的列表或迭代器;
+                后者只保留 COLUMNS 中的列。字符串字段会整列转换为数值和分类类型,
+                已转换的DataFrame直接使用,可以与 DataVisualizer 共享
         """
-        self.df = pd.DataFrame(data)
+        if isinstance(data, pd.DataFrame):
+            self.df = build_frame(data, columns=None)
+        else:
+            self.df = build_frame(data, self.COLUMNS)
         logger.info(f"Loaded {len(self.df)} records for analysis")
 
+    @classmethod
+    @metrics.traced('analysis.from_mongo')
+    def from_mongo(cls, db, query: Optional[Dict[str, Any]] = None, batch_size: int = 10000) -> 'DataAnalyzer':
+        """从MongoDB分批读取分析所需的字段并创建分析器
+        
+        Args:
+            db: MongoDB 实例
+            query: 可选的过滤条件
+            batch_size: 每次网络往返读取的文档数
+            
+        Returns:
+            数据分析器
+        """
+        return cls(build_frame(db.iter_frames(query, cls.COLUMNS, batch_size), cls.COLUMNS))
+
+    @classmethod
+    @metrics.traced('analysis.from_parquet')
+    def from_parquet(cls, root: str, filters: Optional[List[tuple]] = None) -> 'DataAnalyzer':
+        """从Parquet存储读取分析所需的列并创建分析器
+        
+        Args:
+            root: Parquet存储根目录
+            filters: 过滤条件,例如 [('keyword', '=', 'iphone'), ('price', '<', 3000)]
+            
+        Returns:
+            数据分析器
+        """
+        return cls(read_parquet_frame(root, cls.COLUMNS, filters))
+
+    @classmethod
+    def from_price_history(cls, store, keyword: Optional[str] = None, start: Optional[datetime] = None,
+                           end: Optional[datetime] = None) -> 'DataAnalyzer':
+        """从价格历史存储读取观测记录并创建分析器,用于 price_drops
+        
+        Args:
+            store: PriceHistoryStore 实例
+            keyword: 只读取该关键词,为None时读取所有关键词
+            start: 起始时间
+            end: 结束时间
+            
+        Returns:
+            数据分析器
+        """
+        return cls(store.keyword_history(keyword, start, end))
+
+    def _value_counts(self, name: str) -> pd.Series:
+        """按数量从多到少统计取值,数量相同时按取值排序,与 MongoAnalyzer 的顺序一致"""
+        counts = self.df[name].value_counts(sort=False)
+        counts = counts[counts > 0]
+        # category的索引按类别顺序排序,先转换为普通索引再按取值排序
+        counts.index = counts.index.astype(object)
+        counts = counts.sort_index(kind='stable')
+        return counts.sort_values(ascending=False, kind='stable')
+
+    @metrics.traced('analysis.basic_statistics')
     def basic_statistics(self) -> Dict[str, Any]:
         """计算基础统计信息
         
@@ -33,14 +100,15 @@ class DataAnalyzer:
                 "max": float(self.df['price'].max()),
                 "std": float(self.df['price'].std())
             },
-            "top_locations": self.df['location'].value_counts().head(5).to_dict(),
-            "top_categories": self.df['category_id'].value_counts().head(5).to_dict(),
-            "keywords_summary": self.df['keyword'].value_counts().to_dict()
+            "top_locations": self._value_counts('location').head(5).to_dict(),
+            "top_categories": self._value_counts('category_id').head(5).to_dict(),
+            "keywords_summary": self._value_counts('keyword').to_dict()
         }
 
         logger.info("Basic statistics calculated successfully")
         return stats
 
+    @metrics.traced('analysis.price_distribution')
     def price_distribution(self) -> Dict[str, Any]:
         """分析价格分布
         
@@ -72,6 +140,7 @@ class DataAnalyzer:
         logger.info("Price distribution analysis completed")
         return price_dist
 
+    @metrics.traced('analysis.location_analysis')
     def location_analysis(self) -> Dict[str, Any]:
         """分析地理位置分布
         
@@ -81,10 +150,190 @@ class DataAnalyzer:
         if self.df.empty:
             return {"error": "No data available"}
 
+        price_avg = self.df.groupby('location', observed=True)['price'].mean()
+        # 与 object 列的分组结果一样按地区名称排序,而不是按类别顺序
+        price_avg.index = price_avg.index.astype(object)
         location_stats = {
-            "location_counts": self.df['location'].value_counts().to_dict(),
-            "location_price_avg": self.df.groupby('location')['price'].mean().to_dict()
+            "location_counts": self._value_counts('location').to_dict(),
+            "location_price_avg": price_avg.sort_index().to_dict()
         }
 
         logger.info("Location analysis completed")
-        return location_stats 
\ No newline at end of file
+        return location_stats 
+
+    @metrics.traced('analysis.value_analysis')
+    def value_analysis(self, bins: int = 10) -> Dict[str, Any]:
+        """分析折扣率以及想要人数与价格的关系
+        
+        Args:
+            bins: 按价格分位数划分的区间数
+            
+        Returns:
+            折扣率统计、想要人数与价格的秩相关系数,以及各价格区间的平均想要人数
+        """
+        if self.df.empty or 'want_count' not in self.df:
+            return {"error": "No data available"}
+
+        discounts = self.df['discount_ratio'].dropna() if 'discount_ratio' in self.df else pd.Series(dtype=float)
+        price_bins = pd.qcut(self.df['price'], q=bins, duplicates='drop')
+        want_by_price = self.df.groupby(price_bins, observed=True)['want_count'].mean()
+        # 秩相关,等价于 method='spearman' 但不依赖scipy;价格或想要人数全部相同时为None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = self.df['price'].rank().corr(self.df['want_count'].rank())
+
+        value_stats = {
+            "discount": {
+                "items_with_original_price": int(len(discounts)),
+                "mean_ratio": float(discounts.mean()) if len(discounts) else None,
+                "median_ratio": float(discounts.median()) if len(discounts) else None
+            },
+            "want_price_correlation": None if np.isnan(correlation) else float(correlation),
+            "want_by_price": {
+                f"{interval.left:.2f}-{interval.right:.2f}": float(mean)
+                for interval, mean in want_by_price.items()
+            }
+        }
+
+        logger.info("Value analysis completed")
+        return value_stats
+
+    @metrics.traced('analysis.chart_summaries')
+    def chart_summaries(self, bins: int = 30, top_n: int = 10, box_top_n: int = 20) -> Dict[str, Any]:
+        """计算绘图所需的汇总数据
+        
+        结果只与分组数量有关,可以直接传给 DataVisualizer 或保存后再绘图,
+        不再需要把原始数据交给绘图函数。
+        
+        Args:
+            bins: 价格直方图的分箱数量
+            top_n: 地区和类别柱状图的取值个数
+            box_top_n: 价格箱线图包含的地区个数(按商品数量排序)
+            
+        Returns:
+            图表名称到汇总数据的字典,没有数据时为空字典:
+            price_distribution 为 {'edges', 'counts'},location_distribution 和
+            category_distribution 为取值计数,price_by_location 为箱线图统计列表
+        """
+        prices = self.df['price'].dropna() if 'price' in self.df else pd.Series(dtype=float)
+        if prices.empty:
+            return {}
+
+        counts, edges = np.histogram(prices, bins=bins)
+        location_counts = self._value_counts('location')
+
+        # 箱线图只统计数量最多的地区
+        top_locations = location_counts.head(box_top_n).index
+        grouped = self.df[self.df['location'].isin(top_locations)].groupby('location', observed=True)['price']
+        quartiles = grouped.quantile([0, 0.25, 0.5, 0.75, 1]).unstack()
+        sizes = grouped.count()
+        boxes = [
+            box_summary(location, *quartiles.loc[location], int(sizes[location]))
+            for location in top_locations
+            if sizes.get(location, 0)
+        ]
+
+        summaries = {
+            'price_distribution': {'edges': edges.tolist(), 'counts': counts.tolist()},
+            'location_distribution': {k: int(v) for k, v in location_counts.head(top_n).items()},
+            'category_distribution': {
+                k: int(v) for k, v in self._value_counts('category_id').head(top_n).items()
+            },
+            'price_by_location': boxes
+        }
+
+        logger.info("Chart summaries calculated successfully")
+        return summaries
+
+    @metrics.traced('analysis.price_drops')
+    def price_drops(self, history: Optional[pd.DataFrame] = None, min_ratio: float = 0.1,
+                    since: Optional[datetime] = None, limit: int = 100) -> Dict[str, Any]:
+        """检测降价商品
+        
+        对每个商品比较最新价格与观测期内的最高价格,降幅不小于 min_ratio 的商品视为降价。
+        计算完全向量化:按 (商品, 时间) 排序后用 reduceat 求每组最高价,
+        输入已按 PriceHistoryStore 的顺序排列时跳过排序,数百万条观测可以在一秒内完成。
+        
+        Args:
+            history: 包含 item_id、ts、price 列的观测记录,为None时使用分析器自身的数据
+            min_ratio: 最小降幅比例,例如0.1表示降价10%
+            since: 只考虑该时间之后的观测
+            limit: 返回的降价商品数量上限,按降幅从大到小排序
+            
+        Returns:
+            降价统计和降幅最大的商品列表
+        """
+        frame = self.df if history is None else history
+        if frame.empty or not {'item_id', 'ts', 'price'}.issubset(frame.columns):
+            return {"error": "No price history available"}
+        if since is not None:
+            frame = frame[frame['ts'] >= since]
+        frame = frame[frame['price'].notna()]
+        if frame.empty:
+            return {"error": "No price history available"}
+
+        codes, item_ids = pd.factorize(frame['item_id'], sort=False)
+        ts = frame['ts'].to_numpy()
+        prices = frame['price'].to_numpy(dtype=float)
+        order = None
+        boundaries = codes[1:] != codes[:-1]
+        if (np.diff(codes) < 0).any() or (ts[1:][~boundaries] < ts[:-1][~boundaries]).any():
+            order = np.lexsort((ts, codes))
+            codes, ts, prices = codes[order], ts[order], prices[order]
+            boundaries = codes[1:] != codes[:-1]
+
+        starts = np.flatnonzero(np.r_[True, boundaries])
+        ends = np.r_[starts[1:], len(codes)] - 1
+        peaks = np.maximum.reduceat(prices, starts)
+        latest = prices[ends]
+        drops = peaks - latest
+        ratios = np.divide(drops, peaks, out=np.zeros_like(drops), where=peaks > 0)
+        matched = np.flatnonzero((ends > starts) & (drops > 0) & (ratios >= min_ratio))
+        dropped_items = len(matched)
+        matched = matched[np.argsort(-ratios[matched], kind='stable')][:limit]
+
+        keywords = None
+        if 'keyword' in frame:
+            keywords = frame['keyword'].to_numpy()
+            if order is not None:
+                keywords = keywords[order]
+        result = {
+            "total_items": len(starts),
+            "dropped_items": dropped_items,
+            "drops": [
+                {
+                    "item_id": item_ids[codes[ends[group]]],
+                    "keyword": keywords[ends[group]] if keywords is not None else None,
+                    "peak_price": float(peaks[group]),
+                    "price": float(latest[group]),
+                    "drop": float(drops[group]),
+                    "drop_ratio": float(ratios[group]),
+                    "observed_at": pd.Timestamp(ts[ends[group]]).isoformat()
+                }
+                for group in matched
+            ]
+        }
+
+        logger.info(f"Detected {result['dropped_items']} price drops among {result['total_items']} items")
+        return result
+
+
+def create_analyzer(db, pushdown_threshold: int = 500000, query: Optional[Dict[str, Any]] = None):
+    """按数据量选择内存分析或聚合下推分析
+    
+    Args:
+        db: MongoDB 实例
+        pushdown_threshold: 文档数超过该值时使用 MongoAnalyzer
+        query: 可选的过滤条件
+        
+    Returns:
+        DataAnalyzer 或 MongoAnalyzer
+    """
+    if query:
+        count = db.collection.count_documents(query)
+    else:
+        count = db.collection.estimated_document_count()
+
+    if count > pushdown_threshold:
+        logger.info(f"{count} documents exceed {pushdown_threshold}, using aggregation pushdown")
+        return MongoAnalyzer(db.collection, query)
+    return DataAnalyzer.from_mongo(db, query)
@@ -0,0 +1,473 @@
+import json
+import math
+import os
+import random
+from collections import Counter
+from typing import Dict, Any, List, Optional, Iterable, Union
+import numpy as np
+import pandas as pd
+from loguru import logger
+from analysis.pushdown import box_summary, cut_edges, range_label
+from data.frame import build_frame
+
+
+class RunningMoments:
+    """可合并的均值/方差统计(Welford算法,批次之间用Chan公式合并)"""
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 minimum: float = math.inf, maximum: float = -math.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def update(self, values: np.ndarray) -> None:
+        """合并一批数值"""
+        if len(values) == 0:
+            return
+        batch = RunningMoments(
+            count=len(values),
+            mean=float(values.mean()),
+            m2=float(((values - values.mean()) ** 2).sum()),
+            minimum=float(values.min()),
+            maximum=float(values.max())
+        )
+        self.merge(batch)
+
+    def merge(self, other: 'RunningMoments') -> None:
+        """合并另一份统计"""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+    @property
+    def std(self) -> float:
+        """样本标准差,与 pandas 的 std() 一致"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float('nan')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2,
+                'minimum': self.minimum, 'maximum': self.maximum}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'RunningMoments':
+        return cls(**data)
+
+
+class KLLSketch:
+    """可合并的KLL分位数草图
+
+    每层压缩器容量按 2/3 几何递减,满层时排序后随机保留奇数位或偶数位元素晋升到上一层,
+    因此内存为 O(k) 且与数据量无关。尚未发生压缩时结果是精确的。
+
+    误差界: k=200 时归一化秩误差约为 ±1.65% (置信度99%,参照 Apache DataSketches
+    的KLL误差表),即返回值的真实秩与目标秩之差不超过 0.0165 * n;误差大致与 1/k 成正比。
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        """初始化草图
+
+        Args:
+            k: 最高层压缩器容量,越大越精确
+            seed: 随机数种子
+        """
+        self.k = k
+        self.count = 0
+        self.levels: List[List[float]] = [[]]
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: Iterable[float]) -> None:
+        """加入一批数值"""
+        values = list(values)
+        self.count += len(values)
+        self.levels[0].extend(values)
+        self._compress()
+
+    def merge(self, other: 'KLLSketch') -> None:
+        """合并另一个草图"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self._compress()
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items.sort()
+                offset = self._rng.getrandbits(1)
+                # 元素个数为奇数时保留最后一个,保证总权重不变
+                keep = [items.pop()] if len(items) % 2 else []
+                self.levels[level + 1].extend(items[offset::2])
+                self.levels[level] = keep
+            level += 1
+
+    def quantiles(self, quantiles: List[float]) -> List[float]:
+        """返回近似分位数
+
+        Args:
+            quantiles: 0到1之间的分位点
+
+        Returns:
+            对应的分位数,草图为空时返回NaN
+        """
+        weighted = sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self.levels)
+            for value in items
+        )
+        if not weighted:
+            return [float('nan')] * len(quantiles)
+
+        values = np.array([value for value, _ in weighted])
+        cumulative = np.cumsum([weight for _, weight in weighted])
+        total = cumulative[-1]
+        if total == len(values):
+            # 尚未压缩,与pandas一样做线性插值
+            return [float(np.quantile(values, q)) for q in quantiles]
+        return [float(values[min(np.searchsorted(cumulative, q * total), len(values) - 1)]) for q in quantiles]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'k': self.k, 'count': self.count, 'levels': self.levels}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'KLLSketch':
+        sketch = cls(k=data['k'])
+        sketch.count = data['count']
+        sketch.levels = data['levels']
+        return sketch
+
+
+class LogHistogram:
+    """固定对数分箱的价格直方图
+
+    分箱边界为 0 加上 [lower, upper] 之间的几何序列,默认每个分箱的相对宽度约1%,
+    超出上界的值计入最后一个分箱。分箱固定,因此不同批次的直方图可以直接相加。
+    """
+
+    def __init__(self, lower: float = 0.01, upper: float = 1e7, bins: int = 2000,
+                 counts: Optional[List[int]] = None):
+        self.lower = lower
+        self.upper = upper
+        self.bins = bins
+        self.edges = np.concatenate(([0.0], np.geomspace(lower, upper, bins)))
+        self.counts = np.array(counts if counts is not None else [0] * bins, dtype=np.int64)
+
+    def update(self, values: np.ndarray) -> None:
+        """加入一批数值"""
+        indexes = np.clip(np.searchsorted(self.edges, values, side='left') - 1, 0, self.bins - 1)
+        self.counts += np.bincount(indexes, minlength=self.bins)
+
+    def merge(self, other: 'LogHistogram') -> None:
+        """合并另一个相同分箱的直方图"""
+        if (other.lower, other.upper, other.bins) != (self.lower, self.upper, self.bins):
+            raise ValueError("Cannot merge histograms with different bins")
+        self.counts += other.counts
+
+    def rebin(self, edges: List[float]) -> List[float]:
+        """将计数重新分配到新的区间
+
+        跨越新边界的分箱按重叠长度比例拆分,因此每个新区间的误差不超过
+        其两端边界所在的两个固定分箱的计数。
+
+        Args:
+            edges: 新的区间边界
+
+        Returns:
+            每个新区间的近似计数
+        """
+        lows, highs = self.edges[:-1], self.edges[1:]
+        widths = highs - lows
+        result = []
+        for left, right in zip(edges[:-1], edges[1:]):
+            overlap = np.clip(np.minimum(highs, right) - np.maximum(lows, left), 0, None)
+            result.append(float((self.counts * overlap / widths).sum()))
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'lower': self.lower, 'upper': self.upper, 'bins': self.bins, 'counts': self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LogHistogram':
+        return cls(**data)
+
+
+class IncrementalAnalyzer:
+    """增量数据分析器
+
+    保存可合并的统计状态并在多次运行之间持久化,新批次的处理代价只与批次大小有关。
+    输出与 DataAnalyzer 的 basic_statistics/price_distribution/location_analysis 结构相同:
+    计数、均值、标准差、极值和地区统计是精确的;中位数和分位数来自 KLLSketch,
+    误差界见其说明;price_ranges 由 LogHistogram 重新分箱得到,计数为四舍五入后的近似值。
+    每个地区另有一个较小的价格草图,用于绘制箱线图。
+
+    草图无法撤销已合并的数值,因此已计入的商品被修改后,状态只能标记为 stale,
+    由调用方从完整数据重新计算。
+    """
+    # 统计用到的字段
+    COLUMNS = ('price', 'location', 'category_id', 'keyword')
+
+    def __init__(self, sketch_k: int = 200, location_sketch_k: int = 64):
+        self.total_items = 0
+        self.moments = RunningMoments()
+        self.sketch = KLLSketch(sketch_k)
+        self.histogram = LogHistogram()
+        self.locations = Counter()
+        self.location_price_sums = Counter()
+        self.location_price_counts = Counter()
+        self.categories = Counter()
+        self.keywords = Counter()
+        self.location_sketch_k = location_sketch_k
+        self.location_sketches: Dict[str, KLLSketch] = {}
+        self.stale = False
+
+    def update(self, data: Union[List[Dict[str, Any]], pd.DataFrame]) -> None:
+        """合并一批商品
+
+        Args:
+            data: 商品字典列表或DataFrame,只读取 COLUMNS 中的列
+        """
+        df = build_frame(data, self.COLUMNS)
+        if df.empty:
+            return
+
+        self.total_items += len(df)
+        prices = pd.to_numeric(df['price'], errors='coerce').to_numpy(dtype=float)
+        valid = ~np.isnan(prices)
+        valid_prices = prices[valid]
+        self.moments.update(valid_prices)
+        self.sketch.update(valid_prices.tolist())
+        self.histogram.update(valid_prices)
+
+        self.locations.update(df['location'].dropna().tolist())
+        self.categories.update(df['category_id'].dropna().tolist())
+        self.keywords.update(df['keyword'].dropna().tolist())
+
+        located = df.loc[valid, 'location'].notna().to_numpy()
+        located_prices = pd.DataFrame({
+            'location': df.loc[valid, 'location'].to_numpy()[located],
+            'price': valid_prices[located]
+        }).groupby('location')['price']
+        groups = located_prices.agg(['sum', 'count'])
+        self.location_price_sums.update(groups['sum'].to_dict())
+        self.location_price_counts.update(groups['count'].to_dict())
+        for location, values in located_prices:
+            sketch = self.location_sketches.get(location)
+            if sketch is None:
+                sketch = self.location_sketches[location] = KLLSketch(self.location_sketch_k)
+            sketch.update(values.tolist())
+
+        logger.info(f"Folded {len(df)} records into incremental analysis state ({self.total_items} total)")
+
+    def invalidate(self) -> None:
+        """标记统计状态已失效,例如已计入的商品被修改,之后需要重新计算"""
+        if not self.stale:
+            logger.info("Previously counted items changed, incremental analysis state needs a full recompute")
+        self.stale = True
+
+    def merge(self, other: 'IncrementalAnalyzer') -> None:
+        """合并另一份统计状态,例如并行处理的不同分片"""
+        self.stale = self.stale or other.stale
+        self.total_items += other.total_items
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+        for name in ('locations', 'location_price_sums', 'location_price_counts', 'categories', 'keywords'):
+            getattr(self, name).update(getattr(other, name))
+        for location, sketch in other.location_sketches.items():
+            if location in self.location_sketches:
+                self.location_sketches[location].merge(sketch)
+            else:
+                self.location_sketches[location] = KLLSketch.from_dict(sketch.to_dict())
+
+    def basic_statistics(self) -> Dict[str, Any]:
+        """计算基础统计信息
+
+        Returns:
+            包含统计信息的字典
+        """
+        if self.total_items == 0:
+            logger.warning("No data available for analysis")
+            return {"error": "No data available"}
+
+        stats = {
+            "total_items": self.total_items,
+            "price_stats": {
+                "mean": self.moments.mean,
+                "median": self.sketch.quantiles([0.5])[0],
+                "min": self.moments.minimum,
+                "max": self.moments.maximum,
+                "std": self.moments.std
+            },
+            "top_locations": dict(self.locations.most_common(5)),
+            "top_categories": dict(self.categories.most_common(5)),
+            "keywords_summary": dict(self.keywords.most_common())
+        }
+
+        logger.info("Basic statistics calculated successfully")
+        return stats
+
+    def price_distribution(self, bins: int = 10) -> Dict[str, Any]:
+        """分析价格分布
+
+        Args:
+            bins: 分箱数量
+
+        Returns:
+            价格分布统计信息
+        """
+        if self.moments.count == 0:
+            return {"error": "No data available"}
+
+        edges = cut_edges(self.moments.minimum, self.moments.maximum, bins)
+        counts = self.histogram.rebin(edges)
+        q25, q50, q75 = self.sketch.quantiles([0.25, 0.5, 0.75])
+        price_dist = {
+            "percentiles": {
+                "25%": q25,
+                "50%": q50,
+                "75%": q75
+            },
+            "price_ranges": {
+                range_label(left, right): int(round(count))
+                for left, right, count in zip(edges[:-1], edges[1:], counts)
+            }
+        }
+
+        logger.info("Price distribution analysis completed")
+        return price_dist
+
+    def location_analysis(self) -> Dict[str, Any]:
+        """分析地理位置分布
+
+        Returns:
+            地理位置分布统计信息
+        """
+        if not self.locations:
+            return {"error": "No data available"}
+
+        location_stats = {
+            "location_counts": dict(self.locations.most_common()),
+            "location_price_avg": {
+                location: self.location_price_sums[location] / count
+                for location, count in sorted(self.location_price_counts.items())
+            }
+        }
+
+        logger.info("Location analysis completed")
+        return location_stats
+
+    def chart_summaries(self, bins: int = 30, top_n: int = 10, box_top_n: int = 20) -> Dict[str, Any]:
+        """计算绘图所需的汇总数据,结构与 DataAnalyzer.chart_summaries 相同
+
+        直方图计数由 LogHistogram 重新分箱得到;箱线图的四分位数和极值来自各地区的草图,
+        是近似值。
+
+        Args:
+            bins: 价格直方图的分箱数量
+            top_n: 地区和类别柱状图的取值个数
+            box_top_n: 价格箱线图包含的地区个数(按商品数量排序)
+
+        Returns:
+            图表名称到汇总数据的字典,没有数据时为空字典
+        """
+        if self.moments.count == 0:
+            return {}
+
+        # 与 numpy.histogram 相同的等宽边界
+        minimum, maximum = self.moments.minimum, self.moments.maximum
+        if minimum == maximum:
+            minimum, maximum = minimum - 0.5, maximum + 0.5
+        edges = np.linspace(minimum, maximum, bins + 1).tolist()
+        counts = [int(round(count)) for count in self.histogram.rebin(edges)]
+
+        boxes = []
+        for location, _ in self.locations.most_common(box_top_n):
+            sketch = self.location_sketches.get(location)
+            if sketch is not None and sketch.count:
+                boxes.append(box_summary(location, *sketch.quantiles([0, 0.25, 0.5, 0.75, 1]), sketch.count))
+
+        summaries = {
+            'price_distribution': {'edges': edges, 'counts': counts},
+            'location_distribution': dict(self.locations.most_common(top_n)),
+            'category_distribution': dict(self.categories.most_common(top_n)),
+            'price_by_location': boxes
+        }
+
+        logger.info("Chart summaries calculated successfully")
+        return summaries
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_items': self.total_items,
+            'moments': self.moments.to_dict(),
+            'sketch': self.sketch.to_dict(),
+            'histogram': self.histogram.to_dict(),
+            'locations': dict(self.locations),
+            'location_price_sums': dict(self.location_price_sums),
+            'location_price_counts': dict(self.location_price_counts),
+            'categories': dict(self.categories),
+            'keywords': dict(self.keywords),
+            'location_sketches': {location: sketch.to_dict() for location, sketch in self.location_sketches.items()},
+            'stale': self.stale
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'IncrementalAnalyzer':
+        analyzer = cls()
+        analyzer.total_items = data['total_items']
+        analyzer.moments = RunningMoments.from_dict(data['moments'])
+        analyzer.sketch = KLLSketch.from_dict(data['sketch'])
+        analyzer.histogram = LogHistogram.from_dict(data['histogram'])
+        for name in ('locations', 'location_price_sums', 'location_price_counts', 'categories', 'keywords'):
+            setattr(analyzer, name, Counter(data[name]))
+        # 早期版本的状态文件没有地区草图
+        analyzer.location_sketches = {
+            location: KLLSketch.from_dict(sketch) for location, sketch in data.get('location_sketches', {}).items()
+        }
+        analyzer.stale = data.get('stale', False)
+        return analyzer
+
+    def save(self, file_path: str) -> None:
+        """保存统计状态,先写临时文件再替换,避免中断时损坏已有状态
+
+        Args:
+            file_path: 状态文件路径
+        """
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, file_path)
+        logger.info(f"Saved incremental analysis state to {file_path}")
+
+    @classmethod
+    def load(cls, file_path: str) -> 'IncrementalAnalyzer':
+        """读取统计状态,文件不存在时返回空状态
+
+        Args:
+            file_path: 状态文件路径
+
+        Returns:
+            增量数据分析器
+        """
+        if not os.path.exists(file_path):
+            logger.info(f"No incremental analysis state at {file_path}, starting fresh")
+            return cls()
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,372 @@
+import math
+from typing import Dict, Any, List, Optional
+from loguru import logger
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+
+
+def cut_edges(minimum: float, maximum: float, bins: int) -> List[float]:
+    """计算与 pd.cut(bins=n) 相同的等宽分箱边界
+
+    Args:
+        minimum: 最小值
+        maximum: 最大值
+        bins: 分箱数量
+
+    Returns:
+        长度为 bins + 1 的边界列表
+    """
+    if minimum == maximum:
+        # 与pandas一致:所有值相同时向两侧各扩展0.1%
+        minimum -= 0.001 * abs(minimum) if minimum != 0 else 0.001
+        maximum += 0.001 * abs(maximum) if maximum != 0 else 0.001
+        width = (maximum - minimum) / bins
+        return [minimum + width * i for i in range(bins)] + [maximum]
+
+    width = (maximum - minimum) / bins
+    edges = [minimum + width * i for i in range(bins)] + [maximum]
+    edges[0] -= (maximum - minimum) * 0.001
+    return edges
+
+
+def _round_frac(value: float, precision: int = 3) -> float:
+    """与 pd.cut 生成区间标签时相同的舍入规则"""
+    if not math.isfinite(value) or value == int(value):
+        return value
+    fraction, whole = math.modf(value)
+    if whole == 0:
+        digits = -int(math.floor(math.log10(abs(fraction)))) - 1 + precision
+    else:
+        digits = precision
+    return round(value, digits)
+
+
+def range_label(left: float, right: float) -> str:
+    """生成与 DataAnalyzer.price_distribution 相同格式的区间标签"""
+    return f"{_round_frac(left):.2f}-{_round_frac(right):.2f}"
+
+
+def box_summary(label: Any, minimum: float, q1: float, median: float, q3: float,
+                maximum: float, count: int) -> Dict[str, Any]:
+    """将五数概括转换为 Axes.bxp 使用的箱线图统计
+
+    须线与 seaborn/matplotlib 默认一致取 1.5 倍四分位距,但只有五数概括时无法得知
+    须线内最近的真实数据点,因此须线端点为 q1 - 1.5*IQR 与最小值中的较大者(上须同理),
+    异常点不绘制。
+
+    Args:
+        label: 分组名称
+        minimum: 最小值
+        q1: 下四分位数
+        median: 中位数
+        q3: 上四分位数
+        maximum: 最大值
+        count: 分组内的数量
+
+    Returns:
+        箱线图统计字典
+    """
+    iqr = q3 - q1
+    return {
+        'label': str(label),
+        'whislo': float(max(minimum, q1 - 1.5 * iqr)),
+        'q1': float(q1),
+        'med': float(median),
+        'q3': float(q3),
+        'whishi': float(min(maximum, q3 + 1.5 * iqr)),
+        'count': int(count)
+    }
+
+
+class MongoAnalyzer:
+    """基于MongoDB聚合管道的数据分析器
+
+    与 DataAnalyzer 返回相同结构的结果,但所有统计都在服务端计算,
+    只有聚合结果会传回客户端。
+    """
+
+    def __init__(self, collection: Collection, query: Optional[Dict[str, Any]] = None):
+        """初始化聚合分析器
+
+        Args:
+            collection: 商品集合
+            query: 可选的过滤条件,只分析匹配的文档
+        """
+        self.collection = collection
+        self.query = query or {}
+        # 服务端是否支持 $percentile,首次失败后不再尝试
+        self._percentile_supported = True
+        logger.info(f"Using aggregation pushdown for {collection.full_name}")
+
+    def _aggregate(self, *stages: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """在过滤条件之后执行聚合管道"""
+        pipeline = [{'$match': self.query}] if self.query else []
+        pipeline.extend(stages)
+        return list(self.collection.aggregate(pipeline, allowDiskUse=True))
+
+    def _value_counts(self, field: str, limit: Optional[int] = None) -> Dict[Any, int]:
+        """计算字段取值计数,按数量降序排列,与 value_counts 一样忽略空值"""
+        stages = [
+            {'$match': {field: {'$ne': None}}},
+            {'$group': {'_id': f'${field}', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1, '_id': 1}}
+        ]
+        if limit is not None:
+            stages.append({'$limit': limit})
+        return {doc['_id']: doc['count'] for doc in self._aggregate(*stages)}
+
+    def _price_summary(self) -> Optional[Dict[str, Any]]:
+        """计算价格的数量、均值、极值和样本标准差"""
+        result = self._aggregate(
+            {'$match': {'price': {'$ne': None}}},
+            {'$group': {
+                '_id': None,
+                'count': {'$sum': 1},
+                'mean': {'$avg': '$price'},
+                'min': {'$min': '$price'},
+                'max': {'$max': '$price'},
+                'std': {'$stdDevSamp': '$price'}
+            }}
+        )
+        return result[0] if result else None
+
+    def _quantiles(self, quantiles: List[float], count: int,
+                   match: Optional[Dict[str, Any]] = None) -> List[float]:
+        """计算价格分位数
+
+        优先使用 $percentile (MongoDB 7.0+ 的近似算法);不支持时退化为按价格排序的一次游标
+        遍历,取出各分位点两侧位置的价格并与pandas一样做线性插值。后者结果精确,服务端在
+        price 索引上最多遍历到最大分位点为止的 O(n) 个索引项,所有分位点共用这一次遍历。
+
+        Args:
+            quantiles: 0到1之间的分位点
+            count: 参与计算的文档数
+            match: 在 self.query 之外附加的过滤条件,例如 {'location': '杭州'}
+        """
+        match = match or {}
+        if self._percentile_supported:
+            try:
+                result = self._aggregate(
+                    {'$match': {**match, 'price': {'$ne': None}}},
+                    {'$group': {
+                        '_id': None,
+                        'values': {'$percentile': {'input': '$price', 'p': quantiles, 'method': 'approximate'}}
+                    }}
+                )
+                return [float(value) for value in result[0]['values']]
+            except (OperationFailure, NotImplementedError):
+                # MongoDB 7.0 之前的服务端抛出 OperationFailure,mongomock 抛出 NotImplementedError
+                logger.info("$percentile not supported, falling back to a sorted cursor pass")
+                self._percentile_supported = False
+
+        if count == 0:
+            return [float('nan')] * len(quantiles)
+        positions = [(count - 1) * q for q in quantiles]
+        wanted = {index for position in positions for index in (int(position), min(int(position) + 1, count - 1))}
+        first, last = min(wanted), max(wanted)
+        cursor = (
+            self.collection.find({**self.query, **match, 'price': {'$ne': None}}, {'price': 1, '_id': 0})
+            .sort('price', 1)
+            .skip(first)
+            .limit(last - first + 1)
+            .batch_size(10000)
+        )
+        prices = {}
+        for index, doc in enumerate(cursor, first):
+            if index in wanted:
+                prices[index] = doc['price']
+
+        values = []
+        for position in positions:
+            lower = int(position)
+            low = prices[lower]
+            high = prices.get(lower + 1, low)
+            values.append(float(low + (high - low) * (position - lower)))
+        return values
+
+    def _bucket_counts(self, edges: List[float]) -> List[int]:
+        """用 $bucket 按边界统计价格数量,等于最后一个边界的价格计入最后一个区间"""
+        buckets = self._aggregate(
+            {'$match': {'price': {'$ne': None}}},
+            {'$bucket': {
+                'groupBy': '$price',
+                'boundaries': edges,
+                'default': 'overflow',
+                'output': {'count': {'$sum': 1}}
+            }}
+        )
+        counts = dict.fromkeys(edges[:-1], 0)
+        for bucket in buckets:
+            # 等于最大值的价格落在最后一个边界之外,归入最后一个区间
+            key = edges[-2] if bucket['_id'] == 'overflow' else bucket['_id']
+            counts[key] += bucket['count']
+        return [counts[left] for left in edges[:-1]]
+
+    def basic_statistics(self) -> Dict[str, Any]:
+        """计算基础统计信息
+
+        Returns:
+            包含统计信息的字典
+        """
+        total = self.collection.count_documents(self.query)
+        if total == 0:
+            logger.warning("No data available for analysis")
+            return {"error": "No data available"}
+
+        # 与 DataAnalyzer 一样,total_items 包含没有价格的商品,价格统计只使用有价格的商品
+        summary = self._price_summary()
+        if summary is None:
+            price_stats = dict.fromkeys(('mean', 'median', 'min', 'max', 'std'), float('nan'))
+        else:
+            price_stats = {
+                "mean": float(summary['mean']),
+                "median": self._quantiles([0.5], summary['count'])[0],
+                "min": float(summary['min']),
+                "max": float(summary['max']),
+                "std": float(summary['std']) if summary['std'] is not None else float('nan')
+            }
+
+        stats = {
+            "total_items": total,
+            "price_stats": price_stats,
+            "top_locations": self._value_counts('location', 5),
+            "top_categories": self._value_counts('category_id', 5),
+            "keywords_summary": self._value_counts('keyword')
+        }
+
+        logger.info("Basic statistics calculated successfully")
+        return stats
+
+    def price_distribution(self, bins: int = 10) -> Dict[str, Any]:
+        """分析价格分布
+
+        区间边界与 pd.cut 相同;$bucket 的区间为左闭右开,因此恰好落在边界上的价格
+        会被计入右侧区间。
+
+        Args:
+            bins: 分箱数量
+
+        Returns:
+            价格分布统计信息
+        """
+        summary = self._price_summary()
+        if summary is None:
+            return {"error": "No data available"}
+
+        edges = cut_edges(float(summary['min']), float(summary['max']), bins)
+        counts = self._bucket_counts(edges)
+        price_ranges_dict = {
+            range_label(left, right): count
+            for left, right, count in zip(edges[:-1], edges[1:], counts)
+        }
+
+        q25, q50, q75 = self._quantiles([0.25, 0.5, 0.75], summary['count'])
+        price_dist = {
+            "percentiles": {
+                "25%": q25,
+                "50%": q50,
+                "75%": q75
+            },
+            "price_ranges": price_ranges_dict
+        }
+
+        logger.info("Price distribution analysis completed")
+        return price_dist
+
+    def location_analysis(self) -> Dict[str, Any]:
+        """分析地理位置分布
+
+        Returns:
+            地理位置分布统计信息
+        """
+        groups = self._aggregate(
+            {'$match': {'location': {'$ne': None}}},
+            {'$group': {'_id': '$location', 'count': {'$sum': 1}, 'price_avg': {'$avg': '$price'}}},
+            {'$sort': {'count': -1, '_id': 1}}
+        )
+        if not groups:
+            return {"error": "No data available"}
+
+        location_stats = {
+            "location_counts": {doc['_id']: doc['count'] for doc in groups},
+            "location_price_avg": {
+                doc['_id']: float(doc['price_avg'])
+                for doc in sorted(groups, key=lambda doc: doc['_id'])
+                if doc['price_avg'] is not None
+            }
+        }
+
+        logger.info("Location analysis completed")
+        return location_stats
+
+    def _location_boxes(self, locations: List[Any]) -> List[Dict[str, Any]]:
+        """计算指定地区的价格五数概括,不支持 $percentile 时逐个地区计算精确分位数"""
+        by_location = None
+        if self._percentile_supported:
+            try:
+                groups = self._aggregate(
+                    {'$match': {'location': {'$in': locations}, 'price': {'$ne': None}}},
+                    {'$group': {
+                        '_id': '$location',
+                        'count': {'$sum': 1},
+                        'min': {'$min': '$price'},
+                        'max': {'$max': '$price'},
+                        'quartiles': {'$percentile': {
+                            'input': '$price', 'p': [0.25, 0.5, 0.75], 'method': 'approximate'
+                        }}
+                    }}
+                )
+                by_location = {
+                    doc['_id']: (doc['min'], *doc['quartiles'], doc['max'], doc['count'])
+                    for doc in groups
+                }
+            except (OperationFailure, NotImplementedError):
+                logger.info("$percentile not supported, falling back to a sorted cursor pass")
+                self._percentile_supported = False
+
+        if by_location is None:
+            by_location = {}
+            for location in locations:
+                count = self.collection.count_documents(
+                    {**self.query, 'location': location, 'price': {'$ne': None}}
+                )
+                if count:
+                    values = self._quantiles([0, 0.25, 0.5, 0.75, 1], count, {'location': location})
+                    by_location[location] = (*values, count)
+        return [box_summary(location, *by_location[location]) for location in locations if location in by_location]
+
+    def chart_summaries(self, bins: int = 30, top_n: int = 10, box_top_n: int = 20) -> Dict[str, Any]:
+        """在服务端计算绘图所需的汇总数据,结构与 DataAnalyzer.chart_summaries 相同
+
+        Args:
+            bins: 价格直方图的分箱数量
+            top_n: 地区和类别柱状图的取值个数
+            box_top_n: 价格箱线图包含的地区个数(按商品数量排序)
+
+        Returns:
+            图表名称到汇总数据的字典,没有数据时为空字典
+        """
+        price_range = self._aggregate(
+            {'$match': {'price': {'$ne': None}}},
+            {'$group': {'_id': None, 'min': {'$min': '$price'}, 'max': {'$max': '$price'}}}
+        )
+        if not price_range:
+            return {}
+
+        # 与 numpy.histogram 相同的等宽边界,最大值计入最后一个区间
+        minimum, maximum = float(price_range[0]['min']), float(price_range[0]['max'])
+        if minimum == maximum:
+            minimum, maximum = minimum - 0.5, maximum + 0.5
+        width = (maximum - minimum) / bins
+        edges = [minimum + width * i for i in range(bins)] + [maximum]
+
+        top_locations = list(self._value_counts('location', max(top_n, box_top_n)).items())
+        summaries = {
+            'price_distribution': {'edges': edges, 'counts': self._bucket_counts(edges)},
+            'location_distribution': dict(top_locations[:top_n]),
+            'category_distribution': self._value_counts('category_id', top_n),
+            'price_by_location': self._location_boxes([location for location, _ in top_locations[:box_top_n]])
+        }
+
+        logger.info("Chart summaries calculated successfully")
+        return summaries
@@ -0,0 +1,135 @@
+"""批量导入的命令行运行器
+
+将导入流程拆分为 ingest → store → {analyze, visualize} 四个阶段,按依赖关系运行,
+analyze 和 visualize 可以并发。每个阶段完成后状态保存在 --state-dir 中,中途失败后
+再次运行同样的命令会跳过已完成的阶段,store 阶段还会跳过已写入的中间文件:
+
+    python src/cli.py --source "data/raw/2024-*/*.json.gz" --parse-workers 8 --write-batch-size 5000
+    python src/cli.py --stages analyze,visualize --chart-workers 4
+    python src/cli.py --rerun visualize
+    python src/cli.py --restart
+
+未在命令行指定的参数取 config/settings.py 中对应环境变量的值。
+"""
+import argparse
+import os
+import sys
+from typing import List, Dict, Any, Optional
+
+# 命令行参数对应的环境变量,在导入 config.settings 之前写入,使所有模块看到相同的配置
+ENV_OPTIONS = {
+    'source': 'RAW_DATA_SOURCE',
+    'batch_size': 'INGEST_BATCH_SIZE',
+    'parse_workers': 'PARSE_WORKERS',
+    'parse_chunk_size': 'PARSE_CHUNK_SIZE',
+    'write_batch_size': 'WRITE_BATCH_SIZE',
+    'write_mode': 'WRITE_MODE',
+    'chart_workers': 'CHART_WORKERS',
+    'json_backend': 'JSON_BACKEND',
+    'state_dir': 'RUN_STATE_DIR',
+    'metrics_file': 'METRICS_FILE'
+}
+
+STAGES = ('ingest', 'store', 'analyze', 'visualize')
+
+
+def _stage_list(value: str) -> List[str]:
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+    return names
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', type=_stage_list, help='逗号分隔的阶段,默认为全部阶段;未选中的依赖视为已完成')
+    parser.add_argument('--rerun', type=_stage_list, default=[], help='即使已完成也重新运行的阶段')
+    parser.add_argument('--restart', action='store_true', help='忽略上次的运行状态,从头开始')
+    parser.add_argument('--source', help='原始数据文件、目录或glob (RAW_DATA_SOURCE)')
+    parser.add_argument('--batch-size', type=int, help='ingest 阶段每个中间文件的商品数 (INGEST_BATCH_SIZE)')
+    parser.add_argument('--parse-workers', type=int, help='解析进程数,0表示使用全部CPU核 (PARSE_WORKERS)')
+    parser.add_argument('--parse-chunk-size', type=int, help='每次派发给解析进程的文件数 (PARSE_CHUNK_SIZE)')
+    parser.add_argument('--write-batch-size', type=int, help='每次写入MongoDB的商品数 (WRITE_BATCH_SIZE)')
+    parser.add_argument('--write-mode', choices=('insert', 'upsert'), help='MongoDB写入方式 (WRITE_MODE)')
+    parser.add_argument('--chart-workers', type=int, help='图表渲染进程数,0表示自动选择 (CHART_WORKERS)')
+    parser.add_argument('--stage-workers', type=int, default=2, help='同时运行的阶段数')
+    parser.add_argument('--json-backend', choices=('auto', 'orjson', 'simdjson', 'json'), help='JSON后端 (JSON_BACKEND)')
+    parser.add_argument('--state-dir', help='运行状态和中间结果目录 (RUN_STATE_DIR)')
+    parser.add_argument('--metrics-file', help='指标导出文件,.prom 后缀为Prometheus格式 (METRICS_FILE)')
+    args = parser.parse_args(argv)
+    for option in ('batch_size', 'write_batch_size', 'stage_workers'):
+        value = getattr(args, option)
+        if value is not None and value <= 0:
+            parser.error(f"--{option.replace('_', '-')} must be positive")
+    return args
+
+
+def run_config(settings) -> Dict[str, Any]:
+    """影响中间结果和写入目标的配置,变化后不能继续上次的运行
+
+    解析进程数、写入批次大小等只影响速度的参数不包含在内,可以在恢复运行时修改。
+    """
+    from data.processor import JsonProcessor
+    from storage.result_cache import file_fingerprint
+
+    return {
+        'source': settings.RAW_DATA_SOURCE,
+        'files': file_fingerprint(JsonProcessor.iter_raw_files(settings.RAW_DATA_SOURCE),
+                                  settings.CACHE_HASH_CONTENTS),
+        'batch_size': settings.INGEST_BATCH_SIZE,
+        'mongodb': [settings.MONGODB_URI, settings.MONGODB_DB, settings.MONGODB_COLLECTION],
+        'write_mode': settings.WRITE_MODE,
+        'upsert_keys': settings.UPSERT_KEYS,
+        'analysis_mode': settings.ANALYSIS_MODE,
+        'change_detection': settings.CHANGE_DETECTION,
+        'price_history': settings.PRICE_HISTORY and settings.PRICE_HISTORY_DIR,
+        'parquet_export': settings.PARQUET_EXPORT and settings.PARQUET_DIR,
+        'dedup': settings.DEDUP and [settings.DEDUP_INDEX_FILE, settings.DEDUP_THRESHOLD],
+        'dedup_collapse': settings.DEDUP_COLLAPSE
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """运行选中的阶段
+
+    Returns:
+        进程退出码,所有选中的阶段都完成时为0
+    """
+    args = parse_args(argv)
+    for option, name in ENV_OPTIONS.items():
+        value = getattr(args, option)
+        if value is not None:
+            os.environ[name] = str(value)
+
+    from loguru import logger
+    from config import settings
+    from main import export_metrics, setup
+    from runner.dag import DagRunner, RunState, DONE
+    from runner.stages import BackfillStages
+    from telemetry import metrics
+    from telemetry.metrics import MetricsRegistry
+
+    setup()
+    registry = MetricsRegistry(settings.METRICS_TRACE_MEMORY, settings.METRICS_PROFILE_DIR or None)
+    metrics.set_registry(registry)
+    backfill = BackfillStages(settings.RAW_DATA_SOURCE, settings.INGEST_BATCH_SIZE, settings.PARSE_WORKERS,
+                              settings.PARSE_CHUNK_SIZE, settings.CHART_WORKERS)
+    try:
+        state = RunState(settings.RUN_STATE_DIR, run_config(settings), restart=args.restart)
+        runner = DagRunner(backfill.stages(), state, args.stage_workers)
+        statuses = runner.run(args.stages, args.rerun)
+        path = backfill.save_results(state)
+        if path is not None:
+            logger.info(f"Saved analysis results to {path}")
+    finally:
+        backfill.close()
+        export_metrics(registry, settings.METRICS_FILE)
+
+    for name, status in statuses.items():
+        logger.info(f"Stage {name}: {status}")
+    return 0 if all(status == DONE for status in statuses.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
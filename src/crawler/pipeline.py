@@ -0,0 +1,211 @@
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional, Callable, Iterable, Awaitable
+from loguru import logger
+from data import codec
+from data.processor import JsonProcessor
+from data.schema import lookup
+from crawler.scheduler import CrawlScheduler
+from crawler.transport import SearchRequest, Transport, TransportError
+
+# 响应中表示还有下一页的字段
+HAS_NEXT_PAGE_PATH = ('data', 'resultInfo', 'hasNextPage')
+
+
+@dataclass
+class CrawlStats:
+    """一次抓取的统计"""
+    pages_fetched: int = 0
+    pages_failed: int = 0
+    retries: int = 0
+    items_parsed: int = 0
+    items_stored: int = 0
+    items_failed: int = 0
+    store_batches: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0, rng: random.Random = random) -> float:
+    """指数退避加全抖动:在 [0, min(cap, base * 2^attempt)] 内均匀取值,避免重试同时发生"""
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CrawlPipeline:
+    """fetch → parse → store 异步流水线
+
+    三个阶段各有独立的并发数,阶段之间用有界队列连接:存储变慢时解析阶段在
+    put 上等待,继而抓取阶段停止取新请求,因此内存中最多只有
+    queue_size 个响应和 queue_size 页商品,与抓取总量无关。
+    请求的顺序由 CrawlScheduler 决定:每个关键词从第1页开始抓取,响应中 hasNextPage
+    为真且未超过 max_pages 时再调度下一页,同一关键词的各页依次抓取,不同关键词之间并行。
+    fetch_concurrency 是抓取协程数,调度器的并发控制只能在此之下调整。
+    """
+
+    def __init__(self, transport: Transport, store: Callable[[List[Dict[str, Any]]], Any],
+                 fetch_concurrency: int = 4, parse_concurrency: int = 1, store_concurrency: int = 1,
+                 queue_size: int = 16, store_batch_size: int = 1000, max_pages: int = 10,
+                 page_size: int = 30, max_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_cap: float = 30.0, raw_dir: Optional[str] = None,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        """初始化流水线
+
+        Args:
+            transport: 请求传输
+            store: 写入一批商品的阻塞函数,在线程中执行,例如 main.store_items
+            fetch_concurrency: 同时进行的请求数
+            parse_concurrency: 解析协程数
+            store_concurrency: 写入协程数
+            queue_size: 阶段之间队列的容量
+            store_batch_size: 每次写入的商品数
+            max_pages: 每个关键词最多抓取的页数,只在未传入调度器时使用
+            page_size: 每页商品数,只在未传入调度器时使用
+            max_retries: 单个请求的最大重试次数
+            backoff_base: 退避的初始秒数
+            backoff_cap: 退避的最大秒数
+            raw_dir: 保存原始响应的目录,之后可以用文件模式重新处理
+            sleep: 等待函数,测试时可以替换
+        """
+        self.transport = transport
+        self.store = store
+        self.fetch_concurrency = fetch_concurrency
+        self.parse_concurrency = parse_concurrency
+        self.store_concurrency = store_concurrency
+        self.queue_size = queue_size
+        self.store_batch_size = store_batch_size
+        self.max_pages = max_pages
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.raw_dir = raw_dir
+        self.sleep = sleep
+        self.stats = CrawlStats()
+
+    async def _fetch(self, request: SearchRequest) -> Optional[Dict[str, Any]]:
+        """发送请求,可重试的错误按退避重试,最终失败时返回None"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.transport.fetch(request)
+            except TransportError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    logger.error(f"Giving up on {request.keyword} page {request.page}: {e}")
+                    return None
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                self.stats.retries += 1
+                logger.warning(f"Retrying {request.keyword} page {request.page} in {delay:.2f}s: {e}")
+                await self.sleep(delay)
+        return None
+
+    def _save_raw(self, request: SearchRequest, data: Dict[str, Any]) -> None:
+        path = os.path.join(self.raw_dir, f"{request.keyword}-p{request.page:03d}-{time.time_ns()}.json")
+        with open(path, 'wb') as f:
+            f.write(codec.dumps(data))
+
+    async def run(self, keywords: Iterable[str] = (), scheduler: Optional[CrawlScheduler] = None,
+                  wait_for_delayed: bool = False) -> CrawlStats:
+        """抓取关键词并写入存储
+
+        Args:
+            keywords: 搜索关键词,未传入 scheduler 时使用
+            scheduler: 抓取调度器,负责任务顺序、限速和并发控制;为None时每个关键词
+                依次抓取各页,不限速,并发数为 fetch_concurrency
+            wait_for_delayed: 是否等待调度器中未到期的任务,为False时处理完到期任务即返回
+
+        Returns:
+            抓取统计
+        """
+        start = time.perf_counter()
+        self.stats = CrawlStats()
+        if self.raw_dir:
+            os.makedirs(self.raw_dir, exist_ok=True)
+        if scheduler is None:
+            scheduler = CrawlScheduler(keywords, max_pages=self.max_pages, page_size=self.page_size)
+        clock = scheduler.clock
+
+        responses: asyncio.Queue = asyncio.Queue(self.queue_size)
+        pages: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        async def fetch_worker():
+            while True:
+                request = await scheduler.next_job(wait_for_delayed)
+                if request is None:
+                    return
+                started = clock.now()
+                data = await self._fetch(request)
+                latency = clock.now() - started
+                if data is None:
+                    self.stats.pages_failed += 1
+                    await scheduler.complete(request, error=True, latency=latency)
+                    continue
+                self.stats.pages_fetched += 1
+                await responses.put((request, data, latency))
+
+        async def parse_worker():
+            while True:
+                entry = await responses.get()
+                if entry is None:
+                    return
+                request, data, latency = entry
+                items, error = [], False
+                try:
+                    if self.raw_dir:
+                        await asyncio.to_thread(self._save_raw, request, data)
+                    items = await asyncio.to_thread(JsonProcessor.process_items, data)
+                    self.stats.items_parsed += len(items)
+                    if items:
+                        await pages.put(items)
+                except Exception as e:
+                    error = True
+                    logger.error(f"Error processing {request.keyword} page {request.page}: {str(e)}")
+                finally:
+                    has_next = bool(lookup(data, HAS_NEXT_PAGE_PATH, False))
+                    await scheduler.complete(request, items, has_next, error, latency)
+
+        async def store_worker():
+            batch = []
+            while True:
+                items = await pages.get()
+                if items is not None:
+                    batch.extend(items)
+                if batch and (items is None or len(batch) >= self.store_batch_size):
+                    try:
+                        await asyncio.to_thread(self.store, batch)
+                        self.stats.items_stored += len(batch)
+                        self.stats.store_batches += 1
+                    except Exception as e:
+                        self.stats.items_failed += len(batch)
+                        logger.error(f"Error storing {len(batch)} items: {str(e)}")
+                    batch = []
+                if items is None:
+                    return
+
+        fetchers = [asyncio.create_task(fetch_worker()) for _ in range(self.fetch_concurrency)]
+        parsers = [asyncio.create_task(parse_worker()) for _ in range(self.parse_concurrency)]
+        storers = [asyncio.create_task(store_worker()) for _ in range(self.store_concurrency)]
+        try:
+            # 调度器没有剩余任务时抓取协程退出,之后依次向下游发送结束标记
+            await asyncio.gather(*fetchers)
+            for _ in parsers:
+                await responses.put(None)
+            await asyncio.gather(*parsers)
+            for _ in storers:
+                await pages.put(None)
+            await asyncio.gather(*storers)
+        finally:
+            for task in fetchers + parsers + storers:
+                task.cancel()
+            scheduler.save()
+
+        self.stats.seconds = time.perf_counter() - start
+        logger.info(
+            f"Crawled {self.stats.pages_fetched} pages ({self.stats.pages_failed} failed, "
+            f"{self.stats.retries} retries), stored {self.stats.items_stored} items "
+            f"in {self.stats.seconds:.2f}s"
+        )
+        return self.stats
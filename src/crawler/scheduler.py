@@ -0,0 +1,411 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional, Iterable
+from loguru import logger
+from crawler.transport import SearchRequest
+
+
+class SystemClock:
+    """墙上时钟,持久化的调度时间在重启之后仍然有效"""
+
+    def now(self) -> float:
+        return time.time()
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(max(seconds, 0))
+
+
+class FakeClock:
+    """测试用时钟,sleep 立即返回并把时间拨到唤醒时刻"""
+
+    def __init__(self, start: float = 0.0):
+        self.time = start
+
+    def now(self) -> float:
+        return self.time
+
+    async def sleep(self, seconds: float) -> None:
+        target = self.time + max(seconds, 0)
+        # 先让出一次,同一轮开始等待的协程共享同一段时间,而不是累加
+        await asyncio.sleep(0)
+        self.time = max(self.time, target)
+
+    def advance(self, seconds: float) -> None:
+        self.time += seconds
+
+
+class TokenBucket:
+    """令牌桶限速:平均每秒 rate 个请求,允许 capacity 个请求的突发"""
+
+    def __init__(self, rate: float, capacity: float, clock=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock or SystemClock()
+        self.tokens = capacity
+        self.updated = self.clock.now()
+
+    def _refill(self) -> None:
+        now = self.clock.now()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        """取一个令牌,没有令牌时等待到下一个令牌生成"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await self.clock.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveConcurrency:
+    """根据延迟和错误率调整并发上限(AIMD)
+
+    每个成功且延迟低于目标的请求使上限增加 1/上限,即每轮约加1;最近 window 个请求的
+    错误率超过阈值或延迟中位数超过目标时上限减半,之后清空窗口,避免同一批慢请求
+    连续触发多次减半。
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16,
+                 latency_target: float = 2.0, error_threshold: float = 0.2, window: int = 20):
+        """初始化并发控制
+
+        Args:
+            initial: 初始并发上限
+            minimum: 最小并发
+            maximum: 最大并发
+            latency_target: 目标延迟秒数
+            error_threshold: 允许的错误率
+            window: 统计错误率和延迟的请求数
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.error_threshold = error_threshold
+        self.window = window
+        self.in_flight = 0
+        self.samples = deque(maxlen=window)
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        # 在事件循环中首次使用时创建
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> None:
+        """等待一个并发名额"""
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, error: bool = False) -> None:
+        """归还名额并记录请求结果
+
+        Args:
+            latency: 请求耗时秒数
+            error: 请求是否最终失败
+        """
+        async with self.condition:
+            self.in_flight -= 1
+            self.samples.append((latency, error))
+            errors = sum(1 for _, failed in self.samples if failed)
+            latencies = sorted(latency for latency, _ in self.samples)
+            median = latencies[len(latencies) // 2]
+            window_full = len(self.samples) >= min(self.window, max(int(self.limit), 1))
+            if window_full and (errors / len(self.samples) > self.error_threshold or median > self.latency_target):
+                self.limit = max(self.minimum, self.limit / 2)
+                self.samples.clear()
+                logger.warning(f"Crawl concurrency reduced to {int(self.limit)} "
+                               f"(error rate {errors}/{len(latencies)}, median latency {median:.2f}s)")
+            elif not error and latency <= self.latency_target:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+@dataclass
+class KeywordState:
+    """关键词的调度状态
+
+    Attributes:
+        volatility: 结果变化程度,0到1之间,越大越优先、重新抓取间隔越短
+        last_crawled: 上一轮抓取完成的时间
+        snapshot: 最近看到的 商品ID -> 价格,用于判断新商品和价格变化
+    """
+    volatility: float = 0.5
+    last_crawled: Optional[float] = None
+    snapshot: Dict[str, float] = field(default_factory=dict)
+
+
+def volatility_from_collection(collection, window_hours: float = 24.0,
+                               now: Optional[float] = None) -> Dict[str, float]:
+    """根据已存储商品的发布时间估计各关键词的变化程度
+
+    变化程度取最近 window_hours 内发布的商品占该关键词商品总数的比例,
+    用于在还没有抓取记录时初始化调度优先级。
+
+    Args:
+        collection: 商品集合
+        window_hours: 统计窗口小时数
+        now: 当前时间戳(秒),默认为当前时间
+
+    Returns:
+        关键词到变化程度的字典
+    """
+    since_ms = int(((now if now is not None else time.time()) - window_hours * 3600) * 1000)
+    groups = collection.aggregate([
+        {'$match': {'keyword': {'$ne': None}}},
+        {'$group': {
+            '_id': '$keyword',
+            'total': {'$sum': 1},
+            'recent': {'$sum': {'$cond': [{'$gte': ['$publish_time', since_ms]}, 1, 0]}}
+        }}
+    ])
+    return {doc['_id']: doc['recent'] / doc['total'] for doc in groups if doc['total']}
+
+
+class CrawlScheduler:
+    """关键词/页码抓取调度器
+
+    待抓取的 (关键词, 页码) 任务保存在按优先级排序的堆中,优先级为关键词的变化程度,
+    同一关键词的页码越小越优先。每一页抓取完成后根据新商品和价格变化的比例更新
+    变化程度(指数滑动平均);一轮抓取结束后,关键词在
+    min_interval + (max_interval - min_interval) * (1 - 变化程度) 秒后重新进入队列。
+
+    每个主机有独立的令牌桶限速,并发上限由 AdaptiveConcurrency 根据延迟和错误率调整。
+    队列和关键词状态保存在 state_file 中:已完成的页不会重复抓取,中断时正在抓取的页
+    在重启后重新入队。
+    """
+
+    def __init__(self, keywords: Iterable[str] = (), state_file: Optional[str] = None, clock=None,
+                 max_pages: int = 10, page_size: int = 30, host: str = 'default',
+                 host_rate: Optional[float] = None, host_burst: float = 5,
+                 concurrency: Optional[AdaptiveConcurrency] = None,
+                 min_interval: float = 600.0, max_interval: float = 86400.0,
+                 smoothing: float = 0.3, checkpoint_interval: float = 5.0,
+                 initial_volatility: Optional[Dict[str, float]] = None):
+        """初始化调度器
+
+        Args:
+            keywords: 需要跟踪的关键词
+            state_file: 状态文件路径,存在时从中恢复队列
+            clock: 时钟,测试时使用 FakeClock
+            max_pages: 每个关键词每轮最多抓取的页数
+            page_size: 每页商品数
+            host: 请求的主机,用于区分令牌桶
+            host_rate: 每个主机每秒的请求数,为None时不限速
+            host_burst: 令牌桶容量
+            concurrency: 并发控制,为None时不限制
+            min_interval: 变化程度为1的关键词的重新抓取间隔秒数
+            max_interval: 变化程度为0的关键词的重新抓取间隔秒数
+            smoothing: 变化程度滑动平均中新观测值的权重
+            checkpoint_interval: 两次自动保存状态之间的最短秒数
+            initial_volatility: 没有抓取记录的关键词的初始变化程度,见 volatility_from_collection
+        """
+        self.clock = clock or SystemClock()
+        self.state_file = state_file
+        self.max_pages = max_pages
+        self.page_size = page_size
+        self.host = host
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        self.checkpoint_interval = checkpoint_interval
+        self.keywords: Dict[str, KeywordState] = {}
+        # 就绪任务堆: (-优先级, 页码, 序号, 请求);延迟任务堆: (可执行时间, 序号, 请求)
+        self.ready: List[tuple] = []
+        self.delayed: List[tuple] = []
+        self.in_flight: Dict[SearchRequest, float] = {}
+        self._sequence = itertools.count()
+        self._last_save = self.clock.now()
+        self._condition: Optional[asyncio.Condition] = None
+
+        if state_file and os.path.exists(state_file):
+            self._load(state_file)
+        for keyword in keywords:
+            volatility = (initial_volatility or {}).get(keyword)
+            self.add_keyword(keyword, volatility)
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _queued_keywords(self) -> set:
+        requests = [entry[-1] for entry in self.ready + self.delayed] + list(self.in_flight)
+        return {request.keyword for request in requests}
+
+    def _push(self, request: SearchRequest, not_before: Optional[float] = None) -> None:
+        if not_before is not None and not_before > self.clock.now():
+            heapq.heappush(self.delayed, (not_before, next(self._sequence), request))
+        else:
+            priority = self.keywords[request.keyword].volatility
+            heapq.heappush(self.ready, (-priority, request.page, next(self._sequence), request))
+
+    def add_keyword(self, keyword: str, volatility: Optional[float] = None) -> None:
+        """开始跟踪一个关键词,已经在队列中的关键词不会重复入队
+
+        Args:
+            keyword: 搜索关键词
+            volatility: 初始变化程度,只对新关键词生效
+        """
+        state = self.keywords.get(keyword)
+        if state is None:
+            state = self.keywords[keyword] = KeywordState()
+            if volatility is not None:
+                state.volatility = volatility
+        if keyword not in self._queued_keywords():
+            self._push(SearchRequest(keyword, 1, self.page_size))
+
+    def interval(self, keyword: str) -> float:
+        """关键词一轮抓取结束后到下一轮开始的间隔秒数"""
+        volatility = self.keywords[keyword].volatility
+        return self.min_interval + (self.max_interval - self.min_interval) * (1 - volatility)
+
+    def _bucket(self, host: str) -> Optional[TokenBucket]:
+        if self.host_rate is None:
+            return None
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.host_rate, self.host_burst, self.clock)
+        return self.buckets[host]
+
+    def _promote(self) -> None:
+        """将到期的延迟任务移入就绪堆"""
+        now = self.clock.now()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, _, request = heapq.heappop(self.delayed)
+            self._push(request)
+
+    async def next_job(self, wait_for_delayed: bool = False) -> Optional[SearchRequest]:
+        """取下一个要抓取的请求,按主机限速并占用一个并发名额
+
+        Args:
+            wait_for_delayed: 没有就绪任务时是否等待延迟任务到期;为False时只处理当前到期的任务,
+                适合定时运行的批处理
+
+        Returns:
+            搜索请求,所有任务都已完成(或只剩未到期的任务)时返回None
+        """
+        while True:
+            async with self.condition:
+                self._promote()
+                if self.ready:
+                    _, _, _, request = heapq.heappop(self.ready)
+                    self.in_flight[request] = self.clock.now()
+                    break
+                if self.in_flight:
+                    # 正在抓取的页可能会调度下一页
+                    await self.condition.wait()
+                    continue
+                if not self.delayed or not wait_for_delayed:
+                    return None
+                wake_at = self.delayed[0][0]
+            await self.clock.sleep(wake_at - self.clock.now())
+
+        bucket = self._bucket(self.host)
+        if bucket is not None:
+            await bucket.acquire()
+        if self.concurrency is not None:
+            await self.concurrency.acquire()
+        # 从发出请求开始计算延迟
+        self.in_flight[request] = self.clock.now()
+        return request
+
+    def _observe(self, keyword: str, items: List[Dict[str, Any]]) -> None:
+        """根据一页结果中新商品和价格变化的比例更新变化程度"""
+        state = self.keywords[keyword]
+        changed = 0
+        for item in items:
+            item_id, price = item.get('item_id'), item.get('price')
+            if item_id is None:
+                continue
+            previous = state.snapshot.pop(item_id, None)
+            if previous is None or previous != price:
+                changed += 1
+            # 重新插入到末尾,快照超出容量时先淘汰最久未出现的商品
+            state.snapshot[item_id] = price
+        limit = self.max_pages * self.page_size * 2
+        while len(state.snapshot) > limit:
+            del state.snapshot[next(iter(state.snapshot))]
+        if items:
+            state.volatility += self.smoothing * (changed / len(items) - state.volatility)
+
+    async def complete(self, request: SearchRequest, items: Optional[List[Dict[str, Any]]] = None,
+                       has_next: bool = False, error: bool = False, latency: Optional[float] = None) -> None:
+        """记录一个请求的结果并调度后续任务
+
+        Args:
+            request: next_job 返回的请求
+            items: 解析得到的商品
+            has_next: 响应中是否还有下一页
+            error: 请求是否最终失败
+            latency: 请求耗时秒数,默认为从 next_job 返回到现在的时间
+        """
+        async with self.condition:
+            started = self.in_flight.pop(request, self.clock.now())
+            if latency is None:
+                latency = self.clock.now() - started
+            if not error and items:
+                self._observe(request.keyword, items)
+
+            if not error and items and has_next and request.page < self.max_pages:
+                self._push(SearchRequest(request.keyword, request.page + 1, request.page_size))
+            else:
+                # 本轮结束,按变化程度安排下一轮
+                state = self.keywords[request.keyword]
+                state.last_crawled = self.clock.now()
+                not_before = self.clock.now() + self.interval(request.keyword)
+                self._push(SearchRequest(request.keyword, 1, self.page_size), not_before)
+            self.condition.notify_all()
+
+        if self.concurrency is not None:
+            await self.concurrency.release(latency, error)
+        if self.state_file and self.clock.now() - self._last_save >= self.checkpoint_interval:
+            self.save()
+
+    def to_dict(self) -> Dict[str, Any]:
+        jobs = [
+            {**asdict(request), 'not_before': None} for *_, request in self.ready
+        ] + [
+            {**asdict(request), 'not_before': not_before} for not_before, _, request in self.delayed
+        ] + [
+            # 正在抓取的页在恢复时重新入队
+            {**asdict(request), 'not_before': None} for request in self.in_flight
+        ]
+        return {
+            'keywords': {keyword: asdict(state) for keyword, state in self.keywords.items()},
+            'jobs': jobs
+        }
+
+    def _load(self, file_path: str) -> None:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.keywords = {keyword: KeywordState(**state) for keyword, state in data['keywords'].items()}
+        for job in data['jobs']:
+            not_before = job.pop('not_before')
+            self._push(SearchRequest(**job), not_before)
+        logger.info(f"Resumed crawl schedule with {len(data['jobs'])} jobs from {file_path}")
+
+    def save(self) -> None:
+        """保存队列和关键词状态,先写临时文件再替换"""
+        if not self.state_file:
+            return
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_file)
+        self._last_save = self.clock.now()
@@ -0,0 +1,99 @@
+import asyncio
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+from data import codec
+
+
+@dataclass(frozen=True)
+class SearchRequest:
+    """一次搜索结果页请求"""
+    keyword: str
+    page: int = 1
+    page_size: int = 30
+
+
+class TransportError(Exception):
+    """请求失败
+
+    Attributes:
+        retryable: 是否值得重试,例如超时、限流和服务端错误
+    """
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class Transport:
+    """请求发送方式的接口,实现 fetch 即可替换真实接口,例如本地桩服务或回放文件"""
+
+    async def fetch(self, request: SearchRequest) -> Dict[str, Any]:
+        """发送请求并返回解析后的响应JSON
+
+        Args:
+            request: 搜索请求
+
+        Returns:
+            与 response.json 结构相同的响应
+
+        Raises:
+            TransportError: 请求失败
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """释放连接等资源"""
+
+
+class HttpTransport(Transport):
+    """基于标准库 urllib 的HTTP传输
+
+    以JSON请求体 POST {'keyword', 'pageNumber', 'rowsPerPage'} 到 endpoint,阻塞的网络调用
+    在线程池中执行,因此不占用事件循环。接口签名、Cookie等鉴权信息通过 headers 传入。
+    """
+
+    # 这些状态码表示暂时性错误,可以重试
+    RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+    def __init__(self, endpoint: str, headers: Optional[Dict[str, str]] = None, timeout: float = 10.0):
+        """初始化HTTP传输
+
+        Args:
+            endpoint: 搜索接口地址
+            headers: 额外的请求头
+            timeout: 单次请求超时秒数
+        """
+        self.endpoint = endpoint
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+        self.timeout = timeout
+
+    def _fetch_sync(self, request: SearchRequest) -> Dict[str, Any]:
+        body = codec.dumps({
+            'keyword': request.keyword,
+            'pageNumber': request.page,
+            'rowsPerPage': request.page_size
+        })
+        http_request = urllib.request.Request(self.endpoint, data=body, headers=self.headers, method='POST')
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                payload = response.read()
+        except urllib.error.HTTPError as e:
+            raise TransportError(f"HTTP {e.code} for {request}", e.code in self.RETRYABLE_STATUS) from e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise TransportError(f"Request failed for {request}: {e}") from e
+
+        try:
+            data = codec.loads(payload)
+        except ValueError as e:
+            raise TransportError(f"Invalid JSON response for {request}: {e}") from e
+
+        # mtop 接口在HTTP 200 中以 ret 字段返回限流、验证等错误
+        ret = data.get('ret') if isinstance(data, dict) else None
+        if ret and not str(ret[0]).startswith('SUCCESS'):
+            raise TransportError(f"API error for {request}: {ret[0]}")
+        return data
+
+    async def fetch(self, request: SearchRequest) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._fetch_sync, request)
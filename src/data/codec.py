@@ -0,0 +1,233 @@
+import json
+import threading
+from datetime import date, datetime
+from typing import Dict, Any, Tuple, Union
+from loguru import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# 部分解码搜索结果时只保留的部分(与 SCHEMA_V1 的路径一致):商品列表中每个元素的
+# 商品主体,以及关键词和分页所在的搜索信息
+RESULT_LIST_PATH = ('data', 'resultList')
+RESULT_ITEM_PATH = ('data', 'item', 'main')
+RESULT_INFO_PATHS = (
+    ('data', 'resultInfo', 'sqiControlFields'),
+    ('data', 'resultInfo', 'hasNextPage'),
+)
+
+JsonInput = Union[bytes, bytearray, memoryview, str]
+
+
+def _default(obj: Any) -> Any:
+    """序列化标准库和orjson都不直接支持的类型"""
+    if hasattr(obj, 'dtype') and hasattr(obj, 'item'):
+        # NumPy标量
+        return obj.item()
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _nest(path: Tuple[str, ...], value: Any, target: Dict[str, Any]) -> Dict[str, Any]:
+    """按路径把 value 放入 target 中,中间层按需创建"""
+    node = target
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
+    return target
+
+
+def _pointer(path: Tuple[str, ...]) -> str:
+    """将路径转换为JSON Pointer"""
+    return '/' + '/'.join(path)
+
+
+class JsonCodec:
+    """基于标准库 json 的编解码,也是其他后端的基类
+
+    所有后端解码失败时都抛出 ValueError 的子类。dumps 返回UTF-8字节,不转义非ASCII字符;
+    NaN的表示随后端不同(标准库输出 NaN,orjson 输出 null)。
+    """
+    name = 'json'
+
+    def loads(self, data: JsonInput) -> Any:
+        """解码完整文档"""
+        if isinstance(data, memoryview):
+            # 标准库 json 不接受 memoryview
+            data = bytes(data)
+        return json.loads(data)
+
+    def loads_search_result(self, data: JsonInput) -> Any:
+        """解码搜索结果,提取商品只需要 RESULT_ITEM_PATH 和 RESULT_INFO_PATHS
+
+        不支持部分解码的后端完整解码文档;完整解码后再裁剪比直接使用完整文档更慢,
+        因此不做裁剪。
+        """
+        return self.loads(data)
+
+    def dumps(self, obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+        """编码为UTF-8字节
+
+        Args:
+            obj: 要编码的对象
+            indent: 是否以2个空格缩进
+            sort_keys: 是否按键排序
+
+        Returns:
+            JSON字节
+        """
+        return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None,
+                          sort_keys=sort_keys, default=_default).encode('utf-8')
+
+
+class OrjsonCodec(JsonCodec):
+    """基于 orjson 的编解码,解码和编码都比标准库快数倍"""
+    name = 'orjson'
+
+    def loads(self, data: JsonInput) -> Any:
+        return orjson.loads(data)
+
+    def dumps(self, obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option)
+
+
+class SimdjsonCodec(JsonCodec):
+    """基于 pysimdjson 的部分解码
+
+    loads_search_result 先把文档解析为原生DOM,只把每个商品的 RESULT_ITEM_PATH 和
+    RESULT_INFO_PATHS 转换为Python对象,返回的文档只包含这些路径,结构与原文档相同;
+    商品主体之外的字段越多,相对完整解码越快。完整解码和编码使用 orjson(已安装时,
+    比simdjson转换全部对象更快)或标准库。
+    每个线程使用自己的解析器,解析器返回的代理对象在下一次解析后失效,因此返回前总是
+    转换为普通的 dict/list。
+    """
+    name = 'simdjson'
+
+    def __init__(self):
+        self._local = threading.local()
+        self._fallback = OrjsonCodec() if orjson is not None else JsonCodec()
+
+    @property
+    def parser(self):
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._local.parser = simdjson.Parser()
+        return parser
+
+    @staticmethod
+    def _at(node: Any, pointer: str) -> Any:
+        """取JSON Pointer处的值并转换为Python对象,不存在时返回None"""
+        try:
+            value = node.at_pointer(pointer)
+        except (KeyError, IndexError, TypeError):
+            return None
+        if isinstance(value, simdjson.Object):
+            return value.as_dict()
+        if isinstance(value, simdjson.Array):
+            return value.as_list()
+        return value
+
+    def loads(self, data: JsonInput) -> Any:
+        return self._fallback.loads(data)
+
+    def loads_search_result(self, data: JsonInput) -> Any:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        document = self.parser.parse(bytes(data))
+        try:
+            items = document.at_pointer(_pointer(RESULT_LIST_PATH))
+        except (KeyError, IndexError, TypeError):
+            items = None
+        if not isinstance(items, simdjson.Array):
+            # 不是搜索结果结构,完整返回以便其他版本的提取规则匹配
+            return self._fallback.loads(data)
+        item_pointer = _pointer(RESULT_ITEM_PATH)
+        pruned = _nest(RESULT_LIST_PATH, [
+            _nest(RESULT_ITEM_PATH, self._at(item, item_pointer), {}) for item in items
+        ], {})
+        for path in RESULT_INFO_PATHS:
+            value = self._at(document, _pointer(path))
+            if value is not None:
+                _nest(path, value, pruned)
+        return pruned
+
+    def dumps(self, obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+        return self._fallback.dumps(obj, indent, sort_keys)
+
+
+# 可用的后端,auto 时按顺序选择第一个已安装的;simdjson 只在原始响应中商品主体之外的
+# 字段较多时更快,需要通过 JSON_BACKEND 显式选择
+BACKENDS = {
+    'orjson': (OrjsonCodec, lambda: orjson is not None),
+    'json': (JsonCodec, lambda: True),
+    'simdjson': (SimdjsonCodec, lambda: simdjson is not None),
+}
+AUTO_BACKENDS = ('orjson', 'json')
+
+_codec: JsonCodec = None
+
+
+def get_codec(name: str = 'auto') -> JsonCodec:
+    """创建指定后端的编解码器
+
+    Args:
+        name: 'auto'、'simdjson'、'orjson' 或 'json';指定的后端未安装时回退到 auto
+
+    Returns:
+        编解码器
+    """
+    if name != 'auto':
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown JSON backend: {name}")
+        codec_class, available = BACKENDS[name]
+        if available():
+            return codec_class()
+        logger.warning(f"JSON backend {name} is not installed, falling back to auto")
+    for name in AUTO_BACKENDS:
+        codec_class, available = BACKENDS[name]
+        if available():
+            return codec_class()
+
+
+def set_backend(name: str = 'auto') -> JsonCodec:
+    """设置模块级函数 loads/dumps 使用的后端"""
+    global _codec
+    _codec = get_codec(name)
+    logger.debug(f"Using JSON backend {_codec.name}")
+    return _codec
+
+
+def codec() -> JsonCodec:
+    """当前使用的编解码器"""
+    if _codec is None:
+        set_backend()
+    return _codec
+
+
+def loads(data: JsonInput) -> Any:
+    """用当前后端解码完整文档"""
+    return codec().loads(data)
+
+
+def loads_search_result(data: JsonInput) -> Any:
+    """用当前后端惰性解码搜索结果,见 JsonCodec.loads_search_result"""
+    return codec().loads_search_result(data)
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    """用当前后端编码为UTF-8字节"""
+    return codec().dumps(obj, indent, sort_keys)
+
@@ -0,0 +1,121 @@
+import os
+from itertools import islice
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Sequence, Union
+import pandas as pd
+import pyarrow as pa
+from loguru import logger
+from pandas.api.types import union_categoricals
+from data.normalize import CATEGORY_FIELDS, normalize_frame
+from models.item import ITEM_FIELDS
+
+# 分析和绘图用到的字段,DataAnalyzer 和 DataVisualizer 可以共用同一个DataFrame
+FRAME_COLUMNS = ('price', 'location', 'category_id', 'keyword', 'want_count', 'original_price')
+
+# 商品数据来源:DataFrame、Parquet存储目录,或商品字典/字段值元组/DataFrame分块的可迭代对象
+FrameSource = Union[pd.DataFrame, str, Path, Iterable[Union[Dict[str, Any], tuple, pd.DataFrame]]]
+
+
+def _chunk_frame(chunk: List[Any], columns: Sequence[str]) -> pd.DataFrame:
+    """将一块商品字典或按 ITEM_FIELDS 排列的字段值元组转换为只含所需列的DataFrame"""
+    if isinstance(chunk[0], dict):
+        data = {name: [item.get(name) for item in chunk] for name in columns}
+    else:
+        positions = {name: ITEM_FIELDS.index(name) for name in columns}
+        data = {name: [row[position] for row in chunk] for name, position in positions.items()}
+    return pd.DataFrame(data, columns=list(columns))
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """合并已转换的分块,category列合并类别而不是退化为object
+
+    Args:
+        frames: 列相同的DataFrame分块
+
+    Returns:
+        合并后的DataFrame
+    """
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for name in frames[0].columns:
+        parts = [frame[name] for frame in frames]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            try:
+                columns[name] = pd.Series(union_categoricals(parts, ignore_order=True))
+            except TypeError:
+                # 各分块的类别类型不同,例如全为空的分块或数字与字符串混用
+                columns[name] = pd.concat([part.astype(object) for part in parts],
+                                          ignore_index=True).astype('category')
+        else:
+            columns[name] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_parquet_frame(root: Union[str, Path], columns: Optional[Sequence[str]] = FRAME_COLUMNS,
+                       filters: Optional[Sequence[tuple]] = None) -> pd.DataFrame:
+    """从Parquet存储读取所需的列,低基数字符串列以字典编码直接转换为category
+
+    Args:
+        root: Parquet存储根目录
+        columns: 需要读取的列,为None时读取所有列
+        filters: 过滤条件,例如 [('keyword', '=', 'iphone')]
+
+    Returns:
+        转换后的DataFrame
+    """
+    from storage.parquet_store import ParquetStore, build_filter
+
+    dataset = ParquetStore(str(root)).dataset()
+    if columns is not None:
+        columns = [name for name in columns if name in dataset.schema.names]
+    table = dataset.to_table(columns=columns, filter=build_filter(filters))
+    for name in CATEGORY_FIELDS:
+        index = table.schema.get_field_index(name)
+        if index >= 0 and not pa.types.is_dictionary(table.schema.field(index).type):
+            table = table.set_column(index, name, table.column(name).dictionary_encode())
+    logger.info(f"Loaded {table.num_rows} rows from Parquet store {root}")
+    return normalize_frame(table.to_pandas())
+
+
+def build_frame(source: FrameSource, columns: Optional[Sequence[str]] = FRAME_COLUMNS,
+                chunk_size: int = 100000, filters: Optional[Sequence[tuple]] = None) -> pd.DataFrame:
+    """由任意商品数据来源构建一个精简的DataFrame
+
+    只保留 columns 中的列;来源为列表或迭代器时按 chunk_size 分块转换,每块立即做
+    normalize_frame 的类型转换,object列不会在完整数据量上同时存在,峰值内存与
+    转换后的DataFrame大小相当。已转换的DataFrame原样返回,可以在 DataAnalyzer 和
+    DataVisualizer 之间共享而不复制。
+
+    Args:
+        source: DataFrame、Parquet存储目录,或商品字典/字段值元组/DataFrame分块的可迭代对象
+        columns: 需要保留的列,为None时保留所有列
+        chunk_size: 每块的商品数
+        filters: 过滤条件,只在读取Parquet时使用
+
+    Returns:
+        转换后的DataFrame
+    """
+    if isinstance(source, pd.DataFrame):
+        if columns is not None and not set(source.columns).issubset(columns):
+            source = source[[name for name in columns if name in source.columns]]
+        return normalize_frame(source)
+    if isinstance(source, (str, Path)):
+        if not os.path.isdir(source):
+            raise ValueError(f"Parquet store not found: {source}")
+        return read_parquet_frame(source, columns, filters)
+
+    names = list(columns) if columns is not None else list(ITEM_FIELDS)
+    frames = []
+    iterator = iter(source)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        if isinstance(chunk[0], pd.DataFrame):
+            frames.extend(build_frame(frame, columns) for frame in chunk)
+        else:
+            frames.append(normalize_frame(_chunk_frame(chunk, names)))
+    if not frames:
+        return normalize_frame(pd.DataFrame(columns=names))
+    return concat_frames(frames)
@@ -0,0 +1,92 @@
+from typing import Dict
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# 从字符串字段中提取数值后的目标类型
+NUMERIC_DTYPES: Dict[str, str] = {
+    'want_count': 'int32',
+    'seller_reviews_count': 'int32',
+    'seller_good_rating': 'float32',
+    'original_price': 'float32'
+}
+
+# 取值较少、适合用 category 存储的字段
+CATEGORY_FIELDS = ('location', 'keyword', 'category_id')
+
+# 匹配 '12人想要'、'好评率98%'、'¥199.00' 等字符串中的数字
+NUMBER_PATTERN = r'(?P<number>\d+(?:\.\d+)?)'
+
+
+def extract_number(column: pd.Series) -> pd.Series:
+    """按列提取字符串中的第一个数字
+
+    正则匹配和类型转换都由Arrow计算函数在整列上完成,不逐个调用Python函数;
+    已经是数值类型的列原样转换为float64。
+
+    Args:
+        column: 字符串或数值列
+
+    Returns:
+        float64列,无法提取时为NaN
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype('float64')
+    try:
+        text = pa.array(column, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # 混有数值等非字符串的值
+        text = pa.array(column.where(column.isna(), column.astype(str)), type=pa.string(), from_pandas=True)
+    # 去掉千位分隔符,例如 '1,299.00'
+    matched = pc.extract_regex(pc.replace_substring(text, ',', ''), NUMBER_PATTERN)
+    numbers = pc.cast(pc.struct_field(matched, [0]), pa.float64())
+    return pd.Series(numbers.to_numpy(zero_copy_only=False), index=column.index, dtype='float64')
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """将商品DataFrame中的字符串字段整列转换为数值和分类类型
+
+    - want_count、seller_reviews_count: int32,缺失为0
+    - seller_good_rating: float32,'98%' 转换为 0.98
+    - original_price: float32,缺失或为0时为NaN
+    - location、keyword、category_id: category
+    - discount_ratio: float32,1 - price / original_price,没有原价时为NaN
+
+    只处理存在的列,不修改传入的DataFrame。已经是目标类型的列不再转换,
+    因此对已转换的DataFrame重复调用不会复制数据。
+
+    Args:
+        df: 商品DataFrame,字段与 ITEM_FIELDS 相同
+
+    Returns:
+        转换后的DataFrame,未涉及的列与传入的DataFrame共享数据
+    """
+    pending = [
+        name for name, dtype in NUMERIC_DTYPES.items()
+        if name in df and df[name].dtype != dtype
+    ]
+    pending_categories = [
+        name for name in CATEGORY_FIELDS
+        if name in df and not isinstance(df[name].dtype, pd.CategoricalDtype)
+    ]
+    if not pending and not pending_categories:
+        return df
+
+    df = df.copy(deep=False)
+    for name in ('want_count', 'seller_reviews_count'):
+        if name in pending:
+            df[name] = extract_number(df[name]).fillna(0).astype(NUMERIC_DTYPES[name])
+    if 'seller_good_rating' in pending:
+        df['seller_good_rating'] = (extract_number(df['seller_good_rating']) / 100).astype('float32')
+    if 'original_price' in pending:
+        original = extract_number(df['original_price'])
+        df['original_price'] = original.where(original > 0).astype('float32')
+        if 'price' in df:
+            price = pd.to_numeric(df['price'], errors='coerce').to_numpy(dtype='float64')
+            original = df['original_price'].to_numpy(dtype='float64')
+            with np.errstate(invalid='ignore', divide='ignore'):
+                df['discount_ratio'] = (1 - price / original).astype('float32')
+    for name in pending_categories:
+        df[name] = df[name].astype('category')
+    return df
@@ -0,0 +1,210 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator, Union
+from loguru import logger
+from data.processor import JsonProcessor
+from data import codec
+
+
+@dataclass
+class FileResult:
+    """单个文件的解析结果"""
+    path: str
+    items: List[Dict[str, Any]]
+    errors: List[str]
+    worker_pid: int
+    seconds: float
+
+
+@dataclass
+class WorkerStats:
+    """单个工作进程的吞吐统计"""
+    pid: int
+    files: int = 0
+    items: int = 0
+    seconds: float = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'pid': self.pid,
+            'files': self.files,
+            'items': self.items,
+            'seconds': round(self.seconds, 4),
+            'items_per_second': round(self.items_per_second, 2)
+        }
+
+
+@dataclass
+class ParseReport:
+    """一次并行解析的汇总结果
+
+    流式解析(ParallelParser.iter_items)不保存商品,items 为空,只累计 item_count。
+    """
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    errors: Dict[str, List[str]] = field(default_factory=dict)
+    worker_stats: Dict[int, WorkerStats] = field(default_factory=dict)
+    files: int = 0
+    item_count: int = 0
+    seconds: float = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.item_count / self.seconds if self.seconds > 0 else 0.0
+
+    def add(self, result: FileResult) -> None:
+        """计入一个文件的错误和所在工作进程的吞吐量,不保存其中的商品"""
+        self.files += 1
+        self.item_count += len(result.items)
+        if result.errors:
+            self.errors[result.path] = result.errors
+
+        stats = self.worker_stats.setdefault(result.worker_pid, WorkerStats(pid=result.worker_pid))
+        stats.files += 1
+        stats.items += len(result.items)
+        stats.seconds += result.seconds
+
+
+def parse_file(path: str) -> FileResult:
+    """在工作进程中解析单个原始数据文件
+
+    读取和解码错误由 JsonProcessor.iter_documents 收集到结果中而不是只写日志,
+    以便主进程汇总每个文件的错误。
+
+    Args:
+        path: 原始数据文件路径
+
+    Returns:
+        文件解析结果
+    """
+    start = time.perf_counter()
+    items = []
+    errors = []
+    try:
+        for data in JsonProcessor.iter_documents(path, lazy=True, errors=errors):
+            items.extend(JsonProcessor.iter_items(data))
+    except Exception as e:
+        errors.append(f"Error processing items in {path}: {str(e)}")
+
+    return FileResult(
+        path=path,
+        items=items,
+        errors=errors,
+        worker_pid=os.getpid(),
+        seconds=time.perf_counter() - start
+    )
+
+
+def parse_files(paths: List[str]) -> List[FileResult]:
+    """在工作进程中依次解析一个分片内的文件"""
+    return [parse_file(path) for path in paths]
+
+
+class ParallelParser:
+    """基于进程池的并行解析引擎
+
+    输入文件按 chunk_size 分片派发给工作进程,结果按文件排序顺序返回,
+    因此同一输入在任意 workers 设置下都得到相同的输出顺序。
+    同时在途的分片数量被限制为 workers 的两倍,消费端较慢时内存不会无限增长。
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = 8):
+        """初始化并行解析器
+
+        Args:
+            workers: 工作进程数,默认为CPU核数
+            chunk_size: 每次派发给工作进程的文件数
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def iter_results(self, source: Union[str, Path]) -> Iterator[FileResult]:
+        """按文件顺序流式产出解析结果
+
+        Args:
+            source: 单个文件、目录或glob模式
+
+        Returns:
+            文件解析结果迭代器
+        """
+        paths = [str(path) for path in JsonProcessor.iter_raw_files(source)]
+        if not paths:
+            logger.warning(f"No raw data files found in {source}")
+            return
+
+        if self.workers == 1:
+            yield from map(parse_file, paths)
+            return
+
+        chunks = [paths[i:i + self.chunk_size] for i in range(0, len(paths), self.chunk_size)]
+        max_pending = self.workers * 2
+        # 工作进程使用与主进程相同的JSON后端
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=codec.set_backend,
+                                 initargs=(codec.codec().name,)) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(parse_files, chunk))
+                if len(pending) >= max_pending:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def _iter_reported(self, source: Union[str, Path], report: ParseReport) -> Iterator[FileResult]:
+        """按文件顺序产出解析结果,同时汇总到 report 中,迭代结束后写入日志"""
+        start = time.perf_counter()
+        for result in self.iter_results(source):
+            report.add(result)
+            for error in result.errors:
+                logger.error(error)
+            yield result
+        report.seconds = time.perf_counter() - start
+
+        logger.info(
+            f"Parsed {report.item_count} items from {report.files} files with {self.workers} workers "
+            f"in {report.seconds:.2f}s ({report.items_per_second:.0f} items/s), "
+            f"{len(report.errors)} files with errors"
+        )
+        for stats in report.worker_stats.values():
+            logger.info(
+                f"Worker {stats.pid}: {stats.files} files, {stats.items} items, "
+                f"{stats.items_per_second:.0f} items/s"
+            )
+
+    def iter_items(self, source: Union[str, Path], report: Optional[ParseReport] = None) -> Iterator[Dict[str, Any]]:
+        """按文件顺序流式产出商品
+
+        解析错误写入日志;每个文件的错误和各工作进程的吞吐量汇总到 report 中,
+        全部文件产出后写入日志。report 的 seconds 包含消费端处理商品的时间。
+
+        Args:
+            source: 单个文件、目录或glob模式
+            report: 可选的解析报告,不保存商品
+
+        Returns:
+            处理后的商品字典迭代器
+        """
+        for result in self._iter_reported(source, report if report is not None else ParseReport()):
+            yield from result.items
+
+    def parse(self, source: Union[str, Path]) -> ParseReport:
+        """并行解析全部文件并汇总结果
+
+        Args:
+            source: 单个文件、目录或glob模式
+
+        Returns:
+            包含商品、每个文件的错误和每个工作进程吞吐量的解析报告
+        """
+        report = ParseReport()
+        for result in self._iter_reported(source, report):
+            report.items.extend(result.items)
+        return report
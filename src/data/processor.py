@@ -1,19 +1,41 @@
-import json
-from typing import List, Dict, Any, Optional
+import glob
+import gzip
+import os
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Union
 from pathlib import Path
 from loguru import logger
-from models.item import Item
+from datetime import datetime
+from models.item import ITEM_FIELDS
+from data.schema import detect_schema
+from data import codec
+from telemetry import metrics
+
+# 支持的原始数据文件后缀
+JSON_SUFFIXES = ('.json', '.json.gz')
+JSON_LINES_SUFFIXES = ('.jsonl', '.jsonl.gz', '.ndjson', '.ndjson.gz')
 
 
 class JsonProcessor:
     """JSON数据处理器"""
     
     @staticmethod
-    def read_json_file(file_path: str) -> Optional[Dict[str, Any]]:
+    def _report_error(message: str, errors: Optional[List[str]]) -> None:
+        """传入 errors 时把错误追加到其中,否则写入日志"""
+        if errors is None:
+            logger.error(message)
+        else:
+            errors.append(message)
+
+    @staticmethod
+    def read_json_file(file_path: str, lazy: bool = False,
+                       errors: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
         """读取JSON文件
         
         Args:
             file_path: JSON文件路径
+            lazy: 是否只解码提取商品需要的部分,见 codec.loads_search_result
+            errors: 传入列表时错误信息追加到其中而不是写入日志
             
         Returns:
             解析后的JSON数据,如果出错则返回None
@@ -21,22 +43,141 @@ class JsonProcessor:
         try:
             file_path = Path(file_path)
             if not file_path.exists():
-                logger.error(f"File not found: {file_path}")
+                JsonProcessor._report_error(f"File not found: {file_path}", errors)
                 return None
                 
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logger.info(f"Successfully read JSON file: {file_path}")
-                return data
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON file {file_path}: {str(e)}")
+            with JsonProcessor._open_raw_file(file_path) as f:
+                payload = f.read()
+            metrics.add('processor.read', bytes=len(payload))
+            data = codec.loads_search_result(payload) if lazy else codec.loads(payload)
+            logger.info(f"Successfully read JSON file: {file_path}")
+            return data
+        except ValueError as e:
+            JsonProcessor._report_error(f"Failed to parse JSON file {file_path}: {str(e)}", errors)
             return None
         except Exception as e:
-            logger.error(f"Error reading file {file_path}: {str(e)}")
+            JsonProcessor._report_error(f"Error reading file {file_path}: {str(e)}", errors)
             return None
 
     @staticmethod
-    def process_items(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _open_raw_file(file_path: Path):
+        """按文件后缀以二进制方式打开原始数据文件,自动处理gzip压缩
+        
+        JSON解码器直接接受UTF-8字节,不需要先解码为字符串。
+        """
+        if file_path.name.endswith('.gz'):
+            return gzip.open(file_path, 'rb')
+        return open(file_path, 'rb')
+
+    @staticmethod
+    def iter_raw_files(source: Union[str, Path]) -> Iterator[Path]:
+        """遍历原始数据文件
+        
+        Args:
+            source: 单个文件、目录或glob模式
+            
+        Returns:
+            按文件名排序的原始数据文件路径迭代器
+        """
+        source = str(source)
+        if os.path.isdir(source):
+            paths = (
+                os.path.join(root, name)
+                for root, _, names in os.walk(source)
+                for name in names
+            )
+        elif os.path.isfile(source):
+            paths = iter([source])
+        else:
+            paths = glob.iglob(source, recursive=True)
+
+        suffixes = JSON_SUFFIXES + JSON_LINES_SUFFIXES
+        for path in sorted(p for p in paths if p.endswith(suffixes)):
+            yield Path(path)
+
+    @classmethod
+    def iter_documents(cls, file_path: Union[str, Path], lazy: bool = False,
+                       errors: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """逐个读取文件中的搜索结果文档
+        
+        JSON文件产出一个文档,JSON-lines文件逐行产出文档,无法解析的行会被跳过。
+        
+        Args:
+            file_path: 原始数据文件路径
+            lazy: 是否只解码提取商品需要的部分,见 codec.loads_search_result
+            errors: 传入列表时错误信息追加到其中而不是写入日志,例如由调用方按文件汇总
+            
+        Returns:
+            原始JSON文档迭代器
+        """
+        file_path = Path(file_path)
+        if not file_path.name.endswith(JSON_LINES_SUFFIXES):
+            data = cls.read_json_file(str(file_path), lazy, errors)
+            if data:
+                yield data
+            return
+
+        loads = codec.loads_search_result if lazy else codec.loads
+        size = 0
+        try:
+            with cls._open_raw_file(file_path) as f:
+                for line_no, line in enumerate(f, 1):
+                    size += len(line)
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield loads(line)
+                    except ValueError as e:
+                        cls._report_error(f"Failed to parse line {line_no} of {file_path}: {str(e)}", errors)
+        except Exception as e:
+            cls._report_error(f"Error reading file {file_path}: {str(e)}", errors)
+        finally:
+            metrics.add('processor.read', bytes=size)
+
+    @staticmethod
+    def iter_rows(data: Dict[str, Any], version: Optional[str] = None) -> Iterator[tuple]:
+        """逐个产出按 ITEM_FIELDS 排列的商品字段值
+        
+        Args:
+            data: 原始JSON数据
+            version: 提取规则版本,为None时按文档结构自动检测
+            
+        Returns:
+            字段值元组迭代器
+        """
+        spec = detect_schema(data, version)
+        items = spec.items(data) if spec is not None else None
+        if not items:
+            logger.warning("No items found in data")
+            return
+
+        extract = spec.extractor
+        keyword = spec.keyword(data)
+        # 同一文档中的商品共享创建时间
+        timestamp = datetime.now().isoformat()
+        for item in items:
+            try:
+                yield extract(item, keyword, timestamp)
+            except Exception as e:
+                logger.error(f"Error processing item: {str(e)}")
+                continue
+
+    @classmethod
+    def iter_items(cls, data: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """逐个产出处理后的闲鱼商品数据
+        
+        Args:
+            data: 原始JSON数据
+            
+        Returns:
+            处理后的商品字典迭代器
+        """
+        for row in cls.iter_rows(data):
+            yield dict(zip(ITEM_FIELDS, row))
+
+    @classmethod
+    def process_items(cls, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """处理闲鱼商品数据
         
         Args:
@@ -46,95 +187,85 @@ class JsonProcessor:
             处理后的商品列表
         """
         try:
-            # 提取搜索关键词
-            keyword = data.get('data', {}).get('resultInfo', {}).get('sqiControlFields', {}).get(
-                'userInputOriginalSearchKeywords', '')
-
-            # 提取商品数据
-            items = data.get('data', {}).get('resultList', {})
-            if not items:
-                logger.warning("No items found in data")
-                return []
-
-            processed_items = []
-            for item in items:
-                try:
-                    item_main = item.get('data', {}).get('item', {}).get('main', {})
-                    ex_content = item_main.get('exContent', {})
-                    click_param = item_main.get('clickParam', {}).get('args', {})
-
-                    # 提取价格信息
-                    price_info = ex_content.get('price', [{'text': '0'}, {'text': '0'}])
-                    price = float(price_info[1].get('text', '0'))
-
-                    # 提取评价信息
-                    user_fish_shop_label = ex_content.get('userFishShopLabel', {}).get('tagList', [])
-                    reviews_count = user_fish_shop_label[0].get('data', {}).get('content', '0条评价').replace('条评价',
-                                                                                                           '') if user_fish_shop_label else '0'
-                    good_rating = user_fish_shop_label[1].get('data', {}).get('content', '0%').replace('好评率', '') if len(
-                        user_fish_shop_label) > 1 else '0%'
-                    
-                    # 提取想要人数
-                    want_count_content = ex_content.get('fishTags', {}).get('r3', {}).get('tagList', [{}])[0].get('data', {}).get('content', '0')
-
-                    # 创建Item对象
-                    item_obj = Item(
-                        item_id=ex_content.get('itemId'),
-                        title=ex_content.get('title'),
-                        price=price,
-                        description='',
-                        url=ex_content.get('picUrl')
-                    )
-
-                    # 更新所有额外属性
-                    item_obj.update(
-                        # 分类信息
-                        category_id=click_param.get('cCatId'),
-                        tb_category_id=click_param.get('tbCatId'),
-                        item_type=click_param.get('item_type'),
-
-                        # 卖家信息
-                        seller_id=click_param.get('seller_id'),
-                        seller_nick=ex_content.get('userNickName'),
-                        seller_avatar=ex_content.get('userAvatarUrl'),
-                        seller_reviews_count=int(reviews_count) if reviews_count.isdigit() else 0,
-                        seller_good_rating=good_rating,
-
-                        # 想要人数
-                        want_count=want_count_content.replace('人想要', '') if '人想要' in want_count_content else '0',
-
-                        # 商品状态
-                        is_free_shipping='freeship' in (click_param.get('tag', '') or ''),
-
-                        # 图片信息
-                        pic_url=ex_content.get('picUrl'),
-
-                        # 位置信息
-                        location=ex_content.get('area'),
-
-                        # 价格信息
-                        original_price=ex_content.get('oriPrice', '').replace('¥', ''),
-                        current_price=price,
-
-                        # 元数据
-                        keyword=keyword,
-                        search_id=click_param.get('search_id'),
-                        biz_type=click_param.get('biz_type'),
-                        publish_time=int(click_param.get('publishTime', 0))
-                    )
-
-                    # 将Item对象转换为字典并添加到列表
-                    processed_items.append(item_obj.to_dict())
-                except Exception as e:
-                    logger.error(f"Error processing item: {str(e)}")
-                    continue
-
-            logger.info(f"Successfully processed {len(processed_items)} items")
+            processed_items = list(cls.iter_items(data))
+            if processed_items:
+                logger.info(f"Successfully processed {len(processed_items)} items")
             return processed_items
         except Exception as e:
             logger.error(f"Error processing items: {str(e)}")
             return []
 
+    @classmethod
+    def stream_rows(cls, source: Union[str, Path]) -> Iterator[tuple]:
+        """流式处理目录或glob下的所有原始数据文件,产出按 ITEM_FIELDS 排列的字段值
+        
+        每次只在内存中保留一个文档,内存占用与文件数量无关;文档只解码提取商品需要的部分。
+        
+        Args:
+            source: 单个文件、目录或glob模式
+            
+        Returns:
+            字段值元组迭代器
+        """
+        file_count = 0
+        item_count = 0
+        for file_path in cls.iter_raw_files(source):
+            file_count += 1
+            for data in cls.iter_documents(file_path, lazy=True):
+                try:
+                    for row in cls.iter_rows(data):
+                        item_count += 1
+                        yield row
+                except Exception as e:
+                    logger.error(f"Error processing items in {file_path}: {str(e)}")
+        logger.info(f"Streamed {item_count} items from {file_count} files")
+
+    @classmethod
+    def stream_items(cls, source: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+        """流式处理目录或glob下的所有原始数据文件
+        
+        Args:
+            source: 单个文件、目录或glob模式
+            
+        Returns:
+            处理后的商品字典迭代器
+        """
+        for row in cls.stream_rows(source):
+            yield dict(zip(ITEM_FIELDS, row))
+
+    @staticmethod
+    def iter_batches(items: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """将商品迭代器切分为固定大小的批次
+        
+        Args:
+            items: 商品字典迭代器
+            batch_size: 每批次的商品数量
+            
+        Returns:
+            商品批次迭代器
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        iterator = iter(items)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    @classmethod
+    def stream_batches(cls, source: Union[str, Path], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """流式处理原始数据并按批次产出商品
+        
+        Args:
+            source: 单个文件、目录或glob模式
+            batch_size: 每批次的商品数量
+            
+        Returns:
+            商品批次迭代器
+        """
+        return cls.iter_batches(cls.stream_items(source), batch_size)
+
     @classmethod
     def process_json_file(cls, file_path: str) -> List[Dict[str, Any]]:
         """处理JSON文件并返回商品列表
@@ -146,7 +277,7 @@ class JsonProcessor:
             处理后的商品列表
         """
         # 读取JSON文件
-        data = cls.read_json_file(file_path)
+        data = cls.read_json_file(file_path, lazy=True)
         if not data:
             return []
             
@@ -0,0 +1,265 @@
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Callable, Tuple, Union, List
+from models.item import ITEM_FIELDS
+
+# 路径中的一段:字典键或列表下标
+PathKey = Union[str, int]
+
+# 查找路径时表示"路径不存在"的异常
+LOOKUP_ERRORS = (KeyError, IndexError, TypeError)
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """单个字段的提取规则
+
+    Attributes:
+        name: 输出字段名,对应 ITEM_FIELDS
+        path: 相对于商品根节点的路径,为None时取 context 或缺省值
+        converter: 类型转换函数,只作用于存在且非None的值,抛出的异常会使该商品被跳过
+        default: 路径不存在或值为None时的缺省值
+        context: 从提取上下文取值,可选 'keyword' 或 'timestamp'
+    """
+    name: str
+    path: Optional[Tuple[PathKey, ...]] = None
+    converter: Optional[Callable[[Any], Any]] = None
+    default: Any = None
+    context: Optional[str] = None
+
+
+@dataclass
+class ExtractionSpec:
+    """一个版本的闲鱼搜索结果提取规则
+
+    规则在首次使用时被编译成一个Python函数,公共路径前缀只查找一次,路径缺失时
+    直接使用缺省值。上游JSON结构变化时,新增一个版本的规则并调用 register_schema 即可。
+
+    Attributes:
+        version: 规则版本
+        items_path: 文档中商品列表的路径
+        item_root: 商品根节点相对于列表元素的路径
+        keyword_path: 文档中搜索关键词的路径
+        fields: 字段规则
+    """
+    version: str
+    items_path: Tuple[PathKey, ...]
+    item_root: Tuple[PathKey, ...]
+    keyword_path: Tuple[PathKey, ...]
+    fields: Tuple[FieldSpec, ...]
+    _compiled: Optional[Callable[..., tuple]] = field(default=None, init=False, repr=False, compare=False)
+
+    def matches(self, data: Dict[str, Any]) -> bool:
+        """文档是否符合该版本的结构"""
+        return lookup(data, self.items_path) is not None
+
+    def items(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """返回文档中的商品列表"""
+        return lookup(data, self.items_path) or []
+
+    def keyword(self, data: Dict[str, Any]) -> str:
+        """返回文档中的搜索关键词"""
+        return lookup(data, self.keyword_path, '')
+
+    @property
+    def extractor(self) -> Callable[[Dict[str, Any], str, str], tuple]:
+        """编译后的提取函数,参数为 (商品, 关键词, 时间戳),返回按 ITEM_FIELDS 排列的元组"""
+        if self._compiled is None:
+            self._compiled = compile_spec(self)
+        return self._compiled
+
+
+def lookup(data: Any, path: Tuple[PathKey, ...], default: Any = None) -> Any:
+    """按路径取值,路径不存在时返回缺省值"""
+    try:
+        for key in path:
+            data = data[key]
+    except LOOKUP_ERRORS:
+        return default
+    return default if data is None else data
+
+
+def _subscript(path: Tuple[PathKey, ...]) -> str:
+    return ''.join(f'[{key!r}]' for key in path)
+
+
+def compile_spec(spec: ExtractionSpec) -> Callable[[Dict[str, Any], str, str], tuple]:
+    """将提取规则编译为一个Python函数
+
+    被两个以上字段共享的路径前缀会被提取为局部变量,只查找一次;
+    前缀不存在时局部变量为哨兵对象,后续查找会触发 TypeError 并回落到缺省值。
+
+    Args:
+        spec: 提取规则
+
+    Returns:
+        提取函数
+    """
+    namespace = {'_LOOKUP_ERRORS': LOOKUP_ERRORS, '_MISSING': object()}
+    by_name = {field_spec.name: field_spec for field_spec in spec.fields}
+    unknown = set(by_name) - set(ITEM_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields in schema {spec.version}: {sorted(unknown)}")
+
+    # 统计被多个字段共享的路径前缀
+    prefix_counts = {}
+    for field_spec in spec.fields:
+        if field_spec.path:
+            for length in range(1, len(field_spec.path)):
+                prefix = field_spec.path[:length]
+                prefix_counts[prefix] = prefix_counts.get(prefix, 0) + 1
+    prefixes = sorted((prefix for prefix, count in prefix_counts.items() if count > 1), key=len)
+
+    def nearest(path):
+        """返回最长的已提取前缀及其变量名"""
+        for length in range(len(path) - 1, 0, -1):
+            if path[:length] in variables:
+                return path[:length], variables[path[:length]]
+        return (), 'root'
+
+    lines = [
+        'def extract(item, keyword, timestamp):',
+        '    try:',
+        f'        root = item{_subscript(spec.item_root)}',
+        '    except _LOOKUP_ERRORS:',
+        '        root = _MISSING',
+    ]
+    variables = {}
+    for index, prefix in enumerate(prefixes):
+        base, base_name = nearest(prefix)
+        name = f'p{index}'
+        lines += [
+            '    try:',
+            f'        {name} = {base_name}{_subscript(prefix[len(base):])}',
+            '    except _LOOKUP_ERRORS:',
+            f'        {name} = _MISSING',
+        ]
+        variables[prefix] = name
+
+    outputs = []
+    for index, field_name in enumerate(ITEM_FIELDS):
+        field_spec = by_name.get(field_name)
+        if field_spec is None:
+            outputs.append('None')
+            continue
+
+        name = f'v{index}'
+        default = f'd{index}'
+        namespace[default] = field_spec.default
+        if field_spec.context is not None:
+            outputs.append(field_spec.context)
+            continue
+        if field_spec.path is None:
+            outputs.append(default)
+            continue
+
+        base, base_name = nearest(field_spec.path)
+        lines += [
+            '    try:',
+            f'        {name} = {base_name}{_subscript(field_spec.path[len(base):])}',
+            '    except _LOOKUP_ERRORS:',
+            f'        {name} = {default}',
+            '    else:',
+            f'        if {name} is None:',
+            f'            {name} = {default}',
+        ]
+        if field_spec.converter is not None:
+            converter = f'c{index}'
+            namespace[converter] = field_spec.converter
+            lines += [
+                '        else:',
+                f'            {name} = {converter}({name})',
+            ]
+        outputs.append(name)
+
+    lines.append(f"    return ({', '.join(outputs)},)")
+    exec(compile('\n'.join(lines), f'<schema {spec.version}>', 'exec'), namespace)
+    return namespace['extract']
+
+
+# 类型转换函数
+def _to_int_stripping(suffix: str) -> Callable[[str], int]:
+    def convert(value: str) -> int:
+        value = value.replace(suffix, '')
+        return int(value) if value.isdigit() else 0
+    return convert
+
+
+def _stripping(text: str) -> Callable[[str], str]:
+    def convert(value: str) -> str:
+        return value.replace(text, '')
+    return convert
+
+
+def _want_count(value: str) -> str:
+    return value.replace('人想要', '') if '人想要' in value else '0'
+
+
+def _is_free_shipping(value: str) -> bool:
+    return 'freeship' in value
+
+
+SCHEMA_V1 = ExtractionSpec(
+    version='v1',
+    items_path=('data', 'resultList'),
+    item_root=('data', 'item', 'main'),
+    keyword_path=('data', 'resultInfo', 'sqiControlFields', 'userInputOriginalSearchKeywords'),
+    fields=(
+        FieldSpec('item_id', ('exContent', 'itemId')),
+        FieldSpec('title', ('exContent', 'title')),
+        FieldSpec('price', ('exContent', 'price', 1, 'text'), float, 0.0),
+        FieldSpec('description', default=''),
+        FieldSpec('url', ('exContent', 'picUrl')),
+        FieldSpec('created_at', context='timestamp'),
+        FieldSpec('updated_at', context='timestamp'),
+        FieldSpec('publish_time', ('clickParam', 'args', 'publishTime'), int, 0),
+        FieldSpec('category_id', ('clickParam', 'args', 'cCatId')),
+        FieldSpec('tb_category_id', ('clickParam', 'args', 'tbCatId')),
+        FieldSpec('item_type', ('clickParam', 'args', 'item_type')),
+        FieldSpec('seller_id', ('clickParam', 'args', 'seller_id')),
+        FieldSpec('seller_nick', ('exContent', 'userNickName')),
+        FieldSpec('seller_avatar', ('exContent', 'userAvatarUrl')),
+        FieldSpec('seller_reviews_count', ('exContent', 'userFishShopLabel', 'tagList', 0, 'data', 'content'),
+                  _to_int_stripping('条评价'), 0),
+        FieldSpec('seller_good_rating', ('exContent', 'userFishShopLabel', 'tagList', 1, 'data', 'content'),
+                  _stripping('好评率'), '0%'),
+        FieldSpec('want_count', ('exContent', 'fishTags', 'r3', 'tagList', 0, 'data', 'content'),
+                  _want_count, '0'),
+        FieldSpec('is_free_shipping', ('clickParam', 'args', 'tag'), _is_free_shipping, False),
+        FieldSpec('pic_url', ('exContent', 'picUrl')),
+        FieldSpec('location', ('exContent', 'area')),
+        FieldSpec('original_price', ('exContent', 'oriPrice'), _stripping('¥'), ''),
+        FieldSpec('current_price', ('exContent', 'price', 1, 'text'), float, 0.0),
+        FieldSpec('keyword', context='keyword'),
+        FieldSpec('search_id', ('clickParam', 'args', 'search_id')),
+        FieldSpec('biz_type', ('clickParam', 'args', 'biz_type')),
+    )
+)
+
+# 已注册的规则,按注册顺序倒序匹配,新版本优先
+SCHEMAS: Dict[str, ExtractionSpec] = {}
+
+
+def register_schema(spec: ExtractionSpec) -> None:
+    """注册一个版本的提取规则"""
+    SCHEMAS[spec.version] = spec
+
+
+def detect_schema(data: Dict[str, Any], version: Optional[str] = None) -> Optional[ExtractionSpec]:
+    """返回与文档结构匹配的提取规则
+
+    Args:
+        data: 原始JSON数据
+        version: 指定规则版本,为None时自动检测
+
+    Returns:
+        提取规则,没有匹配的版本时返回None
+    """
+    if version is not None:
+        return SCHEMAS[version]
+    for spec in reversed(list(SCHEMAS.values())):
+        if spec.matches(data):
+            return spec
+    return None
+
+
+register_schema(SCHEMA_V1)
@@ -1,18 +1,47 @@
-from typing import List, Dict, Any
-from pymongo import MongoClient
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence, Iterator, Union, TYPE_CHECKING
+from bson import ObjectId
+from pymongo import MongoClient, ASCENDING, UpdateMany, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from loguru import logger
+from telemetry import metrics
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# upsert时只在首次插入写入的字段
+INSERT_ONLY_FIELDS = ('created_at',)
+# 只在首次插入或其他字段发生变化时写入的字段,保证重复写入未变化的商品不会产生修改
+TOUCH_FIELDS = ('updated_at',)
+
+# 常用查询字段的二级索引
+SECONDARY_INDEXES = ('keyword', 'search_id', 'location', 'category_id', 'publish_time', 'price')
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """把驱动发出的每个命令记录为一次往返,耗时和次数计入 mongodb.<命令名> 阶段"""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        metrics.add(f"mongodb.{event.command_name}", calls=1, round_trips=1, seconds=event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        metrics.add(f"mongodb.{event.command_name}", calls=1, round_trips=1, errors=1, seconds=event.duration_micros / 1e6)
 
 
 class MongoDB:
-    def __init__(self, uri: str, db_name: str, collection_name: str):
+    def __init__(self, uri: str, db_name: str, collection_name: str, client: Optional[MongoClient] = None):
         """初始化MongoDB连接
         
         Args:
             uri: MongoDB连接URI
             db_name: 数据库名称
             collection_name: 集合名称
+            client: 已创建的客户端,例如测试时传入 mongomock.MongoClient()
         """
-        self.client = MongoClient(uri)
+        self.client = client if client is not None else MongoClient(uri, event_listeners=[CommandMetrics()])
         self.db = self.client[db_name]
         self.collection = self.db[collection_name]
         logger.info(f"Connected to MongoDB: {db_name}.{collection_name}")
@@ -31,9 +60,184 @@ class MongoDB:
             return 0
         
         result = self.collection.insert_many(documents)
+        metrics.add('mongodb.insert', items=len(result.inserted_ids))
         logger.info(f"Inserted {len(result.inserted_ids)} documents")
         return len(result.inserted_ids)
 
+    def ensure_indexes(self, keys: Sequence[str] = ('item_id',), remove_duplicates: bool = False) -> List[str]:
+        """创建upsert所需的唯一索引和常用查询字段的二级索引
+        
+        insert 模式写入过的集合可能已有唯一键重复的文档,此时无法创建唯一索引。
+        
+        Args:
+            keys: 唯一键字段
+            remove_duplicates: 为True时遇到重复文档先调用 remove_duplicates 清理再创建,
+                否则抛出 ValueError
+            
+        Returns:
+            创建的索引名称列表
+        """
+        unique = [(key, ASCENDING) for key in keys]
+        try:
+            names = [self.collection.create_index(unique, unique=True)]
+        except DuplicateKeyError:
+            if not remove_duplicates:
+                raise ValueError(
+                    f"Collection {self.collection.name} has duplicate documents for upsert keys "
+                    f"{', '.join(keys)}, set UPSERT_REMOVE_DUPLICATES=true to keep only the newest document "
+                    f"per key, or WRITE_MODE=insert to write without the unique index"
+                ) from None
+            self.remove_duplicates(keys)
+            names = [self.collection.create_index(unique, unique=True)]
+        for field in SECONDARY_INDEXES:
+            if field not in keys:
+                names.append(self.collection.create_index([(field, ASCENDING)]))
+        logger.info(f"Ensured indexes: {', '.join(names)}")
+        return names
+
+    def remove_duplicates(self, keys: Sequence[str] = ('item_id',), batch_size: int = 1000) -> int:
+        """删除唯一键重复的文档,每个键值只保留最后插入(_id 最大)的一个
+        
+        缺少唯一键的文档视为键值为空,同样只保留一个。
+        
+        Args:
+            keys: 唯一键字段
+            batch_size: 每次 delete_many 删除的文档数
+            
+        Returns:
+            删除的文档数
+        """
+        pipeline = [
+            {'$sort': {'_id': ASCENDING}},
+            {'$group': {'_id': {key: f"${key}" for key in keys}, 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+            {'$match': {'count': {'$gt': 1}}}
+        ]
+        removed = 0
+        pending = []
+        for group in self.collection.aggregate(pipeline, allowDiskUse=True):
+            pending.extend(group['ids'][:-1])
+            while len(pending) >= batch_size:
+                removed += self.collection.delete_many({'_id': {'$in': pending[:batch_size]}}).deleted_count
+                pending = pending[batch_size:]
+        if pending:
+            removed += self.collection.delete_many({'_id': {'$in': pending}}).deleted_count
+        logger.warning(f"Removed {removed} duplicate documents by {', '.join(keys)}")
+        return removed
+
+    def upsert_many(self, documents: List[Dict[str, Any]], keys: Sequence[str] = ('item_id',),
+                    batch_size: int = 1000, inserted: Optional[List[Dict[str, Any]]] = None) -> Dict[str, int]:
+        """按唯一键批量upsert文档,重复写入同一商品不会产生重复数据
+        
+        每批文档通过一次无序 bulk_write 写入。created_at 只在首次插入时写入;updated_at
+        除首次插入外,只在其他字段与已有文档不同时更新,由写入之前的另一次 bulk_write
+        完成(计入 mongodb.touch 阶段),因此内容未变化的商品会被计为 unchanged。
+        部分文档写入失败时记录错误,不影响同一批次的其他文档。缺少唯一键的文档会被跳过。
+        
+        Args:
+            documents: 文档列表
+            keys: 唯一键字段,例如 ('item_id',) 或 ('item_id', 'keyword')
+            batch_size: 每次 bulk_write 的文档数
+            inserted: 传入列表时,实际插入(而不是更新已有文档)的文档会追加到其中
+            
+        Returns:
+            包含 inserted/updated/unchanged/skipped 数量的字典
+        """
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+        if not documents:
+            logger.warning("No documents to upsert")
+            return counts
+
+        for start in range(0, len(documents), batch_size):
+            # 同一批次内按唯一键去重,保留最后一次出现的文档
+            operations = {}
+            for doc in documents[start:start + batch_size]:
+                key = tuple(doc.get(field) for field in keys)
+                if None in key:
+                    counts['skipped'] += 1
+                    continue
+                operations[key] = doc
+
+            if not operations:
+                continue
+
+            requests, touches, new_ids = [], [], {}
+            for key, doc in operations.items():
+                update = {field: value for field, value in doc.items() if field != '_id'}
+                on_insert = {field: update.pop(field) for field in INSERT_ONLY_FIELDS if field in update}
+                touch = {field: update.pop(field) for field in TOUCH_FIELDS if field in update}
+                if inserted is not None:
+                    # 由客户端生成 _id,根据结果中的 upserted_ids 找出实际插入的文档
+                    on_insert['_id'] = ObjectId()
+                    new_ids[on_insert['_id']] = doc
+                operation = {'$set': update}
+                if on_insert or touch:
+                    operation['$setOnInsert'] = {**on_insert, **touch}
+                requests.append(UpdateOne(dict(zip(keys, key)), operation, upsert=True))
+
+                differs = [{field: {'$ne': value}} for field, value in update.items() if field not in keys]
+                if touch and differs:
+                    touches.append(UpdateOne({**dict(zip(keys, key)), '$or': differs}, {'$set': touch}))
+
+            # 只匹配内容发生变化的已有文档,必须在写入新内容之前执行
+            if touches:
+                self._bulk_write(touches, 'mongodb.touch')
+
+            details = self._bulk_write(requests, 'mongodb.update')
+            upserted, matched, modified = details['nUpserted'], details['nMatched'], details['nModified']
+            if inserted is not None:
+                upserted_ids = {upsert['_id'] for upsert in details['upserted']}
+                inserted.extend(doc for _id, doc in new_ids.items() if _id in upserted_ids)
+
+            counts['inserted'] += upserted
+            counts['updated'] += modified
+            counts['unchanged'] += matched - modified
+
+        logger.info(
+            f"Upserted documents: {counts['inserted']} inserted, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['skipped']} skipped"
+        )
+        return counts
+
+    def _bulk_write(self, requests: list, name: str) -> Dict[str, Any]:
+        """执行一次无序 bulk_write,部分文档写入失败时记录错误,其余文档照常写入
+        
+        Args:
+            requests: 写操作列表
+            name: 计入指标的阶段名,例如 'mongodb.update'
+            
+        Returns:
+            驱动返回的原始结果,包含 nUpserted/nMatched/nModified/upserted
+        """
+        try:
+            details = self.collection.bulk_write(requests, ordered=False).bulk_api_result
+            errors = 0
+        except BulkWriteError as e:
+            details = e.details
+            errors = len(details['writeErrors'])
+            logger.error(f"Bulk write to {self.collection.name} finished with {errors} write errors")
+        metrics.add(name, items=len(requests), errors=errors)
+        return details
+
+    def set_fields(self, updates: Dict[Any, Dict[str, Any]], key: str = 'item_id', batch_size: int = 1000) -> int:
+        """按键批量设置已有文档的字段
+        
+        Args:
+            updates: {键值: {字段: 值}},例如 {'123': {'duplicate_of': '100'}}
+            key: 匹配文档的字段,同一键值的所有文档都会更新
+            batch_size: 每次 bulk_write 的更新数
+            
+        Returns:
+            修改的文档数
+        """
+        modified = 0
+        requests = [UpdateMany({key: value}, {'$set': fields}) for value, fields in updates.items()]
+        for start in range(0, len(requests), batch_size):
+            result = self.collection.bulk_write(requests[start:start + batch_size], ordered=False)
+            metrics.add('mongodb.update', items=result.modified_count)
+            modified += result.modified_count
+        logger.info(f"Updated fields of {modified} documents")
+        return modified
+
     def find_all(self) -> List[Dict[str, Any]]:
         """获取所有文档
         
@@ -42,6 +246,137 @@ class MongoDB:
         """
         return list(self.collection.find())
 
+    @staticmethod
+    def build_query(keyword: Optional[str] = None,
+                    start_time: Optional[Union[datetime, int]] = None,
+                    end_time: Optional[Union[datetime, int]] = None,
+                    location: Optional[str] = None) -> Dict[str, Any]:
+        """构建常用过滤条件
+        
+        Args:
+            keyword: 搜索关键词
+            start_time: 发布时间下限(含),datetime 或毫秒时间戳
+            end_time: 发布时间上限(不含),datetime 或毫秒时间戳
+            location: 商品所在地
+            
+        Returns:
+            MongoDB查询条件
+        """
+        query = {}
+        if keyword is not None:
+            query['keyword'] = keyword
+        if location is not None:
+            query['location'] = location
+
+        publish_time = {}
+        if start_time is not None:
+            publish_time['$gte'] = int(start_time.timestamp() * 1000) if isinstance(start_time, datetime) else start_time
+        if end_time is not None:
+            publish_time['$lt'] = int(end_time.timestamp() * 1000) if isinstance(end_time, datetime) else end_time
+        if publish_time:
+            query['publish_time'] = publish_time
+        return query
+
+    def iter_documents(self, query: Optional[Dict[str, Any]] = None,
+                       fields: Optional[Sequence[str]] = None,
+                       batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """通过游标逐个读取文档
+        
+        Args:
+            query: 过滤条件
+            fields: 需要返回的字段,为None时返回除 _id 外的所有字段
+            batch_size: 每次网络往返读取的文档数
+            
+        Returns:
+            文档迭代器
+        """
+        projection = {field: 1 for field in fields} if fields else {}
+        projection['_id'] = 0
+        return self.collection.find(query or {}, projection, batch_size=batch_size)
+
+    def iter_batches(self, query: Optional[Dict[str, Any]] = None,
+                     fields: Optional[Sequence[str]] = None,
+                     batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """按批次读取文档
+        
+        Args:
+            query: 过滤条件
+            fields: 需要返回的字段
+            batch_size: 每批次的文档数
+            
+        Returns:
+            文档批次迭代器
+        """
+        batch = []
+        for doc in self.iter_documents(query, fields, batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                metrics.add('mongodb.find', items=len(batch))
+                yield batch
+                batch = []
+        if batch:
+            metrics.add('mongodb.find', items=len(batch))
+            yield batch
+
+    def iter_frames(self, query: Optional[Dict[str, Any]] = None,
+                    fields: Optional[Sequence[str]] = None,
+                    batch_size: int = 10000) -> Iterator['pd.DataFrame']:
+        """按批次读取文档并转换为DataFrame
+        
+        Args:
+            query: 过滤条件
+            fields: 需要返回的字段,同时决定DataFrame的列
+            batch_size: 每个DataFrame的行数
+            
+        Returns:
+            DataFrame迭代器
+        """
+        import pandas as pd
+
+        for batch in self.iter_batches(query, fields, batch_size):
+            yield pd.DataFrame(batch, columns=list(fields) if fields else None)
+
+    def iter_record_batches(self, query: Optional[Dict[str, Any]] = None,
+                            fields: Optional[Sequence[str]] = None,
+                            batch_size: int = 10000):
+        """按批次读取文档并转换为Arrow RecordBatch,需要安装pyarrow
+        
+        Args:
+            query: 过滤条件
+            fields: 需要返回的字段
+            batch_size: 每个RecordBatch的行数
+            
+        Returns:
+            pyarrow.RecordBatch 迭代器
+        """
+        import pyarrow as pa
+
+        for batch in self.iter_batches(query, fields, batch_size):
+            if fields:
+                yield pa.RecordBatch.from_pydict({field: [doc.get(field) for doc in batch] for field in fields})
+            else:
+                yield pa.RecordBatch.from_pylist(batch)
+
+    def read_frame(self, query: Optional[Dict[str, Any]] = None,
+                   fields: Optional[Sequence[str]] = None,
+                   batch_size: int = 10000) -> 'pd.DataFrame':
+        """读取匹配文档的指定字段并合并为一个DataFrame
+        
+        Args:
+            query: 过滤条件
+            fields: 需要返回的字段
+            batch_size: 每次网络往返读取的文档数
+            
+        Returns:
+            只包含指定列的DataFrame
+        """
+        import pandas as pd
+
+        frames = list(self.iter_frames(query, fields, batch_size))
+        if not frames:
+            return pd.DataFrame(columns=list(fields) if fields else None)
+        return pd.concat(frames, ignore_index=True)
+
     def close(self):
         """关闭数据库连接"""
         self.client.close()
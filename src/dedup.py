@@ -0,0 +1,110 @@
+"""重复商品检测
+
+查看 DEDUP_INDEX_FILE 中的近似重复商品簇,或从MongoDB集合重建索引:
+
+    python src/dedup.py
+    python src/dedup.py --clusters 20 --json
+    python src/dedup.py --rebuild --batch-size 20000
+
+写入数据时设置 DEDUP=true 即可增量检测;--rebuild 按集合中的顺序分批重新检测所有商品,
+内存占用只与批次大小有关,并把结果写回每个文档的 duplicate_of 字段。
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clusters', type=int, default=10, help='输出商品数最多的簇的个数')
+    parser.add_argument('--json', action='store_true', help='每行输出一个JSON对象')
+    parser.add_argument('--index', help='索引文件,默认为 DEDUP_INDEX_FILE')
+    parser.add_argument('--rebuild', action='store_true', help='清空索引,从MongoDB集合重新检测并更新 duplicate_of')
+    parser.add_argument('--batch-size', type=int, default=10000, help='重建时每次从MongoDB读取的文档数')
+    return parser.parse_args(argv)
+
+
+def rebuild(index, db, batch_size: int) -> int:
+    """清空索引后按批次重新检测集合中的商品,只更新 duplicate_of 发生变化的文档
+
+    Returns:
+        更新的文档数
+    """
+    index.clear()
+    updated = 0
+    fields = ('item_id', 'title', 'seller_id', 'pic_url', 'duplicate_of')
+    for batch in db.iter_batches(None, fields, batch_size):
+        assigned, demoted = index.assign(batch)
+        updates = {
+            doc['item_id']: {'duplicate_of': duplicate_of}
+            for doc, duplicate_of in zip(batch, assigned)
+            if doc.get('item_id') is not None and doc.get('duplicate_of') != duplicate_of
+        }
+        updates.update((item_id, {'duplicate_of': duplicate_of}) for item_id, duplicate_of in demoted.items())
+        if updates:
+            updated += db.set_fields(updates)
+    return updated
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """运行重建或输出检测结果
+
+    Returns:
+        进程退出码
+    """
+    args = parse_args(argv)
+
+    from loguru import logger
+    from config.settings import ANALYSIS_MODE, ANALYSIS_STATE_FILE, DEDUP_COLLAPSE, DEDUP_INDEX_FILE, DEDUP_THRESHOLD
+    from data import codec
+    from storage.dedup_index import DuplicateIndex
+
+    path = args.index or DEDUP_INDEX_FILE
+    if args.rebuild:
+        from main import connect_db, setup
+
+        setup()
+        index = DuplicateIndex(path, DEDUP_THRESHOLD)
+        db = connect_db()
+        try:
+            updated = rebuild(index, db, args.batch_size)
+        finally:
+            db.close()
+        if updated and DEDUP_COLLAPSE and ANALYSIS_MODE == 'incremental' and os.path.exists(ANALYSIS_STATE_FILE):
+            from analysis.incremental import IncrementalAnalyzer
+
+            # 增量统计只计入了当时的代表,duplicate_of 变化后需要重新计算
+            incremental = IncrementalAnalyzer.load(ANALYSIS_STATE_FILE)
+            incremental.invalidate()
+            incremental.save(ANALYSIS_STATE_FILE)
+        stats = index.stats()
+        logger.info(f"Rebuilt duplicate index {path}: {stats['duplicates']} duplicates in {stats['clusters']} "
+                    f"clusters among {stats['items']} items, updated {updated} documents")
+        index.close()
+        return 0
+
+    # 结果输出到标准输出,日志只保留警告和错误
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    if not os.path.exists(path):
+        logger.error(f"Duplicate index {path} not found, ingest with DEDUP=true or run with --rebuild")
+        return 1
+
+    index = DuplicateIndex(path, DEDUP_THRESHOLD)
+    stats = index.stats()
+    clusters = index.largest_clusters(args.clusters)
+    index.close()
+
+    for cluster in clusters:
+        if args.json:
+            sys.stdout.write(codec.dumps(cluster).decode('utf-8') + '\n')
+        else:
+            print(f"{cluster['size']:>6}  {cluster['item_id']}  {' '.join(cluster['members'])}")
+    print(f"{stats['duplicates']} duplicates in {stats['clusters']} clusters among {stats['items']} items",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
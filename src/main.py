@@ -1,76 +1,661 @@
-import json
 import os
+from typing import List, Dict, Any, Optional, Sequence, Tuple, TYPE_CHECKING
 from loguru import logger
 
 from database.mongodb import MongoDB
-from analysis.analyzer import DataAnalyzer
-from visualization.visualizer import DataVisualizer
+from data import codec
 from data.processor import JsonProcessor
+from data.parallel import ParallelParser
+from models.item import ITEM_FIELDS
+from storage.change_index import ChangeIndex
+from storage.search_index import SearchIndex
+from storage.sinks import (
+    open_change_index,
+    open_dedup_index,
+    open_incremental,
+    open_parquet_store,
+    open_price_history,
+    open_search_index
+)
+from storage.result_cache import ResultCache, code_fingerprint, collection_fingerprint, file_fingerprint
+from telemetry import metrics
+from telemetry.metrics import MetricsRegistry
+from config import settings
 from config.settings import (
     MONGODB_URI,
     MONGODB_DB,
     MONGODB_COLLECTION,
+    WRITE_MODE,
+    UPSERT_KEYS,
+    UPSERT_REMOVE_DUPLICATES,
+    WRITE_BATCH_SIZE,
     LOG_CONFIG,
     RAW_DATA_DIR,
-    OUTPUT_DIR
+    OUTPUT_DIR,
+    PRICE_HISTORY,
+    PRICE_HISTORY_DIR,
+    DEDUP_COLLAPSE,
+    INGEST_MODE,
+    RAW_DATA_SOURCE,
+    INGEST_BATCH_SIZE,
+    PARSE_WORKERS,
+    PARSE_CHUNK_SIZE,
+    JSON_BACKEND,
+    ANALYZER_PUSHDOWN_THRESHOLD,
+    ANALYSIS_MODE,
+    ANALYSIS_STATE_FILE,
+    CHART_WORKERS,
+    CACHE_ENABLED,
+    CACHE_DIR,
+    CACHE_MAX_BYTES,
+    CACHE_MAX_ENTRIES,
+    CACHE_HASH_CONTENTS,
+    METRICS_FILE,
+    METRICS_TRACE_MEMORY,
+    METRICS_PROFILE_DIR,
+    CRAWL_ENDPOINT,
+    CRAWL_KEYWORDS,
+    CRAWL_COOKIE,
+    CRAWL_MAX_PAGES,
+    CRAWL_PAGE_SIZE,
+    CRAWL_FETCH_CONCURRENCY,
+    CRAWL_PARSE_CONCURRENCY,
+    CRAWL_STORE_CONCURRENCY,
+    CRAWL_QUEUE_SIZE,
+    CRAWL_MAX_RETRIES,
+    CRAWL_TIMEOUT,
+    CRAWL_SAVE_RAW,
+    CRAWL_HOST_RATE,
+    CRAWL_HOST_BURST,
+    CRAWL_MAX_CONCURRENCY,
+    CRAWL_LATENCY_TARGET,
+    CRAWL_MIN_INTERVAL,
+    CRAWL_MAX_INTERVAL,
+    CRAWL_STATE_FILE,
+    INGEST_ONLY
 )
 
-# 配置日志
-logger.configure(**LOG_CONFIG)
+# 分析、绘图和列式存储依赖 pandas、matplotlib 和 pyarrow,抓取依赖 asyncio,都只在用到时导入,
+# 只导入和写入文件数据的进程不需要加载它们
+if TYPE_CHECKING:
+    from analysis.incremental import IncrementalAnalyzer
+    from storage.dedup_index import DuplicateIndex
+    from storage.parquet_store import ParquetStore
+    from storage.price_history import PriceHistoryStore
 
-def main():
-    """主程序"""
+
+def setup() -> None:
+    """创建数据目录,配置日志和JSON编解码后端,由程序入口调用"""
+    settings.ensure_directories()
+    logger.configure(**LOG_CONFIG)
+    codec.set_backend(JSON_BACKEND)
+
+
+def connect_db() -> MongoDB:
+    """连接MongoDB,upsert模式下同时创建所需索引"""
+    db = MongoDB(MONGODB_URI, MONGODB_DB, MONGODB_COLLECTION)
+    if WRITE_MODE == 'upsert':
+        try:
+            db.ensure_indexes(UPSERT_KEYS, UPSERT_REMOVE_DUPLICATES)
+        except Exception:
+            db.close()
+            raise
+    return db
+
+
+def store_items(db: MongoDB, items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """按 WRITE_MODE 将商品写入MongoDB
+
+    Returns:
+        (作为新文档插入的商品, 内容被修改的已有文档数),insert 模式下所有商品都作为新文档插入
+    """
+    if WRITE_MODE == 'upsert':
+        inserted = []
+        counts = db.upsert_many(items, UPSERT_KEYS, WRITE_BATCH_SIZE, inserted)
+        return inserted, counts['updated']
+    db.insert_many(items)
+    return items, 0
+
+
+
+
+def as_item(record: Any) -> Dict[str, Any]:
+    """将字段值元组转换为商品字典,字典原样返回"""
+    return record if isinstance(record, dict) else dict(zip(ITEM_FIELDS, record))
+
+
+def split_changed(index: Optional[ChangeIndex],
+                  records: Sequence[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """将一批记录分为新商品和已变化商品,并转换为商品字典
+
+    Args:
+        index: 变化索引,为None时所有记录都视为新商品
+        records: 商品字典或按 ITEM_FIELDS 排列的字段值元组
+
+    Returns:
+        (新商品列表, 已变化商品列表),未变化的商品在构造字典之前即被丢弃
+    """
+    if index is None:
+        new, changed = records, []
+    else:
+        new, changed = index.split(records)
+    return [as_item(record) for record in new], [as_item(record) for record in changed]
+
+
+
+
+
+
+
+
+def mark_duplicates(dedup_index: 'DuplicateIndex', items: List[Dict[str, Any]]) -> Dict[str, str]:
+    """在写入前为每个商品设置 duplicate_of 字段
+
+    Args:
+        dedup_index: 重复商品索引
+        items: 商品字典,原地修改
+
+    Returns:
+        因簇合并而变为重复商品的已写入商品 {item_id: duplicate_of},需要在写入后更新
+    """
+    with metrics.span('ingest.dedup'):
+        duplicates, demoted = dedup_index.assign(items)
+        for item, duplicate_of in zip(items, duplicates):
+            item['duplicate_of'] = duplicate_of
+    metrics.add('ingest.dedup', items=len(items))
+    return demoted
+
+
+def analysis_query() -> Optional[Dict[str, Any]]:
+    """DEDUP_COLLAPSE 为True时只分析每个簇的代表"""
+    return {'duplicate_of': None} if DEDUP_COLLAPSE else None
+
+
+
+
+
+
+def rebuild_incremental(db: MongoDB, batch_size: int = 10000) -> 'IncrementalAnalyzer':
+    """分批读取集合中的文档,重新计算增量统计
+
+    Args:
+        db: MongoDB 实例
+        batch_size: 每批读取的文档数
+
+    Returns:
+        新的增量统计
+    """
+    from analysis.incremental import IncrementalAnalyzer
+
+    incremental = IncrementalAnalyzer()
+    for frame in db.iter_frames(analysis_query(), IncrementalAnalyzer.COLUMNS, batch_size):
+        incremental.update(frame)
+    return incremental
+
+
+def load_analyzer(db: MongoDB, incremental: Optional['IncrementalAnalyzer'] = None):
+    """保存并返回增量统计,未启用时按集合大小创建 DataAnalyzer 或 MongoAnalyzer
+
+    增量统计已失效时先从集合重新计算。
+    """
+    with metrics.span('analyze.load'):
+        if incremental is not None:
+            if incremental.stale:
+                incremental = rebuild_incremental(db)
+            incremental.save(ANALYSIS_STATE_FILE)
+            return incremental
+        from analysis.analyzer import create_analyzer
+
+        return create_analyzer(db, ANALYZER_PUSHDOWN_THRESHOLD, analysis_query())
+
+
+def write_changes(db: MongoDB, new: List[Dict[str, Any]], changed: List[Dict[str, Any]],
+                  parquet_store: Optional['ParquetStore'] = None, incremental: Optional['IncrementalAnalyzer'] = None,
+                  index: Optional[ChangeIndex] = None, history: Optional['PriceHistoryStore'] = None,
+                  search_index: Optional[SearchIndex] = None, dedup_index: Optional['DuplicateIndex'] = None) -> int:
+    """将新商品和已变化商品写入MongoDB以及启用的其他存储
+
+    增量统计只合并实际作为新文档插入MongoDB的商品,因此即使未启用变化检测,重复写入
+    同一批商品也不会重复计数;DEDUP_COLLAPSE 为True时不合并重复商品。已有文档被修改
+    (或 DEDUP_COLLAPSE 为True时已计入的商品变为重复商品)时,增量统计被标记为失效,
+    分析前从集合重新计算。变化索引在其他写入都成功之后才记录指纹。
+
+    Args:
+        db: MongoDB 实例
+        new: 新商品
+        changed: 已变化商品
+        parquet_store: 可选的Parquet存储
+        incremental: 可选的增量统计
+        index: 可选的变化索引
+        history: 可选的价格历史存储
+        search_index: 可选的标题搜索索引
+        dedup_index: 可选的重复商品索引
+
+    Returns:
+        写入的商品数
+    """
+    items = new + changed
+    if not items:
+        return 0
+    demoted = mark_duplicates(dedup_index, items) if dedup_index is not None else {}
+    inserted, updated = store_items(db, items)
+    if demoted:
+        demoted_count = db.set_fields(
+            {item_id: {'duplicate_of': duplicate_of} for item_id, duplicate_of in demoted.items()}
+        )
+        if DEDUP_COLLAPSE:
+            updated += demoted_count
+    if parquet_store is not None:
+        parquet_store.write(items)
+    if history is not None:
+        history.append(items)
+    if incremental is not None:
+        if updated:
+            incremental.invalidate()
+        if not incremental.stale:
+            incremental.update(
+                [item for item in inserted if not item.get('duplicate_of')] if DEDUP_COLLAPSE else inserted
+            )
+    if search_index is not None:
+        search_index.update(items)
+    if index is not None:
+        index.record(items)
+    return len(items)
+
+
+def store_batch(db: MongoDB, records: Sequence[Any], parquet_store: Optional['ParquetStore'] = None,
+                incremental: Optional['IncrementalAnalyzer'] = None, index: Optional[ChangeIndex] = None,
+                history: Optional['PriceHistoryStore'] = None, search_index: Optional[SearchIndex] = None,
+                dedup_index: Optional['DuplicateIndex'] = None) -> int:
+    """筛选一批记录中的新商品和已变化商品并写入,耗时和写入数计入 ingest.write 阶段
+
+    Args:
+        db: MongoDB 实例
+        records: 商品字典或按 ITEM_FIELDS 排列的字段值元组
+        parquet_store: 可选的Parquet存储
+        incremental: 可选的增量统计
+        index: 可选的变化索引
+        history: 可选的价格历史存储
+        search_index: 可选的标题搜索索引
+        dedup_index: 可选的重复商品索引
+
+    Returns:
+        写入的商品数
+    """
+    with metrics.span('ingest.write'):
+        new, changed = split_changed(index, records)
+        written = write_changes(db, new, changed, parquet_store, incremental, index, history, search_index,
+                                dedup_index)
+    metrics.add('ingest.write', items=written)
+    return written
+
+
+def finish_ingest(incremental: Optional['IncrementalAnalyzer'] = None) -> None:
+    """只导入数据时保存增量统计并结束,分析留给之后的完整运行"""
+    if incremental is not None:
+        incremental.save(ANALYSIS_STATE_FILE)
+    logger.info("Ingest-only run completed, skipped analysis and charts")
+
+
+def open_cache() -> Optional[ResultCache]:
+    """按配置打开结果缓存,未启用时返回None"""
+    if not CACHE_ENABLED:
+        return None
+    return ResultCache(CACHE_DIR, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES)
+
+
+def price_history_fingerprint() -> Optional[List[List[Any]]]:
+    """价格历史目录中所有文件的指纹,降价检测结果取决于其内容;未启用时返回None"""
+    if not PRICE_HISTORY:
+        return None
+    return file_fingerprint(
+        os.path.join(root, name) for root, _, names in os.walk(PRICE_HISTORY_DIR) for name in names
+    )
+
+
+def run_key(cache: ResultCache, *inputs: Any) -> str:
+    """由输入指纹、代码指纹和影响结果的配置生成一次运行的缓存键"""
+    config = {
+        'mongodb': [MONGODB_URI, MONGODB_DB, MONGODB_COLLECTION],
+        'write_mode': WRITE_MODE,
+        'upsert_keys': UPSERT_KEYS,
+        'analysis_mode': ANALYSIS_MODE,
+        'pushdown_threshold': ANALYZER_PUSHDOWN_THRESHOLD,
+        'price_history': price_history_fingerprint(),
+        'dedup_collapse': DEDUP_COLLAPSE
+    }
+    return cache.key('run', code_fingerprint(), config, *inputs)
+
+
+def save_analysis_results(results: Dict[str, Any]) -> None:
+    """保存分析结果到 OUTPUT_DIR/analysis_results.json"""
+    analysis_file = os.path.join(OUTPUT_DIR, 'analysis_results.json')
+    with open(analysis_file, 'wb') as f:
+        f.write(codec.dumps(results, indent=True))
+
+
+def restore_cached_run(cache: ResultCache, key: str) -> bool:
+    """输入没有变化时从缓存恢复分析结果和图表
+
+    Args:
+        cache: 结果缓存
+        key: run_key 生成的缓存键
+
+    Returns:
+        是否命中,任何一个图表已被淘汰时视为未命中
+    """
+    entry = cache.get_json(key)
+    if entry is None:
+        return False
+    for chart in entry['charts'].values():
+        if not cache.get_file(chart['key'], os.path.join(OUTPUT_DIR, chart['filename'])):
+            return False
+    save_analysis_results(entry['analysis'])
+    logger.info("Inputs unchanged since last run, restored cached analysis results and charts")
+    return True
+
+
+def analyze_and_visualize(analyzer, cache: Optional[ResultCache] = None, key: Optional[str] = None,
+                          history: Optional['PriceHistoryStore'] = None) -> None:
+    """对商品数据进行分析并生成图表
+
+    图表只根据分析器计算的汇总数据绘制,不再读取原始商品数据;汇总数据同时保存在
+    分析结果中,可以用 DataVisualizer.from_summaries 重新绘图。传入缓存时,
+    汇总没有变化的图表直接从缓存复制,整次运行的结果也以 key 保存到缓存中。
+
+    Args:
+        analyzer: DataAnalyzer、MongoAnalyzer 或 IncrementalAnalyzer
+        cache: 可选的结果缓存
+        key: 本次运行的缓存键
+        history: 可选的价格历史存储,传入时结果中包含降价检测
+    """
+    from analysis.analyzer import DataAnalyzer
+    from visualization.visualizer import DataVisualizer
+
+    # 数据分析
+    with metrics.span('analyze'):
+        basic_stats = analyzer.basic_statistics()
+        price_dist = analyzer.price_distribution()
+        location_stats = analyzer.location_analysis()
+        chart_summaries = analyzer.chart_summaries()
+        metrics.add('analyze', items=basic_stats.get('total_items', 0))
+
+        # 保存分析结果
+        results = {
+            'basic_stats': basic_stats,
+            'price_distribution': price_dist,
+            'location_analysis': location_stats,
+            'chart_summaries': chart_summaries
+        }
+        if history is not None:
+            results['price_drops'] = DataAnalyzer.from_price_history(history).price_drops()
+        save_analysis_results(results)
+
+    # 数据可视化
+    with metrics.span('visualize'):
+        visualizer = DataVisualizer.from_summaries(chart_summaries, OUTPUT_DIR)
+        report = visualizer.render_all(workers=CHART_WORKERS or None, cache=cache)
+
+    if cache is not None:
+        if key is not None:
+            charts = {
+                name: {'key': entry['key'], 'filename': os.path.basename(entry['path'])}
+                for name, entry in report.items()
+            }
+            cache.put_json(key, {'analysis': results, 'charts': charts})
+        cache.evict()
+
+
+def stream_main(source: str = RAW_DATA_SOURCE, batch_size: int = INGEST_BATCH_SIZE,
+                workers: int = PARSE_WORKERS, ingest_only: bool = INGEST_ONLY):
+    """流式处理目录或glob下的所有原始数据
+
+    商品按批次写入MongoDB,分析阶段再从集合中分批读取所需字段,数据量较大时
+    统计改为在服务端聚合;图表只使用汇总数据,不再读取原始商品。
+    启用缓存时,原始文件和集合都没有变化则直接恢复上次的结果。ANALYSIS_MODE 为 incremental 时,
+    每个批次在写入的同时合并到持久化的统计状态中,不再重新扫描集合。
+    启用变化检测时,与上次写入相比没有变化的商品在构造字典之前即被丢弃,只有新商品和
+    已变化商品写入MongoDB和Parquet;有已变化商品时增量统计在分析前从集合重新计算。
+
+    Args:
+        source: 单个文件、目录或glob模式
+        batch_size: 每批次的商品数量
+        workers: 解析进程数,1表示在当前进程中解析
+        ingest_only: 为True时只解析和写入,不使用缓存,也不导入分析和绘图模块
+    """
+    db = None
+    try:
+        db = connect_db()
+
+        cache = None if ingest_only else open_cache()
+        if cache is not None:
+            files = file_fingerprint(JsonProcessor.iter_raw_files(source), CACHE_HASH_CONTENTS)
+            if restore_cached_run(cache, run_key(cache, files, collection_fingerprint(db.collection))):
+                return
+
+        parquet_store = open_parquet_store()
+        incremental = open_incremental(db)
+        index = open_change_index(db)
+        history = open_price_history()
+        search_index = open_search_index(db)
+        dedup_index = open_dedup_index(db)
+        seen = stored = 0
+        if workers == 1:
+            records = JsonProcessor.stream_rows(source)
+        else:
+            records = ParallelParser(workers or None, PARSE_CHUNK_SIZE).iter_items(source)
+
+        with metrics.span('ingest'):
+            # 解析耗时只计产出批次的时间,不包括写入
+            for batch in metrics.iterate('ingest.parse', JsonProcessor.iter_batches(records, batch_size), sized=True):
+                seen += len(batch)
+                stored += store_batch(db, batch, parquet_store, incremental, index, history, search_index,
+                                      dedup_index)
+            metrics.add('ingest', items=seen)
+
+        if not seen:
+            logger.error(f"No items found in {source}")
+            return
+        if history is not None:
+            history.compact()
+        logger.info(f"Stored {stored} new or changed items, skipped {seen - stored} unchanged items")
+        if ingest_only:
+            finish_ingest(incremental)
+            return
+
+        analyzer = load_analyzer(db, incremental)
+        # 以导入之后的集合状态为键,下次运行时若集合和文件都未变化即可命中
+        key = run_key(cache, files, collection_fingerprint(db.collection)) if cache is not None else None
+        analyze_and_visualize(analyzer, cache, key, history)
+        logger.info("Data processing completed successfully")
+
+    except Exception as e:
+        logger.error(f"Error occurred in stage {metrics.failed_stage(e) or 'setup'}: {str(e)}")
+    finally:
+        if db is not None:
+            db.close()
+
+
+def crawl_main(keywords: List[str] = CRAWL_KEYWORDS, endpoint: str = CRAWL_ENDPOINT,
+               ingest_only: bool = INGEST_ONLY):
+    """抓取关键词的搜索结果,边抓取边解析和写入,完成后分析整个集合
+
+    抓取顺序和频率由 CrawlScheduler 决定,只抓取已到期的关键词,其余关键词留在
+    CRAWL_STATE_FILE 中等待之后的运行。适合由cron等定时调用。启用变化检测时只写入
+    新商品和已变化商品。
+
+    Args:
+        keywords: 搜索关键词
+        endpoint: 搜索接口地址
+        ingest_only: 为True时只抓取和写入,不分析集合
+    """
+    if not endpoint or not keywords:
+        logger.error("CRAWL_ENDPOINT and CRAWL_KEYWORDS must be set in crawl mode")
+        return
+
+    import asyncio
+    from urllib.parse import urlparse
+    from crawler.pipeline import CrawlPipeline
+    from crawler.scheduler import AdaptiveConcurrency, CrawlScheduler, volatility_from_collection
+    from crawler.transport import HttpTransport
+
+    db = None
+    try:
+        db = connect_db()
+        parquet_store = open_parquet_store()
+        incremental = open_incremental(db)
+        index = open_change_index(db)
+        history = open_price_history()
+        search_index = open_search_index(db)
+        dedup_index = open_dedup_index(db)
+
+        def store(batch: List[Dict[str, Any]]) -> None:
+            store_batch(db, batch, parquet_store, incremental, index, history, search_index, dedup_index)
+
+        scheduler = CrawlScheduler(
+            keywords,
+            state_file=CRAWL_STATE_FILE,
+            max_pages=CRAWL_MAX_PAGES,
+            page_size=CRAWL_PAGE_SIZE,
+            host=urlparse(endpoint).netloc,
+            host_rate=CRAWL_HOST_RATE,
+            host_burst=CRAWL_HOST_BURST,
+            concurrency=AdaptiveConcurrency(
+                CRAWL_FETCH_CONCURRENCY, 1, CRAWL_MAX_CONCURRENCY, latency_target=CRAWL_LATENCY_TARGET
+            ),
+            min_interval=CRAWL_MIN_INTERVAL,
+            max_interval=CRAWL_MAX_INTERVAL,
+            initial_volatility=volatility_from_collection(db.collection)
+        )
+
+        headers = {'Cookie': CRAWL_COOKIE} if CRAWL_COOKIE else None
+        pipeline = CrawlPipeline(
+            HttpTransport(endpoint, headers, CRAWL_TIMEOUT),
+            store,
+            fetch_concurrency=CRAWL_MAX_CONCURRENCY,
+            parse_concurrency=CRAWL_PARSE_CONCURRENCY,
+            # 增量统计状态不是线程安全的,只用一个写入协程
+            store_concurrency=1 if incremental is not None else CRAWL_STORE_CONCURRENCY,
+            queue_size=CRAWL_QUEUE_SIZE,
+            store_batch_size=WRITE_BATCH_SIZE,
+            max_retries=CRAWL_MAX_RETRIES,
+            raw_dir=os.path.join(RAW_DATA_DIR, 'crawl') if CRAWL_SAVE_RAW else None
+        )
+        with metrics.span('crawl'):
+            stats = asyncio.run(pipeline.run(scheduler=scheduler))
+        metrics.add('crawl', items=stats.items_stored)
+        if history is not None:
+            history.compact()
+        if not stats.items_stored:
+            logger.info("No keywords due for crawling")
+            return
+        if ingest_only:
+            finish_ingest(incremental)
+            return
+
+        analyzer = load_analyzer(db, incremental)
+        analyze_and_visualize(analyzer, open_cache(), history=history)
+        logger.info("Data processing completed successfully")
+
+    except Exception as e:
+        logger.error(f"Error occurred in stage {metrics.failed_stage(e) or 'setup'}: {str(e)}")
+    finally:
+        if db is not None:
+            db.close()
+
+
+def file_main(json_file: Optional[str] = None, ingest_only: bool = INGEST_ONLY):
+    """处理单个JSON文件,写入MongoDB后分析文件中的商品
+
+    Args:
+        json_file: JSON文件路径,默认为 RAW_DATA_DIR/response.json
+        ingest_only: 为True时只解析和写入,不分析文件中的商品
+    """
     # 初始化db为None
     db = None
 
     # 处理JSON文件
-    json_file = os.path.join(RAW_DATA_DIR, 'response.json')
+    json_file = json_file or os.path.join(RAW_DATA_DIR, 'response.json')
     if not os.path.exists(json_file):
         logger.error(f"File not found: {json_file}")
         return
 
     try:
+        cache = None if ingest_only else open_cache()
+        key = run_key(cache, file_fingerprint([json_file], CACHE_HASH_CONTENTS)) if cache is not None else None
+        if cache is not None and restore_cached_run(cache, key):
+            return
+
         # 使用JsonProcessor处理数据
-        processor = JsonProcessor()
-        items = processor.process_json_file(json_file)
+        with metrics.span('ingest.parse'):
+            items = JsonProcessor().process_json_file(json_file)
+        metrics.add('ingest.parse', items=len(items))
         if not items:
             logger.error("No items found in the JSON file")
             return
 
-        # 存储到MongoDB
-        db = MongoDB(MONGODB_URI, MONGODB_DB, MONGODB_COLLECTION)
-        db.insert_many(items)
+        # 存储到MongoDB,启用变化检测时只写入新商品和已变化商品
+        db = connect_db()
+        index = open_change_index(db)
+        parquet_store = open_parquet_store()
+        history = open_price_history()
+        search_index = open_search_index(db)
+        dedup_index = open_dedup_index(db)
+        stored = store_batch(db, items, parquet_store, index=index, history=history, search_index=search_index,
+                             dedup_index=dedup_index)
+        logger.info(f"Stored {stored} new or changed items, skipped {len(items) - stored} unchanged items")
+        if ingest_only:
+            finish_ingest()
+            return
+        # 写入可能改变了价格历史,以写入之后的状态为键,下次运行时若文件和价格历史都未变化即可命中
+        if cache is not None:
+            key = run_key(cache, file_fingerprint([json_file], CACHE_HASH_CONTENTS))
 
-        # 数据分析
-        analyzer = DataAnalyzer(items)
-        basic_stats = analyzer.basic_statistics()
-        price_dist = analyzer.price_distribution()
-        location_stats = analyzer.location_analysis()
+        from analysis.analyzer import DataAnalyzer
 
-        # 保存分析结果
-        analysis_file = os.path.join(OUTPUT_DIR, 'analysis_results.json')
-        with open(analysis_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                'basic_stats': basic_stats,
-                'price_distribution': price_dist,
-                'location_analysis': location_stats
-            }, f, ensure_ascii=False, indent=2)
-
-        # 数据可视化
-        visualizer = DataVisualizer(items, OUTPUT_DIR)
-        visualizer.plot_price_distribution()
-        visualizer.plot_location_distribution()
-        visualizer.plot_category_distribution()
-        visualizer.plot_price_by_location()
+        with metrics.span('analyze.load'):
+            if dedup_index is not None and DEDUP_COLLAPSE:
+                items = dedup_index.collapse(items)
+            analyzer = DataAnalyzer(items)
+        analyze_and_visualize(analyzer, cache, key, history)
 
         logger.info("Data processing completed successfully")
 
     except Exception as e:
-        logger.error(f"Error occurred: {str(e)}")
+        logger.error(f"Error occurred in stage {metrics.failed_stage(e) or 'setup'}: {str(e)}")
     finally:
         if db is not None:
             db.close()
 
 
+def export_metrics(registry: MetricsRegistry, path: str = METRICS_FILE) -> None:
+    """记录各阶段指标摘要并导出到 METRICS_FILE,导出失败不影响主流程"""
+    if not registry.records:
+        return
+    logger.info(f"Stage metrics:\n{registry.summary()}")
+    if not path:
+        return
+    try:
+        registry.export(path)
+    except OSError as e:
+        logger.error(f"Failed to export metrics to {path}: {str(e)}")
+
+
+def main():
+    """主程序"""
+    setup()
+    registry = MetricsRegistry(METRICS_TRACE_MEMORY, METRICS_PROFILE_DIR or None)
+    metrics.set_registry(registry)
+    try:
+        if INGEST_MODE == 'stream':
+            stream_main()
+        elif INGEST_MODE == 'crawl':
+            crawl_main()
+        else:
+            file_main()
+    finally:
+        export_metrics(registry)
+
+
 if __name__ == "__main__":
     main()
@@ -3,6 +3,14 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime
 import json
 
+# Item.to_dict 输出的字段及顺序
+ITEM_FIELDS = (
+    'item_id', 'title', 'price', 'description', 'url', 'created_at', 'updated_at', 'publish_time',
+    'category_id', 'tb_category_id', 'item_type', 'seller_id', 'seller_nick', 'seller_avatar',
+    'seller_rating', 'seller_reviews_count', 'seller_good_rating', 'want_count', 'is_free_shipping',
+    'pic_url', 'location', 'original_price', 'current_price', 'keyword', 'search_id', 'biz_type'
+)
+
 @dataclass
 class Item:
     """商品基础类，用于存储和管理商品信息
@@ -141,9 +149,15 @@ class Item:
         }
         return {**base_dict, **self.extra_attributes}
 
-    def to_json(self) -> str:
-        """将商品对象转换为JSON字符串"""
-        return json.dumps(self.to_dict(), ensure_ascii=False)
+    def to_json(self, json_codec: Optional[Any] = None) -> str:
+        """将商品对象转换为JSON字符串
+
+        Args:
+            json_codec: 编解码器,例如 data.codec.codec(),为None时使用标准库 json
+        """
+        if json_codec is None:
+            return json.dumps(self.to_dict(), ensure_ascii=False)
+        return json_codec.dumps(self.to_dict()).decode('utf-8')
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Item':
@@ -186,6 +200,11 @@ class Item:
         return cls(**base_attrs, extra_attributes=data)
 
     @classmethod
-    def from_json(cls, json_str: str) -> 'Item':
-        """从JSON字符串创建商品对象"""
-        return cls.from_dict(json.loads(json_str)) 
\ No newline at end of file
+    def from_json(cls, json_str: str, json_codec: Optional[Any] = None) -> 'Item':
+        """从JSON字符串创建商品对象
+
+        Args:
+            json_str: JSON字符串
+            json_codec: 编解码器,例如 data.codec.codec(),为None时使用标准库 json
+        """
+        return cls.from_dict((json_codec or json).loads(json_str))
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable, Sequence, Tuple
+from loguru import logger
+from data import codec
+
+# 阶段状态
+PENDING, RUNNING, DONE, FAILED, SKIPPED = 'pending', 'running', 'done', 'failed', 'skipped'
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """计算运行配置的指纹,配置变化时不能从上次中断的位置继续"""
+    return hashlib.blake2b(codec.dumps(config, sort_keys=True), digest_size=16).hexdigest()
+
+
+class RunState:
+    """保存在磁盘上的运行状态
+
+    记录每个阶段的状态、耗时、输出和阶段内的检查点,每次变化后立即以原子替换的方式
+    写入 state_dir/state.json,进程在任意时刻退出后都可以从中恢复。阶段输出和检查点
+    必须可以序列化为JSON。
+    """
+
+    def __init__(self, state_dir: str, config: Dict[str, Any], restart: bool = False):
+        """打开或创建运行状态
+
+        Args:
+            state_dir: 状态目录,阶段的中间结果也保存在这里
+            config: 影响运行结果的配置,与上次不同时重新开始
+            restart: 为True时忽略上次的状态
+        """
+        self.state_dir = state_dir
+        self.path = os.path.join(state_dir, 'state.json')
+        self._lock = threading.Lock()
+        os.makedirs(state_dir, exist_ok=True)
+
+        fingerprint = config_fingerprint(config)
+        data = None
+        if not restart and os.path.exists(self.path):
+            try:
+                with open(self.path, 'rb') as f:
+                    data = codec.loads(f.read())
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable run state {self.path}: {str(e)}")
+            if data is not None and data.get('fingerprint') != fingerprint:
+                logger.info("Inputs or configuration changed since the last run, starting a new run")
+                data = None
+        if data is None:
+            data = {'run_id': uuid.uuid4().hex, 'fingerprint': fingerprint, 'config': config,
+                    'created_at': time.time(), 'stages': {}}
+        else:
+            logger.info(f"Resuming run {data['run_id']} from {self.path}")
+        self.data = data
+        self._save()
+
+    @property
+    def run_id(self) -> str:
+        return self.data['run_id']
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(codec.dumps(self.data, indent=True))
+        os.replace(tmp_path, self.path)
+
+    def stage(self, name: str) -> Dict[str, Any]:
+        """阶段的状态记录,不存在时创建"""
+        return self.data['stages'].setdefault(name, {'status': PENDING, 'checkpoint': {}})
+
+    def status(self, name: str) -> str:
+        return self.data['stages'].get(name, {}).get('status', PENDING)
+
+    def output(self, name: str) -> Optional[Dict[str, Any]]:
+        """已完成阶段的输出"""
+        return self.data['stages'].get(name, {}).get('output')
+
+    def update(self, name: str, **values: Any) -> None:
+        """更新阶段的状态记录并保存"""
+        with self._lock:
+            self.stage(name).update(values)
+            self._save()
+
+    def reset(self, name: str) -> None:
+        """清除阶段的状态和检查点,下次从头运行"""
+        with self._lock:
+            self.data['stages'][name] = {'status': PENDING, 'checkpoint': {}}
+            self._save()
+
+    def checkpoint(self, name: str) -> Dict[str, Any]:
+        """阶段内的检查点,只读副本"""
+        with self._lock:
+            return dict(self.stage(name)['checkpoint'])
+
+    def save_checkpoint(self, name: str, **values: Any) -> None:
+        """更新阶段内的检查点并立即保存,阶段失败后重新运行时可以跳过已完成的部分"""
+        with self._lock:
+            self.stage(name)['checkpoint'].update(values)
+            self._save()
+
+
+@dataclass
+class Stage:
+    """DAG中的一个阶段
+
+    func 接收运行状态和阶段名,返回可以序列化为JSON的输出或None。
+    """
+    name: str
+    func: Callable[[RunState, str], Optional[Dict[str, Any]]]
+    depends: Tuple[str, ...] = ()
+
+
+class DagRunner:
+    """按依赖关系运行阶段,没有依赖关系的阶段在线程池中并发运行
+
+    已完成的阶段在恢复运行时被跳过;某个阶段失败后不再启动依赖它的阶段,已经开始的
+    阶段运行完毕后返回。只运行部分阶段时,未选中的依赖视为已满足。
+    """
+
+    def __init__(self, stages: Sequence[Stage], state: RunState, workers: int = 2):
+        """初始化运行器
+
+        Args:
+            stages: 阶段列表
+            state: 运行状态
+            workers: 同时运行的阶段数上限
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.state = state
+        self.workers = max(1, workers)
+        for stage in stages:
+            unknown = [name for name in stage.depends if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {', '.join(unknown)}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order, visiting, visited = [], set(), set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage dependencies contain a cycle at {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].depends:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _run_stage(self, name: str) -> Optional[Dict[str, Any]]:
+        self.state.update(name, status=RUNNING, started_at=time.time(), error=None)
+        logger.info(f"Starting stage {name}")
+        start = time.perf_counter()
+        output = self.stages[name].func(self.state, name)
+        seconds = time.perf_counter() - start
+        self.state.update(name, status=DONE, finished_at=time.time(), seconds=seconds, output=output)
+        logger.info(f"Stage {name} completed in {seconds:.2f}s")
+        return output
+
+    def run(self, selected: Optional[Sequence[str]] = None, rerun: Sequence[str] = ()) -> Dict[str, str]:
+        """运行阶段
+
+        Args:
+            selected: 要运行的阶段,为None时运行全部阶段
+            rerun: 即使已完成也重新运行的阶段
+
+        Returns:
+            阶段名到最终状态的字典
+        """
+        selected = list(self.order) if selected is None else [name for name in self.order if name in selected]
+        for name in rerun:
+            if name in selected:
+                self.state.reset(name)
+
+        statuses = {}
+        pending = []
+        for name in selected:
+            if self.state.status(name) == DONE:
+                logger.info(f"Stage {name} already completed in run {self.state.run_id}, skipping")
+                statuses[name] = DONE
+            else:
+                pending.append(name)
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                failed = any(status == FAILED for status in statuses.values())
+                for name in list(pending):
+                    dependencies = [dep for dep in self.stages[name].depends if dep in selected]
+                    if any(statuses.get(dep) in (FAILED, SKIPPED) for dep in dependencies):
+                        pending.remove(name)
+                        statuses[name] = SKIPPED
+                        logger.warning(f"Skipping stage {name} because a dependency did not complete")
+                    elif not failed and len(running) < self.workers and \
+                            all(statuses.get(dep) == DONE for dep in dependencies):
+                        pending.remove(name)
+                        running[executor.submit(self._run_stage, name)] = name
+                if not running:
+                    # 剩余阶段的依赖已失败
+                    for name in pending:
+                        statuses[name] = SKIPPED
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        statuses[name] = DONE
+                    else:
+                        statuses[name] = FAILED
+                        self.state.update(name, status=FAILED, finished_at=time.time(),
+                                          error=f"{type(error).__name__}: {error}")
+                        logger.error(f"Stage {name} failed: {str(error)}")
+        return statuses
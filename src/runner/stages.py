@@ -0,0 +1,214 @@
+import os
+import shutil
+import threading
+from typing import List, Dict, Any, Optional
+from loguru import logger
+from data import codec
+from data.parallel import ParallelParser
+from data.processor import JsonProcessor
+from models.item import ITEM_FIELDS
+from runner.dag import RunState, Stage
+from telemetry import metrics
+from storage.sinks import (
+    open_change_index,
+    open_dedup_index,
+    open_incremental,
+    open_parquet_store,
+    open_price_history,
+    open_search_index
+)
+from main import connect_db, load_analyzer, open_cache, save_analysis_results, store_batch
+from config.settings import (
+    OUTPUT_DIR,
+    ANALYSIS_STATE_FILE,
+    WRITE_BATCH_SIZE
+)
+
+# 全部阶段,按依赖顺序排列
+STAGE_NAMES = ('ingest', 'store', 'analyze', 'visualize')
+
+# 分析结果文件中各部分的顺序,与 main.analyze_and_visualize 相同
+RESULT_KEYS = ('basic_stats', 'price_distribution', 'location_analysis', 'chart_summaries', 'price_drops')
+
+
+class BackfillStages:
+    """批量导入的四个阶段
+
+    - ingest: 解析原始数据文件,按批次保存为 state_dir/staged 下的JSON-lines文件
+    - store: 将解析结果写入MongoDB以及启用的其他存储,每写完一个文件记录一次检查点
+    - analyze: 计算统计信息,与 visualize 互不依赖,可以并发运行
+    - visualize: 计算图表汇总并渲染图表
+
+    analyze 和 visualize 共用同一个分析器,只从MongoDB读取一次。
+    """
+
+    def __init__(self, source: str, batch_size: int, parse_workers: int, parse_chunk_size: int,
+                 chart_workers: int = 0):
+        """初始化阶段
+
+        Args:
+            source: 单个文件、目录或glob模式
+            batch_size: ingest 阶段每个中间文件的商品数
+            parse_workers: 解析进程数,1表示在当前进程中解析,0表示使用全部CPU核
+            parse_chunk_size: 每次派发给解析进程的文件数
+            chart_workers: 图表渲染进程数,0表示自动选择
+        """
+        self.source = source
+        self.batch_size = batch_size
+        self.parse_workers = parse_workers
+        self.parse_chunk_size = parse_chunk_size
+        self.chart_workers = chart_workers
+        self._lock = threading.Lock()
+        self._db = None
+        self._analyzer = None
+
+    def stages(self) -> List[Stage]:
+        return [
+            Stage('ingest', self.ingest),
+            Stage('store', self.store, ('ingest',)),
+            Stage('analyze', self.analyze, ('store',)),
+            Stage('visualize', self.visualize, ('store',))
+        ]
+
+    def db(self):
+        """共用的MongoDB连接"""
+        with self._lock:
+            if self._db is None:
+                self._db = connect_db()
+            return self._db
+
+    def analyzer(self):
+        """共用的分析器,第一次调用时创建"""
+        with self._lock:
+            if self._analyzer is None:
+                if self._db is None:
+                    self._db = connect_db()
+                self._analyzer = load_analyzer(self._db, open_incremental(self._db))
+            return self._analyzer
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+
+    @staticmethod
+    def staged_dir(state: RunState) -> str:
+        return os.path.join(state.state_dir, 'staged')
+
+    def ingest(self, state: RunState, name: str) -> Dict[str, Any]:
+        """解析原始数据,先写入临时目录,全部完成后再替换 staged 目录"""
+        staged = self.staged_dir(state)
+        tmp_dir = f"{staged}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        if self.parse_workers == 1:
+            records = JsonProcessor.stream_rows(self.source)
+        else:
+            records = ParallelParser(self.parse_workers or None, self.parse_chunk_size).iter_items(self.source)
+
+        items = parts = 0
+        with metrics.span(name):
+            for batch in metrics.iterate('ingest.parse', JsonProcessor.iter_batches(records, self.batch_size),
+                                         sized=True):
+                path = os.path.join(tmp_dir, f"part-{parts:05d}.jsonl")
+                with open(path, 'wb') as f:
+                    for record in batch:
+                        row = [record.get(field) for field in ITEM_FIELDS] if isinstance(record, dict) else record
+                        f.write(codec.dumps(row))
+                        f.write(b'\n')
+                items += len(batch)
+                parts += 1
+            metrics.add(name, items=items)
+
+        shutil.rmtree(staged, ignore_errors=True)
+        os.replace(tmp_dir, staged)
+        logger.info(f"Staged {items} items from {self.source} in {parts} files")
+        return {'items': items, 'parts': parts}
+
+    def store(self, state: RunState, name: str) -> Dict[str, Any]:
+        """写入解析结果,已记录在检查点中的文件不再写入
+
+        文件写入和检查点之间中断时,该文件在恢复后会被重新写入;启用变化检测或 upsert
+        模式时重复写入不会产生重复数据。
+        """
+        staged = self.staged_dir(state)
+        if not os.path.isdir(staged):
+            raise FileNotFoundError(f"No staged items in {staged}, run the ingest stage first")
+
+        db = self.db()
+        parquet_store = open_parquet_store()
+        incremental = open_incremental(db)
+        index = open_change_index(db)
+        history = open_price_history()
+        search_index = open_search_index(db)
+        dedup_index = open_dedup_index(db)
+
+        checkpoint = state.checkpoint(name)
+        done = list(checkpoint.get('parts', []))
+        seen, stored = checkpoint.get('seen', 0), checkpoint.get('stored', 0)
+        if done:
+            logger.info(f"Resuming {name} stage after {len(done)} stored files")
+        with metrics.span(name):
+            for part in sorted(os.listdir(staged)):
+                if part in done:
+                    continue
+                with open(os.path.join(staged, part), 'rb') as f:
+                    rows = [tuple(codec.loads(line)) for line in f if line.strip()]
+                for batch in JsonProcessor.iter_batches(rows, WRITE_BATCH_SIZE):
+                    stored += store_batch(db, batch, parquet_store, incremental, index, history, search_index,
+                                          dedup_index)
+                seen += len(rows)
+                if incremental is not None:
+                    incremental.save(ANALYSIS_STATE_FILE)
+                done.append(part)
+                state.save_checkpoint(name, parts=done, seen=seen, stored=stored)
+            metrics.add(name, items=stored)
+        if history is not None:
+            history.compact()
+        logger.info(f"Stored {stored} new or changed items, skipped {seen - stored} unchanged items")
+        return {'seen': seen, 'stored': stored}
+
+    def analyze(self, state: RunState, name: str) -> Dict[str, Any]:
+        """计算统计信息"""
+        from analysis.analyzer import DataAnalyzer
+
+        analyzer = self.analyzer()
+        with metrics.span(name):
+            results = {
+                'basic_stats': analyzer.basic_statistics(),
+                'price_distribution': analyzer.price_distribution(),
+                'location_analysis': analyzer.location_analysis()
+            }
+            history = open_price_history()
+            if history is not None:
+                results['price_drops'] = DataAnalyzer.from_price_history(history).price_drops()
+        return results
+
+    def visualize(self, state: RunState, name: str) -> Dict[str, Any]:
+        """计算图表汇总并渲染图表"""
+        from visualization.visualizer import DataVisualizer
+
+        analyzer = self.analyzer()
+        with metrics.span(name):
+            summaries = analyzer.chart_summaries()
+            cache = open_cache()
+            report = DataVisualizer.from_summaries(summaries, OUTPUT_DIR).render_all(
+                workers=self.chart_workers or None, cache=cache
+            )
+            if cache is not None:
+                cache.evict()
+        return {'chart_summaries': summaries, 'charts': {chart: entry['path'] for chart, entry in report.items()}}
+
+    @staticmethod
+    def save_results(state: RunState) -> Optional[str]:
+        """将 analyze 和 visualize 的输出合并保存为 OUTPUT_DIR/analysis_results.json
+
+        Returns:
+            有输出时返回文件路径,否则返回None
+        """
+        merged = {**(state.output('analyze') or {}), **(state.output('visualize') or {})}
+        results = {key: merged[key] for key in RESULT_KEYS if key in merged}
+        if not results:
+            return None
+        save_analysis_results(results)
+        return os.path.join(OUTPUT_DIR, 'analysis_results.json')
@@ -0,0 +1,89 @@
+"""商品标题搜索
+
+在 SEARCH_INDEX_FILE 中的倒排索引上按关键词、价格区间和地区查询已写入的商品:
+
+    python src/search.py "iPhone 13 256G" --max-price 3000 --location 杭州
+    python src/search.py 全新 --min-price 100 --limit 50 --json
+    python src/search.py --rebuild
+    python src/search.py --compact
+
+写入数据时设置 SEARCH_INDEX=true 即可增量更新索引;--rebuild 从MongoDB集合重建索引,
+--compact 清理标题变化后留下的失效文档。
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('query', nargs='?', default='', help='查询词,多个词用空格分隔,为空时只按价格和地区过滤')
+    parser.add_argument('--min-price', type=float, help='最低价格')
+    parser.add_argument('--max-price', type=float, help='最高价格')
+    parser.add_argument('--location', help='地区,例如 杭州')
+    parser.add_argument('--limit', type=int, default=20, help='最多返回的商品数')
+    parser.add_argument('--json', action='store_true', help='每行输出一个JSON对象')
+    parser.add_argument('--index', help='索引文件,默认为 SEARCH_INDEX_FILE')
+    parser.add_argument('--rebuild', action='store_true', help='从MongoDB集合重建索引')
+    parser.add_argument('--compact', action='store_true', help='清理失效文档并合并倒排块')
+    parser.add_argument('--batch-size', type=int, default=10000, help='重建时每次从MongoDB读取的文档数')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """运行查询或维护操作
+
+    Returns:
+        进程退出码
+    """
+    args = parse_args(argv)
+
+    from loguru import logger
+    from config.settings import SEARCH_INDEX_FILE
+    from data import codec
+    from storage.search_index import SearchIndex, SEARCH_FIELDS
+
+    path = args.index or SEARCH_INDEX_FILE
+    if args.rebuild or args.compact:
+        from main import connect_db, setup
+
+        setup()
+        index = SearchIndex(path)
+        if args.rebuild:
+            db = connect_db()
+            try:
+                index.rebuild(db.iter_batches(None, SEARCH_FIELDS, args.batch_size))
+            finally:
+                db.close()
+        if args.compact:
+            index.compact()
+        index.close()
+        return 0
+
+    # 查询结果输出到标准输出,日志只保留警告和错误
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    if not os.path.exists(path):
+        logger.error(f"Search index {path} not found, ingest with SEARCH_INDEX=true or run with --rebuild")
+        return 1
+
+    index = SearchIndex(path)
+    start = time.perf_counter()
+    results = index.search(args.query, args.min_price, args.max_price, args.location, args.limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    index.close()
+
+    for item in results:
+        if args.json:
+            sys.stdout.write(codec.dumps(item).decode('utf-8') + '\n')
+        else:
+            price = '-' if item['price'] is None else f"{item['price']:.2f}"
+            print(f"{price:>10}  {item['location'] or '-':<6}  {item['item_id']}  {item['title']}")
+    print(f"{len(results)} items in {elapsed:.1f}ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Sequence, Tuple, Union
+from loguru import logger
+from models.item import ITEM_FIELDS
+
+# 参与指纹计算的字段,其他字段(例如抓取时间、搜索ID)变化不视为商品变化
+FINGERPRINT_FIELDS = ('price', 'title', 'want_count', 'location')
+
+# 商品字典或按 ITEM_FIELDS 排列的字段值元组
+Record = Union[Dict[str, Any], tuple]
+
+# 单条SQL中的参数个数上限,旧版SQLite为999
+_MAX_VARIABLES = 900
+
+
+def item_fingerprint(values: Sequence[Any]) -> int:
+    """计算字段值的64位指纹,以有符号整数返回以便存入SQLite INTEGER列"""
+    payload = '\x1f'.join('' if value is None else str(value) for value in values)
+    digest = hashlib.blake2b(payload.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class ChangeIndex:
+    """基于SQLite的商品变化索引
+
+    每个商品只保存 (item_id, 指纹, 最后写入时间) 三列,百万商品约占几十MB磁盘。
+    split 按批次查询已有指纹,把记录分为新商品、已变化商品和未变化商品;
+    调用方在写入成功后再用 record 保存指纹,写入失败的商品下次仍会被视为变化。
+    连接可以在多个线程中使用(例如抓取流水线的写入线程),访问由锁串行化。
+    """
+
+    def __init__(self, path: str, fields: Sequence[str] = FINGERPRINT_FIELDS):
+        """打开或创建变化索引
+
+        Args:
+            path: SQLite文件路径
+            fields: 参与指纹计算的字段
+        """
+        self.path = path
+        self.fields = tuple(fields)
+        self._positions = [ITEM_FIELDS.index(name) for name in self.fields]
+        self._id_position = ITEM_FIELDS.index('item_id')
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS fingerprints ('
+            'item_id TEXT PRIMARY KEY, fingerprint INTEGER NOT NULL, updated_at REAL NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM fingerprints').fetchone()[0]
+
+    def _key(self, record: Record) -> Tuple[Any, int]:
+        """返回记录的 (item_id, 指纹)"""
+        if isinstance(record, dict):
+            return record.get('item_id'), item_fingerprint([record.get(name) for name in self.fields])
+        return record[self._id_position], item_fingerprint([record[position] for position in self._positions])
+
+    def _lookup(self, item_ids: List[Any]) -> Dict[Any, int]:
+        known = {}
+        for start in range(0, len(item_ids), _MAX_VARIABLES):
+            chunk = item_ids[start:start + _MAX_VARIABLES]
+            placeholders = ','.join('?' * len(chunk))
+            known.update(self.connection.execute(
+                f'SELECT item_id, fingerprint FROM fingerprints WHERE item_id IN ({placeholders})', chunk
+            ))
+        return known
+
+    def split(self, records: Sequence[Record]) -> Tuple[List[Record], List[Record]]:
+        """找出新商品和已变化的商品
+
+        没有 item_id 的记录无法比较,一律视为新商品;同一批次中重复出现且指纹相同的商品
+        只保留第一条。
+
+        Args:
+            records: 商品字典或字段值元组
+
+        Returns:
+            (新商品, 已变化商品),未变化的商品被丢弃
+        """
+        keys = [self._key(record) for record in records]
+        with self._lock:
+            known = self._lookup(list({item_id for item_id, _ in keys if item_id is not None}))
+        new, changed = [], []
+        for record, (item_id, fingerprint) in zip(records, keys):
+            if item_id is None:
+                new.append(record)
+                continue
+            previous = known.get(item_id)
+            if previous == fingerprint:
+                continue
+            (new if previous is None else changed).append(record)
+            known[item_id] = fingerprint
+        return new, changed
+
+    def record(self, records: Sequence[Record]) -> None:
+        """保存已写入商品的指纹
+
+        Args:
+            records: 商品字典或字段值元组
+        """
+        now = time.time()
+        rows = [
+            (item_id, fingerprint, now)
+            for item_id, fingerprint in map(self._key, records)
+            if item_id is not None
+        ]
+        with self._lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO fingerprints (item_id, fingerprint, updated_at) VALUES (?, ?, ?)', rows
+            )
+            self.connection.commit()
+
+    def clear(self) -> None:
+        """清空索引,例如目标集合被删除之后"""
+        with self._lock:
+            self.connection.execute('DELETE FROM fingerprints')
+            self.connection.commit()
+        logger.info(f"Cleared change index {self.path}")
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
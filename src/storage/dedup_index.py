@@ -0,0 +1,379 @@
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
+from urllib.parse import urlsplit
+import numpy as np
+from loguru import logger
+from models.item import ITEM_FIELDS
+from storage.search_index import normalize_text
+
+# 商品字典或按 ITEM_FIELDS 排列的字段值元组
+Record = Union[Dict[str, Any], tuple]
+
+# MinHash签名的长度,分为 BANDS 段,每段 NUM_PERM // BANDS 个值
+NUM_PERM = 64
+BANDS = 16
+
+# 标题按去掉空白后的连续 SHINGLE_SIZE 个字符切分
+SHINGLE_SIZE = 3
+
+# 每个LSH桶和每张主图最多对应的商品数,同一卖家大量发布相似商品时只与最先进入的
+# 商品比较,保证每个商品的比较次数有上限
+MAX_BUCKET_SIZE = 32
+
+# 每次向量化计算签名的商品数,限制临时矩阵的大小
+CHUNK_SIZE = 2048
+
+# 固定的随机种子,签名保存在索引中,不同运行必须使用相同的哈希函数
+SEED = 20240601
+
+# 单条SQL中的参数个数上限,旧版SQLite为999
+_MAX_VARIABLES = 900
+
+# 主图URL中图片扩展名之后的缩略图后缀,例如 .jpg_300x300.jpg、.jpg_.webp
+_PIC_SUFFIX = re.compile(r'(\.(?:jpe?g|png|webp|gif|heic))[_.].*$', re.IGNORECASE)
+
+
+def normalize_pic(url: Optional[str]) -> str:
+    """去掉主图URL的协议、查询参数和缩略图后缀,同一张图片的不同尺寸得到相同的值"""
+    if not url:
+        return ''
+    parts = urlsplit(url if '//' in url else f'//{url}')
+    return _PIC_SUFFIX.sub(r'\1', f'{parts.netloc}{parts.path}'.lower())
+
+
+def shingles(title: Optional[str], size: int = SHINGLE_SIZE) -> List[str]:
+    """将规范化后的标题切分为连续 size 个字符的片段,标题短于 size 时整体作为一个片段"""
+    text = normalize_text(title)
+    if len(text) <= size:
+        return [text] if text else []
+    return [text[start:start + size] for start in range(len(text) - size + 1)]
+
+
+class DuplicateIndex:
+    """基于MinHash和LSH的近似重复商品索引
+
+    每个商品的特征集合由标题片段加上 seller:<卖家ID> 和 pic:<主图> 组成,对其计算
+    NUM_PERM 个32位MinHash值。签名分为 BANDS 段,每段与卖家ID一起哈希为桶键,同一卖家
+    任意一段完全相同的商品成为候选;主图相同的商品不论卖家也是候选。候选中签名估计的
+    Jaccard相似度不低于 threshold 的归为同一簇。常见标题在不同卖家之间不会落入同一个桶,
+    每个商品只与有限个候选比较,整体复杂度与商品数成线性关系。
+
+    签名、簇和桶都保存在SQLite中,内存占用只与批次大小有关。簇以最先出现的商品为代表,
+    之后加入的商品都是它的重复;两个簇因为新商品而连通时合并到较早的簇,被合并簇的
+    代表随之变为重复商品。已索引的商品再次出现时不重新计算签名,直接返回已有结果。
+    连接可以在多个线程中使用,访问由锁串行化。
+    """
+
+    def __init__(self, path: str, threshold: float = 0.7, num_perm: int = NUM_PERM, bands: int = BANDS):
+        """打开或创建重复商品索引
+
+        Args:
+            path: SQLite文件路径
+            threshold: 判定为重复的最低Jaccard相似度
+            num_perm: 签名长度
+            bands: LSH段数,必须整除 num_perm
+
+        Raises:
+            ValueError: 参数不合法,或与已有索引创建时的签名参数不同
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm {num_perm} is not divisible by bands {bands}")
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        # 哈希函数族 h(x) = ((a * x + b) mod 2^64) >> 32,a为奇数
+        rng = np.random.default_rng(SEED)
+        self._a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        # 将一段签名值和卖家合并为桶的键,同时区分不同的段
+        self._band_multipliers = rng.integers(1, 2 ** 63, self.rows + 1, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._band_salts = rng.integers(0, 2 ** 63, bands, dtype=np.uint64)
+        self._positions = {name: ITEM_FIELDS.index(name) for name in ('item_id', 'title', 'seller_id', 'pic_url')}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(
+            'CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;'
+            'CREATE TABLE IF NOT EXISTS items ('
+            'doc INTEGER PRIMARY KEY, item_id TEXT NOT NULL UNIQUE, cluster INTEGER NOT NULL, '
+            'pic TEXT, signature BLOB NOT NULL'
+            ');'
+            'CREATE INDEX IF NOT EXISTS items_cluster ON items (cluster);'
+            'CREATE INDEX IF NOT EXISTS items_pic ON items (pic) WHERE pic IS NOT NULL;'
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            'key INTEGER NOT NULL, doc INTEGER NOT NULL, PRIMARY KEY (key, doc)'
+            ') WITHOUT ROWID;'
+        )
+        params = f'{num_perm}/{bands}/{SHINGLE_SIZE}/{SEED}'
+        stored = self.connection.execute("SELECT value FROM meta WHERE name = 'params'").fetchone()
+        if stored is None:
+            self.connection.execute("INSERT INTO meta (name, value) VALUES ('params', ?)", (params,))
+        elif stored[0] != params:
+            self.connection.close()
+            raise ValueError(f"Duplicate index {path} was built with parameters {stored[0]}, "
+                             f"expected {params}; delete it and rebuild")
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def _values(self, record: Record) -> Tuple[Any, Any, Any, Any]:
+        """返回记录的 (item_id, title, seller_id, pic_url)"""
+        if isinstance(record, dict):
+            return record.get('item_id'), record.get('title'), record.get('seller_id'), record.get('pic_url')
+        positions = self._positions
+        return (record[positions['item_id']], record[positions['title']],
+                record[positions['seller_id']], record[positions['pic_url']])
+
+    def signatures(self, features: Sequence[Sequence[str]]) -> np.ndarray:
+        """计算一批特征集合的MinHash签名
+
+        Args:
+            features: 每个商品的特征字符串,不能为空
+
+        Returns:
+            形状为 (商品数, num_perm) 的uint32数组
+        """
+        result = np.empty((len(features), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(features), CHUNK_SIZE):
+            chunk = features[start:start + CHUNK_SIZE]
+            lengths = np.fromiter((len(values) for values in chunk), dtype=np.int64, count=len(chunk))
+            hashes = np.fromiter(
+                (zlib.crc32(value.encode('utf-8')) for values in chunk for value in values),
+                dtype=np.uint64, count=int(lengths.sum())
+            )
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) >> np.uint64(32)
+            result[start:start + len(chunk)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        return result
+
+    def band_keys(self, signatures: np.ndarray, sellers: Sequence[Optional[str]]) -> np.ndarray:
+        """将签名的每一段与卖家ID合并为一个64位的桶键,卖家未知的商品之间共用同一组桶
+
+        Args:
+            signatures: 形状为 (商品数, num_perm) 的签名
+            sellers: 每个商品的卖家ID
+
+        Returns:
+            形状为 (商品数, bands) 的int64数组
+        """
+        bands = signatures.astype(np.uint64).reshape(len(signatures), self.bands, self.rows)
+        scopes = np.fromiter((zlib.crc32((seller or '').encode('utf-8')) for seller in sellers),
+                             dtype=np.uint64, count=len(sellers))
+        keys = (bands * self._band_multipliers[:-1]).sum(axis=2, dtype=np.uint64)
+        keys = keys + (scopes * self._band_multipliers[-1])[:, None]
+        return (keys ^ self._band_salts).view(np.int64)
+
+    def _known(self, item_ids: List[Any]) -> Dict[Any, Optional[str]]:
+        """已索引商品的 {item_id: 所在簇代表的item_id},代表本身对应None"""
+        known = {}
+        for start in range(0, len(item_ids), _MAX_VARIABLES):
+            chunk = item_ids[start:start + _MAX_VARIABLES]
+            known.update(self.connection.execute(
+                'SELECT item.item_id, CASE WHEN item.cluster = item.doc THEN NULL ELSE root.item_id END '
+                'FROM items AS item JOIN items AS root ON root.doc = item.cluster '
+                f"WHERE item.item_id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return known
+
+    def _select(self, sql: str, values: List[Any]) -> List[tuple]:
+        """按 _MAX_VARIABLES 分块执行 sql 中的 IN ({}) 查询"""
+        rows = []
+        for start in range(0, len(values), _MAX_VARIABLES):
+            chunk = values[start:start + _MAX_VARIABLES]
+            rows += self.connection.execute(sql.format(','.join('?' * len(chunk))), chunk).fetchall()
+        return rows
+
+    def assign(self, records: Sequence[Record]) -> Tuple[List[Optional[str]], Dict[str, str]]:
+        """将一批商品加入索引,找出其中的重复商品
+
+        没有 item_id 或标题的商品不参与去重。同一批次中先出现的商品也会作为后面商品的候选。
+
+        Args:
+            records: 商品字典或字段值元组
+
+        Returns:
+            (每条记录所在簇代表的item_id,代表本身和不参与去重的商品为None;
+             因簇合并而变为重复商品的原代表 {item_id: 新代表的item_id})
+        """
+        values = [self._values(record) for record in records]
+        with self._lock:
+            known = self._known(list({item_id for item_id, *_ in values if item_id is not None}))
+
+            # 需要计算签名的新商品,同一item_id只取第一条
+            pending, seen = [], set()
+            for position, (item_id, title, seller_id, pic_url) in enumerate(values):
+                if item_id is None or item_id in known or item_id in seen:
+                    continue
+                features = shingles(title)
+                if not features:
+                    continue
+                seen.add(item_id)
+                seller_id = None if seller_id in (None, '') else str(seller_id)
+                pic = normalize_pic(pic_url) or None
+                if seller_id is not None:
+                    features.append(f'seller:{seller_id}')
+                if pic is not None:
+                    features.append(f'pic:{pic}')
+                pending.append((position, item_id, seller_id, pic, features))
+
+            demoted = {}
+            assigned = {}
+            if pending:
+                assigned, demoted = self._add(pending)
+
+        result = []
+        for item_id, *_ in values:
+            result.append(assigned.get(item_id, known.get(item_id)) if item_id is not None else None)
+        return result, demoted
+
+    def _add(self, pending: List[tuple]) -> Tuple[Dict[Any, Optional[str]], Dict[str, str]]:
+        """计算新商品的签名,与桶中和主图相同的候选比较后写入索引,调用方持有锁"""
+        signatures = self.signatures([features for *_, features in pending])
+        keys = self.band_keys(signatures, [seller_id for _, _, seller_id, _, _ in pending]).tolist()
+
+        # 本批次涉及的桶和主图已有的商品,以及这些候选的簇和签名
+        buckets: Dict[Any, List[int]] = {}
+        for key, doc in self._select('SELECT key, doc FROM buckets WHERE key IN ({})',
+                                     list({key for row in keys for key in row})):
+            buckets.setdefault(key, []).append(doc)
+        for pic, doc in self._select('SELECT pic, doc FROM items WHERE pic IN ({}) ORDER BY doc',
+                                     list({pic for _, _, _, pic, _ in pending if pic is not None})):
+            members = buckets.setdefault(('pic', pic), [])
+            if len(members) < MAX_BUCKET_SIZE:
+                members.append(doc)
+        candidates = {
+            doc: (cluster, np.frombuffer(signature, dtype=np.uint32))
+            for doc, cluster, signature in self._select(
+                'SELECT doc, cluster, signature FROM items WHERE doc IN ({})',
+                list({doc for docs in buckets.values() for doc in docs})
+            )
+        }
+
+        # 本批次中的簇合并,旧代表 -> 新代表
+        merged: Dict[int, int] = {}
+
+        def find(cluster: int) -> int:
+            while cluster in merged:
+                cluster = merged[cluster]
+            return cluster
+
+        first_doc = next_doc = (self.connection.execute('SELECT MAX(doc) FROM items').fetchone()[0] or 0) + 1
+        rows, bucket_rows = [], []
+        for (_, item_id, _, pic, _), signature, item_keys in zip(pending, signatures, keys):
+            doc, next_doc = next_doc, next_doc + 1
+            if pic is not None:
+                item_keys.append(('pic', pic))
+            roots = set()
+            docs = list({other for key in item_keys for other in buckets.get(key, ())})
+            if docs:
+                similarities = (np.stack([candidates[other][1] for other in docs]) == signature).mean(axis=1)
+                for other, similarity in zip(docs, similarities.tolist()):
+                    if similarity >= self.threshold:
+                        roots.add(find(candidates[other][0]))
+            cluster = min(roots) if roots else doc
+            for root in roots:
+                if root != cluster:
+                    merged[root] = cluster
+
+            candidates[doc] = (cluster, signature)
+            rows.append([doc, item_id, cluster, pic, signature.tobytes()])
+            for key in item_keys:
+                members = buckets.setdefault(key, [])
+                if len(members) < MAX_BUCKET_SIZE:
+                    members.append(doc)
+                    if not isinstance(key, tuple):
+                        bucket_rows.append((key, doc))
+
+        for row in rows:
+            row[2] = find(row[2])
+        self.connection.executemany(
+            'INSERT INTO items (doc, item_id, cluster, pic, signature) VALUES (?, ?, ?, ?, ?)', rows
+        )
+        # 按键排序后插入,B树的写入集中在相邻的页上
+        bucket_rows.sort()
+        self.connection.executemany('INSERT OR IGNORE INTO buckets (key, doc) VALUES (?, ?)', bucket_rows)
+
+        # 已有的簇被合并时整体并入新代表,原代表变为重复商品,本批次内的簇在写入前已经合并
+        old_roots = [root for root in merged if root < first_doc]
+        self.connection.executemany('UPDATE items SET cluster = ? WHERE cluster = ?',
+                                    [(find(root), root) for root in old_roots])
+        roots = list({row[2] for row in rows} | set(old_roots))
+        root_ids = dict(self._select('SELECT doc, item_id FROM items WHERE doc IN ({})', roots))
+        demoted = {root_ids[root]: root_ids[find(root)] for root in old_roots}
+        self.connection.commit()
+
+        assigned = {row[1]: None if row[2] == row[0] else root_ids[row[2]] for row in rows}
+        duplicates = sum(duplicate is not None for duplicate in assigned.values())
+        logger.debug(f"Deduplicated {len(rows)} items: {duplicates} duplicates, {len(demoted)} merged clusters")
+        return assigned, demoted
+
+    def duplicates(self, item_ids: Sequence[Any]) -> set:
+        """返回 item_ids 中已被判定为重复的商品"""
+        with self._lock:
+            return {item_id for item_id, root in self._known(list(set(item_ids))).items() if root is not None}
+
+    def collapse(self, records: Sequence[Record]) -> List[Record]:
+        """去掉已被判定为重复的商品,每个簇只保留代表,未索引的商品原样保留
+
+        Args:
+            records: 商品字典或字段值元组
+
+        Returns:
+            过滤后的记录
+        """
+        item_ids = [self._values(record)[0] for record in records]
+        duplicates = self.duplicates([item_id for item_id in item_ids if item_id is not None])
+        return [record for record, item_id in zip(records, item_ids) if item_id not in duplicates]
+
+    def stats(self) -> Dict[str, int]:
+        """返回已索引商品数、重复商品数和包含重复商品的簇数"""
+        with self._lock:
+            items, duplicates, clusters = self.connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(cluster != doc), 0), COUNT(DISTINCT CASE WHEN cluster != doc '
+                'THEN cluster END) FROM items'
+            ).fetchone()
+        return {'items': items, 'duplicates': duplicates, 'clusters': clusters}
+
+    def largest_clusters(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """返回商品数最多的簇
+
+        Returns:
+            每个簇的 {'item_id': 代表, 'size': 商品数, 'members': 其余商品的item_id}
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                'SELECT cluster, COUNT(*) AS size FROM items GROUP BY cluster HAVING size > 1 '
+                'ORDER BY size DESC, cluster LIMIT ?', (limit,)
+            ).fetchall()
+            result = []
+            for cluster, size in rows:
+                members = [item_id for item_id, in self.connection.execute(
+                    'SELECT item_id FROM items WHERE cluster = ? ORDER BY doc', (cluster,)
+                )]
+                result.append({'item_id': members[0], 'size': size, 'members': members[1:]})
+        return result
+
+    def clear(self) -> None:
+        """清空索引,例如目标集合被删除之后"""
+        with self._lock:
+            self.connection.executescript('DELETE FROM items; DELETE FROM buckets;')
+            self.connection.commit()
+        logger.info(f"Cleared duplicate index {self.path}")
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,226 @@
+import os
+import typing
+import uuid
+from dataclasses import fields
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Sequence, Tuple, Union
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from loguru import logger
+from models.item import Item
+
+# 分区字段
+PARTITION_FIELDS = ('keyword', 'crawl_date')
+
+# Item字段类型到Arrow类型的映射
+ARROW_TYPES = {
+    str: pa.string(),
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    datetime: pa.timestamp('us')
+}
+
+# 过滤条件,例如 ('price', '<', 3000)
+Filter = Tuple[str, str, Any]
+
+
+def _unwrap_optional(annotation):
+    """Optional[X] -> X"""
+    if typing.get_origin(annotation) is Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def item_schema() -> pa.Schema:
+    """根据 Item 数据类生成Arrow表结构
+
+    extra_attributes 不写入列式存储;crawl_date 由 created_at 派生,用作分区字段。
+
+    Returns:
+        Arrow表结构
+    """
+    hints = typing.get_type_hints(Item)
+    schema_fields = []
+    for item_field in fields(Item):
+        arrow_type = ARROW_TYPES.get(_unwrap_optional(hints[item_field.name]))
+        if arrow_type is not None:
+            schema_fields.append(pa.field(item_field.name, arrow_type))
+    schema_fields.append(pa.field('crawl_date', pa.string()))
+    return pa.schema(schema_fields)
+
+
+ITEM_SCHEMA = item_schema()
+
+
+def _convert(value: Any, arrow_type: pa.DataType) -> Any:
+    """将商品字典中的值转换为列类型,无法转换时返回None"""
+    if value is None or value == '':
+        return None
+    try:
+        if arrow_type == pa.timestamp('us'):
+            return datetime.fromisoformat(value) if isinstance(value, str) else value
+        if arrow_type == pa.int64():
+            return int(value)
+        if arrow_type == pa.float64():
+            return float(value)
+        if arrow_type == pa.bool_():
+            # 原始数据中的布尔值可能是 'true'/'false'/'0' 等字符串
+            return value.strip().lower() in ('1', 'true', 'yes') if isinstance(value, str) else bool(value)
+        return str(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def items_to_table(items: Sequence[Dict[str, Any]], schema: pa.Schema = ITEM_SCHEMA) -> pa.Table:
+    """将 JsonProcessor.process_items 的输出转换为Arrow表
+
+    Args:
+        items: 商品字典列表
+        schema: 表结构
+
+    Returns:
+        Arrow表
+    """
+    columns = {}
+    for schema_field in schema:
+        if schema_field.name == 'crawl_date':
+            continue
+        columns[schema_field.name] = [_convert(item.get(schema_field.name), schema_field.type) for item in items]
+    columns['crawl_date'] = [
+        created_at.date().isoformat() if created_at is not None else None
+        for created_at in columns['created_at']
+    ]
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def build_filter(filters: Optional[Sequence[Filter]]) -> Optional[pc.Expression]:
+    """将 (字段, 操作符, 值) 列表转换为Arrow过滤表达式,各条件之间为AND关系
+
+    Args:
+        filters: 过滤条件列表,操作符支持 = != < <= > >= in
+
+    Returns:
+        过滤表达式,没有条件时返回None
+    """
+    expression = None
+    for name, op, value in filters or []:
+        column = pc.field(name)
+        if op in ('=', '=='):
+            condition = column == value
+        elif op == '!=':
+            condition = column != value
+        elif op == '<':
+            condition = column < value
+        elif op == '<=':
+            condition = column <= value
+        elif op == '>':
+            condition = column > value
+        elif op == '>=':
+            condition = column >= value
+        elif op == 'in':
+            condition = column.isin(list(value))
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+class ParquetStore:
+    """按关键词和抓取日期分区的Parquet列式存储"""
+
+    def __init__(self, root: str):
+        """初始化Parquet存储
+
+        Args:
+            root: 存储根目录
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.partitioning = ds.partitioning(
+            pa.schema([ITEM_SCHEMA.field(name) for name in PARTITION_FIELDS]),
+            flavor='hive'
+        )
+
+    def write(self, items: Iterable[Dict[str, Any]], batch_size: int = 100000) -> int:
+        """追加写入商品数据
+
+        每个批次写成每个分区下的一个新文件,因此可以直接接在流式导入之后分批调用。
+
+        Args:
+            items: 商品字典迭代器
+            batch_size: 每个批次的商品数
+
+        Returns:
+            写入的商品数量
+        """
+        written = 0
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                written += self._write_batch(batch)
+                batch = []
+        if batch:
+            written += self._write_batch(batch)
+
+        logger.info(f"Wrote {written} items to Parquet store {self.root}")
+        return written
+
+    def _write_batch(self, items: List[Dict[str, Any]]) -> int:
+        table = items_to_table(items)
+        ds.write_dataset(
+            table,
+            self.root,
+            format='parquet',
+            partitioning=self.partitioning,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        return table.num_rows
+
+    def dataset(self) -> ds.Dataset:
+        """打开数据集,只读取元数据,不加载数据"""
+        return ds.dataset(self.root, format='parquet', schema=ITEM_SCHEMA, partitioning=self.partitioning)
+
+    def iter_batches(self, columns: Optional[Sequence[str]] = None,
+                     filters: Optional[Sequence[Filter]] = None,
+                     batch_size: int = 100000) -> Iterator[pa.RecordBatch]:
+        """按批次读取数据,列和过滤条件下推到文件扫描
+
+        Args:
+            columns: 需要读取的列,为None时读取所有列
+            filters: 过滤条件,分区字段上的条件会跳过整个目录
+            batch_size: 每个批次的最大行数
+
+        Returns:
+            RecordBatch迭代器
+        """
+        scanner = self.dataset().scanner(
+            columns=list(columns) if columns else None,
+            filter=build_filter(filters),
+            batch_size=batch_size
+        )
+        return scanner.to_batches()
+
+    def read_frame(self, columns: Optional[Sequence[str]] = None,
+                   filters: Optional[Sequence[Filter]] = None) -> pd.DataFrame:
+        """读取数据为DataFrame
+
+        Args:
+            columns: 需要读取的列
+            filters: 过滤条件
+
+        Returns:
+            DataFrame
+        """
+        table = self.dataset().to_table(
+            columns=list(columns) if columns else None,
+            filter=build_filter(filters)
+        )
+        logger.info(f"Loaded {table.num_rows} rows from Parquet store {self.root}")
+        return table.to_pandas()
@@ -0,0 +1,276 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Sequence
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from loguru import logger
+from storage.parquet_store import Filter, build_filter
+
+# 价格观测记录的表结构,keyword 用作分区字段
+HISTORY_SCHEMA = pa.schema([
+    pa.field('item_id', pa.string()),
+    pa.field('ts', pa.timestamp('s')),
+    pa.field('price', pa.float64()),
+    pa.field('want_count', pa.int32()),
+    pa.field('keyword', pa.string())
+])
+
+# 每个关键词每天的价格汇总
+ROLLUP_SCHEMA = pa.schema([
+    pa.field('keyword', pa.string()),
+    pa.field('day', pa.date32()),
+    pa.field('min', pa.float64()),
+    pa.field('max', pa.float64()),
+    pa.field('median', pa.float64()),
+    pa.field('count', pa.int64())
+])
+
+# 每个行组的行数,行组内按 (item_id, ts) 排序,按商品查询时大部分行组可以根据统计信息跳过
+ROW_GROUP_SIZE = 64 * 1024
+
+
+def observations_table(items: Sequence[Dict[str, Any]]) -> pa.Table:
+    """从商品字典中提取价格观测
+
+    观测时间取商品的 created_at(即抓取时间),缺少或无法解析时取当前时间;
+    没有 item_id 或价格的商品被丢弃。
+
+    Args:
+        items: 商品字典列表
+
+    Returns:
+        按 (item_id, ts) 排序的Arrow表
+    """
+    now = datetime.now().replace(microsecond=0)
+    frame = pd.DataFrame({
+        'item_id': [item.get('item_id') for item in items],
+        'ts': pd.to_datetime([item.get('created_at') for item in items], errors='coerce'),
+        'price': pd.to_numeric(pd.Series([item.get('price') for item in items], dtype=object), errors='coerce'),
+        'want_count': pd.to_numeric(pd.Series([item.get('want_count') for item in items], dtype=object),
+                                    errors='coerce'),
+        'keyword': [item.get('keyword') for item in items]
+    })
+    frame = frame.dropna(subset=['item_id', 'price'])
+    frame['ts'] = frame['ts'].fillna(now).dt.floor('s')
+    frame['want_count'] = frame['want_count'].astype('Int32')
+    table = pa.Table.from_pandas(frame, schema=HISTORY_SCHEMA, preserve_index=False)
+    return table.sort_by([('item_id', 'ascending'), ('ts', 'ascending')])
+
+
+class PriceHistoryStore:
+    """追加写入的价格历史存储
+
+    观测记录 (item_id, ts, price, want_count) 按关键词分区写成Parquet文件,
+    每个文件内按 (item_id, ts) 排序;compact 把一个关键词下的小文件合并为一个有序文件。
+    每天每个关键词的最低价、最高价和中位数保存在 rollups.parquet 中,写入时只重新计算
+    被新观测影响的 (关键词, 日期),读取时不需要扫描观测记录。
+    """
+
+    def __init__(self, root: str):
+        """初始化价格历史存储
+
+        Args:
+            root: 存储根目录
+        """
+        self.root = root
+        self.observations_dir = os.path.join(root, 'observations')
+        self.rollup_file = os.path.join(root, 'rollups.parquet')
+        os.makedirs(self.observations_dir, exist_ok=True)
+        self.partitioning = ds.partitioning(pa.schema([HISTORY_SCHEMA.field('keyword')]), flavor='hive')
+
+    def dataset(self) -> ds.Dataset:
+        """打开观测数据集,只读取元数据"""
+        return ds.dataset(self.observations_dir, format='parquet', schema=HISTORY_SCHEMA,
+                          partitioning=self.partitioning)
+
+    def append(self, items: Sequence[Dict[str, Any]]) -> int:
+        """追加一批商品的价格观测并更新受影响的日汇总
+
+        Args:
+            items: 商品字典列表
+
+        Returns:
+            写入的观测数
+        """
+        table = observations_table(items)
+        if not table.num_rows:
+            return 0
+        ds.write_dataset(
+            table,
+            self.observations_dir,
+            format='parquet',
+            partitioning=self.partitioning,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+            max_rows_per_group=ROW_GROUP_SIZE
+        )
+        self._update_rollups(table)
+        logger.info(f"Appended {table.num_rows} price observations to {self.root}")
+        return table.num_rows
+
+    def read_frame(self, filters: Optional[Sequence[Filter]] = None,
+                   columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """读取观测记录
+
+        Args:
+            filters: 过滤条件,keyword 上的条件会跳过其他分区
+            columns: 需要读取的列
+
+        Returns:
+            DataFrame
+        """
+        table = self.dataset().to_table(
+            columns=list(columns) if columns else None,
+            filter=build_filter(filters)
+        )
+        return table.to_pandas()
+
+    @staticmethod
+    def _time_filters(start: Optional[datetime], end: Optional[datetime]) -> List[Filter]:
+        filters = []
+        if start is not None:
+            filters.append(('ts', '>=', pa.scalar(start, pa.timestamp('s'))))
+        if end is not None:
+            filters.append(('ts', '<', pa.scalar(end, pa.timestamp('s'))))
+        return filters
+
+    def item_history(self, item_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     keyword: Optional[str] = None) -> pd.DataFrame:
+        """查询单个商品在时间范围 [start, end) 内的观测
+
+        Args:
+            item_id: 商品ID
+            start: 起始时间
+            end: 结束时间
+            keyword: 已知商品所属关键词时传入,只扫描该分区
+
+        Returns:
+            按时间排序的观测
+        """
+        filters = [('item_id', '=', item_id)] + self._time_filters(start, end)
+        if keyword is not None:
+            filters.append(('keyword', '=', keyword))
+        return self.read_frame(filters).sort_values('ts', ignore_index=True)
+
+    def keyword_history(self, keyword: Optional[str], start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """查询一个关键词在时间范围 [start, end) 内的全部观测
+
+        Args:
+            keyword: 搜索关键词,为None时查询所有关键词
+            start: 起始时间
+            end: 结束时间
+            columns: 需要读取的列
+
+        Returns:
+            观测记录
+        """
+        filters = self._time_filters(start, end)
+        if keyword is not None:
+            filters.append(('keyword', '=', keyword))
+        return self.read_frame(filters, columns)
+
+    def daily_rollups(self, keyword: Optional[str] = None, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> pd.DataFrame:
+        """读取每天每个关键词的价格汇总
+
+        Args:
+            keyword: 只返回该关键词
+            start: 起始日期
+            end: 结束日期(不包含)
+
+        Returns:
+            包含 keyword、day、min、max、median、count 的DataFrame
+        """
+        if not os.path.exists(self.rollup_file):
+            return ROLLUP_SCHEMA.empty_table().to_pandas()
+        filters = []
+        if keyword is not None:
+            filters.append(('keyword', '=', keyword))
+        if start is not None:
+            filters.append(('day', '>=', pa.scalar(start.date() if isinstance(start, datetime) else start,
+                                                   pa.date32())))
+        if end is not None:
+            filters.append(('day', '<', pa.scalar(end.date() if isinstance(end, datetime) else end, pa.date32())))
+        table = pq.read_table(self.rollup_file, schema=ROLLUP_SCHEMA)
+        expression = build_filter(filters)
+        if expression is not None:
+            table = table.filter(expression)
+        return table.to_pandas()
+
+    def _update_rollups(self, table: pa.Table) -> None:
+        """重新计算新观测涉及的 (关键词, 日期) 的汇总"""
+        days = pc.cast(table['ts'], pa.date32())
+        touched = pa.table({'keyword': table['keyword'], 'day': days}).group_by(['keyword', 'day']).aggregate([])
+        touched_keys = set(zip(touched['keyword'].to_pylist(), touched['day'].to_pylist()))
+
+        frames = []
+        for keyword in {keyword for keyword, _ in touched_keys}:
+            keyword_days = sorted(day for name, day in touched_keys if name == keyword)
+            start = datetime.combine(keyword_days[0], datetime.min.time())
+            end = datetime.combine(keyword_days[-1], datetime.min.time()) + timedelta(days=1)
+            frame = self._read_for_rollup(keyword, start, end)
+            if frame.empty:
+                continue
+            frame['day'] = frame['ts'].dt.date
+            frame = frame[frame['day'].isin(keyword_days)]
+            grouped = frame.groupby('day')['price'].agg(['min', 'max', 'median', 'count']).reset_index()
+            grouped.insert(0, 'keyword', keyword)
+            frames.append(grouped)
+
+        existing = self.daily_rollups()
+        if not existing.empty:
+            stale = [(keyword, day) in touched_keys for keyword, day in zip(existing['keyword'], existing['day'])]
+            existing = existing[~pd.Series(stale, index=existing.index, dtype=bool)]
+        rollups = pd.concat([existing] + frames, ignore_index=True) if frames else existing
+        rollups = rollups.sort_values(['keyword', 'day'], ignore_index=True)
+
+        tmp_path = f"{self.rollup_file}.{uuid.uuid4().hex}.tmp"
+        pq.write_table(pa.Table.from_pandas(rollups, schema=ROLLUP_SCHEMA, preserve_index=False), tmp_path)
+        os.replace(tmp_path, self.rollup_file)
+
+    def _read_for_rollup(self, keyword: Optional[str], start: datetime, end: datetime) -> pd.DataFrame:
+        """读取一个关键词在 [start, end) 内的时间和价格"""
+        expression = build_filter(self._time_filters(start, end))
+        keyword_filter = pc.field('keyword').is_null() if keyword is None else pc.field('keyword') == keyword
+        table = self.dataset().to_table(columns=['ts', 'price'], filter=expression & keyword_filter)
+        return table.to_pandas()
+
+    def compact(self, min_files: int = 8) -> int:
+        """合并小文件
+
+        文件数不少于 min_files 的关键词分区被重写为一个按 (item_id, ts) 排序的文件,
+        之后按商品查询时可以根据行组统计信息跳过不相关的行组。
+
+        Args:
+            min_files: 分区中文件数达到该值时才合并
+
+        Returns:
+            合并的分区数
+        """
+        compacted = 0
+        for entry in os.scandir(self.observations_dir):
+            if not entry.is_dir():
+                continue
+            paths = sorted(
+                os.path.join(entry.path, name) for name in os.listdir(entry.path) if name.endswith('.parquet')
+            )
+            if len(paths) < min_files:
+                continue
+            table = ds.dataset(paths, format='parquet', schema=HISTORY_SCHEMA.remove(4)).to_table()
+            table = table.sort_by([('item_id', 'ascending'), ('ts', 'ascending')])
+            name = f"part-{uuid.uuid4().hex}-0.parquet"
+            path = os.path.join(entry.path, name)
+            # 以点开头的临时文件不会被数据集扫描到
+            tmp_path = os.path.join(entry.path, f".{name}.tmp")
+            pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE)
+            os.replace(tmp_path, path)
+            for old_path in paths:
+                os.remove(old_path)
+            compacted += 1
+            logger.info(f"Compacted {len(paths)} files with {table.num_rows} observations in {entry.path}")
+        return compacted
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable
+from loguru import logger
+
+# 计算代码指纹时包含的源码目录,即 src/
+SOURCE_ROOT = Path(__file__).resolve().parent.parent
+
+_code_fingerprint: Optional[str] = None
+
+
+def file_fingerprint(paths: Iterable[str], hash_contents: bool = False) -> List[List[Any]]:
+    """计算输入文件的指纹
+
+    默认只使用路径、大小和修改时间,不读取文件内容;hash_contents 为True时
+    额外计算内容的BLAKE2摘要,适合修改时间不可靠的场景(例如从归档中解压)。
+
+    Args:
+        paths: 文件路径
+        hash_contents: 是否对文件内容求摘要
+
+    Returns:
+        每个文件的 [路径, 大小, 修改时间(纳秒), 摘要或None],按路径排序
+    """
+    fingerprint = []
+    for path in sorted(os.path.abspath(path) for path in paths):
+        stat = os.stat(path)
+        digest = None
+        if hash_contents:
+            hasher = hashlib.blake2b(digest_size=16)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+        fingerprint.append([path, stat.st_size, stat.st_mtime_ns, digest])
+    return fingerprint
+
+
+def collection_fingerprint(collection) -> Dict[str, Any]:
+    """计算MongoDB集合的版本指纹
+
+    由集合的文档数和最新的 _id 组成,两者都可以从元数据或 _id 索引中直接得到。
+    新增和删除文档会改变指纹;其他程序对已有文档的原地修改无法被检测到。
+
+    Args:
+        collection: pymongo集合
+
+    Returns:
+        指纹字典
+    """
+    latest = list(collection.find({}, {'_id': 1}).sort('_id', -1).limit(1))
+    return {
+        'collection': collection.full_name,
+        'count': collection.estimated_document_count(),
+        'latest_id': str(latest[0]['_id']) if latest else None
+    }
+
+
+def code_fingerprint() -> str:
+    """计算 src/ 下所有Python源码的摘要,代码变化后缓存自动失效
+
+    Returns:
+        十六进制摘要,进程内只计算一次
+    """
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        hasher = hashlib.blake2b(digest_size=16)
+        for path in sorted(SOURCE_ROOT.rglob('*.py')):
+            hasher.update(str(path.relative_to(SOURCE_ROOT)).encode('utf-8'))
+            hasher.update(path.read_bytes())
+        _code_fingerprint = hasher.hexdigest()
+    return _code_fingerprint
+
+
+class ResultCache:
+    """以内容摘要为键的结果缓存
+
+    每个条目是 objects/<键的前两位>/<键> 下的一个文件,写入时先写临时文件再替换。
+    读取命中时更新文件的修改时间,evict() 按修改时间淘汰最久未使用的条目,
+    因此不需要额外的索引文件,多个进程共享同一个缓存目录也是安全的。
+    """
+
+    def __init__(self, root: str, max_bytes: int = 256 * 1024 * 1024, max_entries: int = 1000):
+        """初始化结果缓存
+
+        Args:
+            root: 缓存目录
+            max_bytes: 缓存总大小上限
+            max_entries: 条目数上限
+        """
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """由任意可JSON序列化的内容生成缓存键"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def _hit(self, path: str) -> bool:
+        """条目存在时更新其修改时间,用于LRU淘汰"""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """读取条目内容,未命中时返回None"""
+        path = self._path(key)
+        if not self._hit(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            # 在 utime 和 open 之间被其他进程淘汰
+            return None
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        """写入条目内容"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get_json(self, key: str) -> Optional[Any]:
+        """读取JSON条目,未命中时返回None"""
+        data = self.get_bytes(key)
+        return json.loads(data) if data is not None else None
+
+    def put_json(self, key: str, value: Any) -> None:
+        """写入JSON条目"""
+        self.put_bytes(key, json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+    def get_file(self, key: str, dest_path: str) -> bool:
+        """将条目复制到目标路径
+
+        Args:
+            key: 缓存键
+            dest_path: 目标文件路径
+
+        Returns:
+            是否命中
+        """
+        path = self._path(key)
+        if not self._hit(path):
+            return False
+        try:
+            shutil.copyfile(path, dest_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def put_file(self, key: str, src_path: str) -> None:
+        """将文件内容写入缓存"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+
+    def evict(self) -> int:
+        """淘汰最久未使用的条目,直到总大小和条目数都不超过上限
+
+        Returns:
+            淘汰的条目数
+        """
+        entries = []
+        for directory in os.scandir(self.objects_dir):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes and len(entries) - evicted <= self.max_entries:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+
+        if evicted:
+            logger.info(f"Evicted {evicted} cache entries from {self.root}")
+        return evicted
@@ -0,0 +1,476 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, chain, islice
+from typing import List, Dict, Any, Optional, Sequence, Iterable, Iterator, Union
+from loguru import logger
+from models.item import ITEM_FIELDS
+
+# 索引保存的商品字段
+SEARCH_FIELDS = ('item_id', 'title', 'price', 'location')
+
+# 每个倒排块最多包含的文档数,查询时按块的文档ID范围跳过不可能命中的块
+BLOCK_SIZE = 128
+
+# 从后往前遍历倒排列表时每次读取的块数
+FETCH_BLOCKS = 16
+
+# 满足价格和地区条件的文档不超过该数量时,先按条件取出文档ID,再检查是否包含各个词元
+FILTER_FIRST_THRESHOLD = 5000
+
+# 块内差值可用的定宽整数类型,按宽度从小到大排列
+_GAP_TYPECODES = ('B', 'H', 'I', 'Q')
+
+# 商品字典或按 ITEM_FIELDS 排列的字段值元组
+Record = Union[Dict[str, Any], tuple]
+
+# 单条SQL中的参数个数上限,旧版SQLite为999
+_MAX_VARIABLES = 900
+
+# 连续的汉字、字母或数字
+_RUN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z]+|[0-9]+')
+
+
+def _is_cjk(token: str) -> bool:
+    return token[0] >= '\u3400'
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """统一全角半角和大小写,并去掉空白,用于子串匹配"""
+    if not text:
+        return ''
+    return ''.join(unicodedata.normalize('NFKC', text).lower().split())
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """将标题切分为词元
+
+    连续的汉字按相邻二元组切分(单个汉字保留为一元组),字母和数字按类型切开,
+    例如 "iPhone13 256G 全新" 切分为 iphone、13、256、g、全新。
+
+    Args:
+        text: 标题
+
+    Returns:
+        按出现顺序排列的词元,可能重复
+    """
+    if not text:
+        return []
+    tokens = []
+    for match in _RUN_PATTERN.finditer(unicodedata.normalize('NFKC', text).lower()):
+        run = match.group()
+        if len(run) > 1 and _is_cjk(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def encode_postings(doc_ids: Sequence[int]) -> bytes:
+    """将递增的文档ID编码为相邻差值,第一个ID单独保存,不在编码结果中
+
+    每个块按最大差值选择1、2、4或8字节的定宽整数,首字节为对应的array类型码。
+    常见词元的差值通常小于256,每个ID只占一个字节;解码只需 array.frombytes 和
+    itertools.accumulate,不需要逐字节的Python循环。
+    """
+    gaps = [current - previous for previous, current in zip(doc_ids, doc_ids[1:])]
+    largest = max(gaps, default=0)
+    for typecode in _GAP_TYPECODES:
+        if largest < 1 << (8 * array(typecode).itemsize):
+            break
+    return typecode.encode() + array(typecode, gaps).tobytes()
+
+
+def decode_postings(first_doc: int, data: bytes) -> List[int]:
+    """encode_postings 的逆运算"""
+    gaps = array(chr(data[0]))
+    gaps.frombytes(data[1:])
+    return list(accumulate(gaps, initial=first_doc))
+
+
+class PostingList:
+    """一个词元的倒排列表
+
+    创建时只从 postings_headers 覆盖索引读取每块的文档ID范围,块的数据在第一次用到时
+    按位置批量读取并解码。
+    """
+
+    def __init__(self, connection: sqlite3.Connection, token: str):
+        self.connection = connection
+        self.token = token
+        headers = connection.execute(
+            'SELECT first_doc, last_doc, doc_count FROM postings INDEXED BY postings_headers '
+            'WHERE token = ? ORDER BY last_doc', (token,)
+        ).fetchall()
+        self.firsts = [header[0] for header in headers]
+        self.lasts = [header[1] for header in headers]
+        self.doc_count = sum(header[2] for header in headers)
+        self._decoded: Dict[int, List[int]] = {}
+        self._sets: Dict[int, set] = {}
+
+    def _load(self, positions: Sequence[int]) -> None:
+        """读取并解码指定位置上尚未解码的块"""
+        missing = [position for position in positions if position not in self._decoded]
+        if not missing:
+            return
+        if missing[-1] - missing[0] + 1 == len(missing):
+            rows = self.connection.execute(
+                'SELECT first_doc, data FROM postings WHERE token = ? AND first_doc BETWEEN ? AND ?',
+                (self.token, self.firsts[missing[0]], self.firsts[missing[-1]])
+            ).fetchall()
+        else:
+            rows = []
+            for start in range(0, len(missing), _MAX_VARIABLES):
+                firsts = [self.firsts[position] for position in missing[start:start + _MAX_VARIABLES]]
+                rows += self.connection.execute(
+                    f"SELECT first_doc, data FROM postings WHERE token = ? AND first_doc IN ({','.join('?' * len(firsts))})",
+                    [self.token] + firsts
+                ).fetchall()
+        for first_doc, data in rows:
+            self._decoded[bisect_right(self.firsts, first_doc) - 1] = decode_postings(first_doc, data)
+
+    def reversed_blocks(self) -> Iterator[List[int]]:
+        """从最后一块开始向前产出各块的文档ID,每次读取 FETCH_BLOCKS 块"""
+        for high in range(len(self.firsts), 0, -FETCH_BLOCKS):
+            low = max(0, high - FETCH_BLOCKS)
+            self._load(range(low, high))
+            for position in range(high - 1, low - 1, -1):
+                yield self._decoded[position]
+
+    def intersect(self, doc_ids: List[int]) -> List[int]:
+        """返回升序的 doc_ids 中同样出现在本列表中的ID,只读取范围与之重叠的块"""
+        if not self.firsts or not doc_ids:
+            return []
+        low = max(bisect_right(self.firsts, doc_ids[0]) - 1, 0)
+        high = bisect_right(self.firsts, doc_ids[-1])
+        if high - low <= len(doc_ids):
+            # 候选ID比块多:合并范围内的全部块,一次过滤
+            self._load(range(low, high))
+            members = set(chain.from_iterable(self._decoded[position] for position in range(low, high)))
+            return [doc_id for doc_id in doc_ids if doc_id in members]
+
+        # 候选ID稀疏:只读取包含候选ID的块
+        located = []
+        for doc_id in doc_ids:
+            position = bisect_right(self.firsts, doc_id) - 1
+            if position >= 0 and doc_id <= self.lasts[position]:
+                located.append((position, doc_id))
+        self._load(sorted({position for position, _ in located}))
+        result = []
+        for position, doc_id in located:
+            members = self._sets.get(position)
+            if members is None:
+                members = self._sets[position] = set(self._decoded[position])
+            if doc_id in members:
+                result.append(doc_id)
+        return result
+
+
+def _as_float(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None and value != '' else None
+    except (TypeError, ValueError):
+        return None
+
+
+class SearchIndex:
+    """基于SQLite的商品标题倒排索引
+
+    每个商品对应一个自增的文档ID,docs 表保存标题、价格和地区,价格和地区上有索引;
+    postings 表按词元保存文档ID列表,每个块最多 BLOCK_SIZE 个ID,相邻差值按块内最大
+    差值存为1、2、4或8字节的定宽 array(见 encode_postings),并记录块内的最小和最大
+    ID。新文档的ID总是最大,写入时只追加到每个词元的最后一块。
+
+    查询先取出文档数最少的词元的全部文档,再依次与其他词元求交集,其他词元只解码
+    与候选文档ID范围重叠的块;最后按价格、地区和标题子串在 docs 表中过滤,从最新的
+    文档开始取,满足 limit 后即停止。汉字二元组可能跨越原文中不相邻的位置,子串过滤
+    保证结果确实包含查询中的每个词。
+
+    标题变化的商品分配新的文档ID,旧ID记入 deleted 表,查询时自然被过滤,compact
+    时从倒排块中删除;只有价格或地区变化时原地更新。连接可以在多个线程中使用,
+    访问由锁串行化。
+    """
+
+    def __init__(self, path: str):
+        """打开或创建索引
+
+        Args:
+            path: SQLite文件路径
+        """
+        self.path = path
+        self._positions = [ITEM_FIELDS.index(name) for name in SEARCH_FIELDS]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(
+            'CREATE TABLE IF NOT EXISTS docs ('
+            'doc_id INTEGER PRIMARY KEY AUTOINCREMENT, item_id TEXT NOT NULL UNIQUE, title TEXT, '
+            'text TEXT NOT NULL, price REAL, location TEXT);'
+            'CREATE INDEX IF NOT EXISTS docs_price ON docs (price);'
+            'CREATE INDEX IF NOT EXISTS docs_location ON docs (location, price);'
+            'CREATE TABLE IF NOT EXISTS postings ('
+            'token TEXT NOT NULL, first_doc INTEGER NOT NULL, last_doc INTEGER NOT NULL, '
+            'doc_count INTEGER NOT NULL, data BLOB NOT NULL, PRIMARY KEY (token, first_doc)'
+            ') WITHOUT ROWID;'
+            'CREATE INDEX IF NOT EXISTS postings_headers ON postings (token, last_doc, doc_count);'
+            'CREATE TABLE IF NOT EXISTS deleted (doc_id INTEGER PRIMARY KEY);'
+        )
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+
+    def _values(self, record: Record) -> List[Any]:
+        """返回记录的 (item_id, title, price, location)"""
+        if isinstance(record, dict):
+            return [record.get(name) for name in SEARCH_FIELDS]
+        return [record[position] for position in self._positions]
+
+    def _existing(self, item_ids: List[str]) -> Dict[str, tuple]:
+        existing = {}
+        for start in range(0, len(item_ids), _MAX_VARIABLES):
+            chunk = item_ids[start:start + _MAX_VARIABLES]
+            placeholders = ','.join('?' * len(chunk))
+            for doc_id, item_id, title, price, location in self.connection.execute(
+                f'SELECT doc_id, item_id, title, price, location FROM docs WHERE item_id IN ({placeholders})', chunk
+            ):
+                existing[item_id] = (doc_id, title, price, location)
+        return existing
+
+    def _write_postings(self, token: str, doc_ids: List[int], replace_first: Optional[int] = None) -> None:
+        """按 BLOCK_SIZE 切块写入一个词元的文档ID,replace_first 为被合并的原有块"""
+        if replace_first is not None:
+            self.connection.execute('DELETE FROM postings WHERE token = ? AND first_doc = ?', (token, replace_first))
+        self.connection.executemany(
+            'INSERT INTO postings (token, first_doc, last_doc, doc_count, data) VALUES (?, ?, ?, ?, ?)',
+            [
+                (token, block[0], block[-1], len(block), encode_postings(block))
+                for block in (doc_ids[i:i + BLOCK_SIZE] for i in range(0, len(doc_ids), BLOCK_SIZE))
+            ]
+        )
+
+    def _append(self, postings: Dict[str, List[int]]) -> None:
+        """把新文档ID追加到各词元的最后一块,最后一块未满时与其合并"""
+        for token, doc_ids in postings.items():
+            last = self.connection.execute(
+                'SELECT first_doc, doc_count, data FROM postings WHERE token = ? ORDER BY first_doc DESC LIMIT 1',
+                (token,)
+            ).fetchone()
+            if last is not None and last[1] < BLOCK_SIZE:
+                self._write_postings(token, decode_postings(last[0], last[2]) + doc_ids, last[0])
+            else:
+                self._write_postings(token, doc_ids)
+
+    def update(self, records: Sequence[Record]) -> int:
+        """索引新商品,更新已变化的商品
+
+        没有 item_id 的记录被忽略;标题、价格和地区都没有变化的商品不做任何写入。
+
+        Args:
+            records: 商品字典或字段值元组
+
+        Returns:
+            新建索引的文档数,只更新价格或地区的商品不计入
+        """
+        latest = {}
+        for record in records:
+            values = self._values(record)
+            if values[0] is not None:
+                latest[str(values[0])] = values
+        if not latest:
+            return 0
+
+        with self._lock:
+            existing = self._existing(list(latest))
+            postings: Dict[str, List[int]] = {}
+            deleted = []
+            indexed = 0
+            for item_id, (_, title, price, location) in latest.items():
+                price = _as_float(price)
+                previous = existing.get(item_id)
+                if previous is not None and previous[1] == title:
+                    if previous[2:] != (price, location):
+                        self.connection.execute('UPDATE docs SET price = ?, location = ? WHERE doc_id = ?',
+                                                (price, location, previous[0]))
+                    continue
+                if previous is not None:
+                    self.connection.execute('DELETE FROM docs WHERE doc_id = ?', (previous[0],))
+                    deleted.append((previous[0],))
+                doc_id = self.connection.execute(
+                    'INSERT INTO docs (item_id, title, text, price, location) VALUES (?, ?, ?, ?, ?)',
+                    (item_id, title, normalize_text(title), price, location)
+                ).lastrowid
+                for token in set(tokenize(title)):
+                    postings.setdefault(token, []).append(doc_id)
+                indexed += 1
+            self.connection.executemany('INSERT OR IGNORE INTO deleted (doc_id) VALUES (?)', deleted)
+            self._append(postings)
+            self.connection.commit()
+        return indexed
+
+    @staticmethod
+    def _matches(lists: List[PostingList], candidates: Optional[List[int]] = None) -> Iterator[int]:
+        """按文档ID从大到小产出包含全部词元的文档
+
+        没有候选ID时从文档数最少的词元的最后一块开始逐块向前,每块与其他词元求交集,
+        调用方取够结果后即可停止迭代,不必解码全部倒排块。
+
+        Args:
+            lists: 按文档数升序排列的倒排列表
+            candidates: 升序的候选文档ID,例如满足价格和地区条件的文档
+        """
+        if candidates is None:
+            others, windows = lists[1:], lists[0].reversed_blocks()
+        else:
+            others, windows = lists, [candidates]
+        for window in windows:
+            for posting_list in others:
+                window = posting_list.intersect(window)
+                if not window:
+                    break
+            yield from reversed(window)
+
+    @staticmethod
+    def _filters(min_price: Optional[float], max_price: Optional[float],
+                 location: Optional[str]) -> tuple:
+        """价格和地区条件的SQL片段和参数"""
+        clauses, params = [], []
+        if min_price is not None:
+            clauses.append('price >= ?')
+            params.append(min_price)
+        if max_price is not None:
+            clauses.append('price <= ?')
+            params.append(max_price)
+        if location:
+            clauses.append('location = ?')
+            params.append(location)
+        return clauses, params
+
+    def search(self, query: str = '', min_price: Optional[float] = None, max_price: Optional[float] = None,
+               location: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """按标题关键词、价格区间和地区查询商品
+
+        查询按空白分为多个词,结果的标题必须包含每一个词(忽略大小写、全角半角和空白)。
+
+        Args:
+            query: 查询词,为空时只按价格和地区过滤
+            min_price: 最低价格
+            max_price: 最高价格
+            location: 地区,精确匹配
+            limit: 最多返回的商品数
+
+        Returns:
+            商品的 item_id、title、price、location,最近索引的商品在前
+        """
+        start = time.perf_counter()
+        terms = [term for term in (normalize_text(word) for word in query.split()) if term]
+        # 单个汉字没有对应的二元组,只用于子串过滤
+        tokens = {token for token in tokenize(query) if len(token) > 1 or not _is_cjk(token)}
+        filters, filter_params = self._filters(min_price, max_price, location)
+        clauses = filters + ['instr(text, ?) > 0'] * len(terms)
+        params = filter_params + terms
+        columns = 'SELECT doc_id, item_id, title, price, location FROM docs'
+
+        with self._lock:
+            if not tokens:
+                where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+                rows = self.connection.execute(f'{columns}{where} ORDER BY doc_id DESC LIMIT ?',
+                                               params + [limit]).fetchall()
+            else:
+                lists = sorted((PostingList(self.connection, token) for token in tokens),
+                               key=lambda posting_list: posting_list.doc_count)
+                candidates = None
+                if filters and lists[0].doc_count > FILTER_FIRST_THRESHOLD:
+                    matched = [row[0] for row in self.connection.execute(
+                        f"SELECT doc_id FROM docs WHERE {' AND '.join(filters)} LIMIT ?",
+                        filter_params + [FILTER_FIRST_THRESHOLD + 1]
+                    )]
+                    if len(matched) <= FILTER_FIRST_THRESHOLD:
+                        candidates = sorted(matched)
+                # 没有满足价格和地区条件的文档时结果为空,不必读取倒排列表
+                if lists[0].doc_count and candidates != []:
+                    matches = self._matches(lists, candidates)
+                else:
+                    matches = iter(())
+
+                # 分块到 docs 表中过滤,块的大小随剩余需要的结果数变化,取够 limit 即停止
+                rows = []
+                size = _MAX_VARIABLES - len(params) - 1
+                while len(rows) < limit:
+                    chunk = list(islice(matches, min(size, 2 * (limit - len(rows)) + 32)))
+                    if not chunk:
+                        break
+                    placeholders = ','.join('?' * len(chunk))
+                    where = ' AND '.join([f'doc_id IN ({placeholders})'] + clauses)
+                    # 候选ID已经很少,禁止SQLite改用价格或地区索引扫描
+                    rows.extend(self.connection.execute(
+                        f'{columns} NOT INDEXED WHERE {where} ORDER BY doc_id DESC LIMIT ?',
+                        chunk + params + [limit - len(rows)]
+                    ))
+
+        logger.debug(f"Search {query!r} returned {len(rows)} items in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return [
+            {'item_id': item_id, 'title': title, 'price': price, 'location': location}
+            for _, item_id, title, price, location in rows
+        ]
+
+    def compact(self) -> None:
+        """从倒排块中删除已失效的文档ID,并合并未满的块"""
+        with self._lock:
+            deleted = {row[0] for row in self.connection.execute('SELECT doc_id FROM deleted')}
+            tokens = [row[0] for row in self.connection.execute('SELECT DISTINCT token FROM postings')]
+            rewritten = 0
+            for token in tokens:
+                blocks = self.connection.execute(
+                    'SELECT first_doc, doc_count, data FROM postings WHERE token = ? ORDER BY first_doc', (token,)
+                ).fetchall()
+                total = sum(block[1] for block in blocks)
+                doc_ids = [
+                    doc_id for first_doc, _, data in blocks
+                    for doc_id in decode_postings(first_doc, data) if doc_id not in deleted
+                ]
+                if len(doc_ids) == total and len(blocks) == -(-total // BLOCK_SIZE):
+                    continue
+                self.connection.execute('DELETE FROM postings WHERE token = ?', (token,))
+                if doc_ids:
+                    self._write_postings(token, doc_ids)
+                rewritten += 1
+            self.connection.execute('DELETE FROM deleted')
+            self.connection.commit()
+        logger.info(f"Compacted search index {self.path}: rewrote {rewritten} posting lists, "
+                    f"dropped {len(deleted)} stale documents")
+
+    def rebuild(self, records: Iterable[Sequence[Record]]) -> int:
+        """清空索引后按批次重新索引全部商品
+
+        Args:
+            records: 商品字典或字段值元组的批次,例如 MongoDB.iter_batches 的结果
+
+        Returns:
+            索引的文档数
+        """
+        self.clear()
+        indexed = sum(self.update(batch) for batch in records)
+        logger.info(f"Rebuilt search index {self.path} with {indexed} items")
+        return indexed
+
+    def clear(self) -> None:
+        """清空索引,例如目标集合被删除之后"""
+        with self._lock:
+            self.connection.executescript('DELETE FROM docs; DELETE FROM postings; DELETE FROM deleted;')
+            self.connection.commit()
+        logger.info(f"Cleared search index {self.path}")
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
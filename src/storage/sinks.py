@@ -0,0 +1,112 @@
+import os
+from typing import Optional, TypeVar, TYPE_CHECKING
+from loguru import logger
+from database.mongodb import MongoDB
+from storage.change_index import ChangeIndex
+from storage.search_index import SearchIndex
+from config.settings import (
+    CHANGE_DETECTION,
+    CHANGE_INDEX_FILE,
+    PARQUET_EXPORT,
+    PARQUET_DIR,
+    PRICE_HISTORY,
+    PRICE_HISTORY_DIR,
+    SEARCH_INDEX,
+    SEARCH_INDEX_FILE,
+    DEDUP,
+    DEDUP_INDEX_FILE,
+    DEDUP_THRESHOLD,
+    ANALYSIS_MODE,
+    ANALYSIS_STATE_FILE
+)
+
+# 重复商品索引依赖 numpy,列式存储和价格历史依赖 pyarrow,增量统计依赖 pandas,都只在启用时导入
+if TYPE_CHECKING:
+    from analysis.incremental import IncrementalAnalyzer
+    from storage.dedup_index import DuplicateIndex
+    from storage.parquet_store import ParquetStore
+    from storage.price_history import PriceHistoryStore
+
+# 变化索引、搜索索引或重复商品索引
+Sidecar = TypeVar('Sidecar')
+
+
+def collection_is_empty(db: MongoDB) -> bool:
+    """目标集合是否为空,例如第一次运行或集合被删除重建之后"""
+    return not db.collection.estimated_document_count()
+
+
+def reset_if_collection_empty(db: MongoDB, sidecar: Sidecar) -> Sidecar:
+    """集合为空而旁路索引不为空时清空索引
+
+    变化索引、搜索索引和重复商品索引都由已写入集合的商品派生。集合被删除重建后,
+    索引中的商品已不存在:变化索引会让它们永远不再写入,搜索索引会查询到它们,
+    重复商品索引会把重新写入的商品判定为它们的重复。
+
+    Args:
+        db: MongoDB 实例
+        sidecar: 支持 len 和 clear 的索引
+
+    Returns:
+        传入的索引
+    """
+    if len(sidecar) and collection_is_empty(db):
+        sidecar.clear()
+    return sidecar
+
+
+def open_change_index(db: MongoDB) -> Optional[ChangeIndex]:
+    """按配置打开变化索引,未启用时返回None"""
+    if not CHANGE_DETECTION:
+        return None
+    return reset_if_collection_empty(db, ChangeIndex(CHANGE_INDEX_FILE))
+
+
+def open_search_index(db: MongoDB) -> Optional[SearchIndex]:
+    """按配置打开标题搜索索引,未启用时返回None"""
+    if not SEARCH_INDEX:
+        return None
+    return reset_if_collection_empty(db, SearchIndex(SEARCH_INDEX_FILE))
+
+
+def open_dedup_index(db: MongoDB) -> Optional['DuplicateIndex']:
+    """按配置打开重复商品索引,未启用时返回None"""
+    if not DEDUP:
+        return None
+    from storage.dedup_index import DuplicateIndex
+
+    return reset_if_collection_empty(db, DuplicateIndex(DEDUP_INDEX_FILE, DEDUP_THRESHOLD))
+
+
+def open_incremental(db: MongoDB) -> Optional['IncrementalAnalyzer']:
+    """ANALYSIS_MODE 为 incremental 时加载持久化的增量统计,否则返回None
+
+    集合为空时从空状态开始,否则重新写入的商品会被再计数一次。
+    """
+    if ANALYSIS_MODE != 'incremental':
+        return None
+    from analysis.incremental import IncrementalAnalyzer
+
+    if collection_is_empty(db):
+        if os.path.exists(ANALYSIS_STATE_FILE):
+            logger.info(f"Collection is empty, resetting incremental analysis state {ANALYSIS_STATE_FILE}")
+        return IncrementalAnalyzer()
+    return IncrementalAnalyzer.load(ANALYSIS_STATE_FILE)
+
+
+def open_price_history() -> Optional['PriceHistoryStore']:
+    """按配置打开价格历史存储,未启用时返回None"""
+    if not PRICE_HISTORY:
+        return None
+    from storage.price_history import PriceHistoryStore
+
+    return PriceHistoryStore(PRICE_HISTORY_DIR)
+
+
+def open_parquet_store() -> Optional['ParquetStore']:
+    """按配置打开Parquet存储,未启用时返回None"""
+    if not PARQUET_EXPORT:
+        return None
+    from storage.parquet_store import ParquetStore
+
+    return ParquetStore(PARQUET_DIR)
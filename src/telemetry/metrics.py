@@ -0,0 +1,357 @@
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, TypeVar
+from loguru import logger
+from data import codec
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块,不记录RSS
+    resource = None
+
+T = TypeVar('T')
+_MISSING = object()
+
+# Prometheus 指标名前缀
+METRIC_PREFIX = 'goofish'
+
+
+def max_rss_bytes() -> Optional[int]:
+    """进程启动以来的峰值RSS,无法获取时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位,macOS 以字节为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@dataclass
+class SpanRecord:
+    """一个阶段的累计指标,同名阶段多次执行时累加,峰值取最大"""
+    calls: int = 0
+    seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    items: int = 0
+    bytes: int = 0
+    round_trips: int = 0
+    errors: int = 0
+    peak_rss_bytes: int = 0
+    peak_traced_bytes: int = 0
+
+    @property
+    def items_per_second(self) -> Optional[float]:
+        return self.items / self.seconds if self.items and self.seconds else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), 'items_per_second': self.items_per_second}
+
+
+class MetricsRegistry:
+    """按阶段记录耗时、吞吐量和内存
+
+    span 以上下文管理器记录一次阶段执行的墙钟时间、CPU时间和结束时的进程峰值RSS,
+    add 为阶段累加商品数、读取字节数、MongoDB往返次数等计数,不计时。同名阶段的
+    指标累加,阶段名以点分隔表示所属组件,例如 'mongodb.insert'、'analysis.basic_statistics'。
+    阶段可以嵌套,也可以在多个线程中同时记录,CPU时间为整个进程的时间。
+
+    trace_memory 为True时用 tracemalloc 记录每个阶段内Python对象分配的峰值,嵌套阶段的峰值
+    同样计入外层阶段;profile_dir 不为空时,主线程中最外层的阶段用 cProfile 分析,结果保存为
+    profile_dir/<阶段名>-<编号>.prof,可以用 pstats 或 snakeviz 查看。两者都会明显拖慢程序。
+    """
+
+    def __init__(self, trace_memory: bool = False, profile_dir: Optional[str] = None):
+        """初始化指标记录器
+
+        Args:
+            trace_memory: 是否用 tracemalloc 记录每个阶段的内存分配峰值
+            profile_dir: cProfile 结果目录,为None时不做分析
+        """
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.records: Dict[str, SpanRecord] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def _record(self, name: str) -> SpanRecord:
+        record = self.records.get(name)
+        if record is None:
+            with self._lock:
+                record = self.records.setdefault(name, SpanRecord())
+        return record
+
+    def _stack(self) -> List[Dict[str, Any]]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def add(self, name: str, items: int = 0, bytes: int = 0, round_trips: int = 0, errors: int = 0,
+            seconds: float = 0.0, calls: int = 0) -> None:
+        """为阶段累加计数
+
+        Args:
+            name: 阶段名
+            items: 处理的商品数
+            bytes: 读取的字节数
+            round_trips: MongoDB往返次数
+            errors: 错误数
+            seconds: 在别处测得的耗时,例如MongoDB驱动报告的命令耗时
+            calls: 在别处完成的执行次数
+        """
+        record = self._record(name)
+        with self._lock:
+            record.calls += calls
+            record.items += items
+            record.bytes += bytes
+            record.round_trips += round_trips
+            record.errors += errors
+            record.seconds += seconds
+
+    @contextmanager
+    def span(self, name: str, items: int = 0) -> Iterator[SpanRecord]:
+        """记录一次阶段执行
+
+        阶段内抛出的异常计入 errors 并在最内层的阶段写一条带阶段名的错误日志,
+        异常继续向外抛出。
+
+        Args:
+            name: 阶段名
+            items: 本次处理的商品数,也可以在阶段内调用 add 累加
+
+        Returns:
+            该阶段的累计记录
+        """
+        record = self._record(name)
+        stack = self._stack()
+        frame = {'peak': 0}
+        if self.trace_memory:
+            # reset_peak 会清掉外层阶段已经达到的峰值,先保存到外层的栈帧中
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            frame['base'] = tracemalloc.get_traced_memory()[0]
+        profiler = None
+        if (self.profile_dir and not stack and threading.current_thread() is threading.main_thread()
+                and sys.getprofile() is None):
+            profiler = cProfile.Profile()
+        stack.append(frame)
+
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        except Exception as e:
+            with self._lock:
+                record.errors += 1
+            if not getattr(e, '_metrics_span', None):
+                e._metrics_span = name
+                logger.error(f"Stage {name} failed after {time.perf_counter() - start:.2f}s: {e}")
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            seconds = time.perf_counter() - start
+            cpu_seconds = time.process_time() - cpu_start
+            stack.pop()
+            peak_traced = 0
+            if self.trace_memory:
+                peak_traced = max(frame['peak'], tracemalloc.get_traced_memory()[1]) - frame['base']
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], frame['base'] + peak_traced)
+            peak_rss = max_rss_bytes() or 0
+            with self._lock:
+                record.calls += 1
+                record.seconds += seconds
+                record.cpu_seconds += cpu_seconds
+                record.items += items
+                record.peak_rss_bytes = max(record.peak_rss_bytes, peak_rss)
+                record.peak_traced_bytes = max(record.peak_traced_bytes, peak_traced)
+            if profiler is not None:
+                path = os.path.join(self.profile_dir, f"{name}-{uuid.uuid4().hex[:8]}.prof")
+                profiler.dump_stats(path)
+                logger.info(f"Saved profile of stage {name} to {path}")
+
+    def iterate(self, name: str, iterable: Iterable[T], sized: bool = False) -> Iterator[T]:
+        """迭代并把产出每个元素的耗时计入阶段,不包括调用方处理元素的时间
+
+        适合计时生成器,例如流式解析;不记录内存和cProfile。
+
+        Args:
+            name: 阶段名
+            iterable: 被计时的可迭代对象
+            sized: 元素本身是批次时为True,按 len(元素) 累加 items,否则每个元素计1
+
+        Returns:
+            原样产出元素的迭代器
+        """
+        record = self._record(name)
+        iterator = iter(iterable)
+        while True:
+            value = _MISSING
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                return
+            except Exception:
+                with self._lock:
+                    record.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    record.seconds += time.perf_counter() - start
+                    record.cpu_seconds += time.process_time() - cpu_start
+                    if value is not _MISSING:
+                        record.calls += 1
+                        record.items += len(value) if sized else 1
+            yield value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前所有阶段的指标"""
+        with self._lock:
+            stages = {name: record.to_dict() for name, record in self.records.items()}
+        return {
+            'timestamp': time.time(),
+            'pid': os.getpid(),
+            'max_rss_bytes': max_rss_bytes(),
+            'stages': stages
+        }
+
+    def to_prometheus(self) -> str:
+        """以Prometheus文本格式导出,阶段名作为 stage 标签"""
+        snapshot = self.snapshot()
+        metrics = (
+            ('stage_calls_total', 'calls', 'counter', 'Number of times the stage ran'),
+            ('stage_seconds_total', 'seconds', 'counter', 'Wall-clock seconds spent in the stage'),
+            ('stage_cpu_seconds_total', 'cpu_seconds', 'counter', 'Process CPU seconds spent in the stage'),
+            ('stage_items_total', 'items', 'counter', 'Items processed by the stage'),
+            ('stage_bytes_total', 'bytes', 'counter', 'Bytes read by the stage'),
+            ('stage_round_trips_total', 'round_trips', 'counter', 'MongoDB round trips made by the stage'),
+            ('stage_errors_total', 'errors', 'counter', 'Errors raised in the stage'),
+            ('stage_items_per_second', 'items_per_second', 'gauge', 'Items processed per wall-clock second'),
+            ('stage_peak_rss_bytes', 'peak_rss_bytes', 'gauge', 'Process peak RSS at the end of the stage'),
+            ('stage_peak_traced_bytes', 'peak_traced_bytes', 'gauge', 'Peak Python allocations within the stage'),
+        )
+        lines = []
+        for metric, field, kind, help_text in metrics:
+            name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, record in snapshot['stages'].items():
+                value = record[field]
+                if value is None:
+                    continue
+                label = stage.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{name}{{stage="{label}"}} {value}')
+        if snapshot['max_rss_bytes'] is not None:
+            name = f"{METRIC_PREFIX}_process_max_rss_bytes"
+            lines.append(f"# HELP {name} Process peak RSS")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {snapshot['max_rss_bytes']}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str) -> None:
+        """导出指标,后缀为 .prom 时使用Prometheus文本格式(可供node_exporter的textfile收集器读取),否则为JSON
+
+        Args:
+            path: 输出文件路径
+        """
+        if path.endswith('.prom'):
+            payload = self.to_prometheus().encode('utf-8')
+        else:
+            payload = codec.dumps(self.snapshot(), indent=True)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再替换,收集器不会读到写了一半的文件
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        logger.info(f"Exported metrics to {path}")
+
+    def summary(self) -> str:
+        """按耗时排序的阶段摘要,用于写日志"""
+        lines = []
+        for name, record in sorted(self.records.items(), key=lambda entry: -entry[1].seconds):
+            parts = [f"{record.seconds:.3f}s wall", f"{record.cpu_seconds:.3f}s CPU"]
+            if record.calls:
+                parts.insert(0, f"{record.calls} calls")
+            if record.items:
+                parts.append(f"{record.items} items")
+            if record.items_per_second:
+                parts.append(f"{record.items_per_second:.0f} items/s")
+            if record.bytes:
+                parts.append(f"{record.bytes / 1e6:.1f} MB read")
+            if record.round_trips:
+                parts.append(f"{record.round_trips} round trips")
+            if record.errors:
+                parts.append(f"{record.errors} errors")
+            lines.append(f"{name}: {', '.join(parts)}")
+        return '\n'.join(lines)
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry() -> MetricsRegistry:
+    """当前使用的指标记录器"""
+    return _registry
+
+
+def set_registry(registry: MetricsRegistry) -> MetricsRegistry:
+    """替换模块级函数 span/add/iterate 使用的指标记录器,返回之前的记录器"""
+    global _registry
+    previous, _registry = _registry, registry
+    return previous
+
+
+def span(name: str, items: int = 0):
+    """在当前指标记录器中记录一次阶段执行,见 MetricsRegistry.span"""
+    return _registry.span(name, items)
+
+
+def add(name: str, **amounts: Any) -> None:
+    """在当前指标记录器中为阶段累加计数,见 MetricsRegistry.add"""
+    _registry.add(name, **amounts)
+
+
+def iterate(name: str, iterable: Iterable[T], sized: bool = False) -> Iterator[T]:
+    """在当前指标记录器中计时迭代,见 MetricsRegistry.iterate"""
+    return _registry.iterate(name, iterable, sized)
+
+
+def failed_stage(error: BaseException) -> Optional[str]:
+    """异常最初抛出时所在的最内层阶段,不是在阶段内抛出时返回None"""
+    return getattr(error, '_metrics_span', None)
+
+
+def traced(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """把函数的每次调用记录为一个阶段的装饰器
+
+    Args:
+        name: 阶段名
+    """
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _registry.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
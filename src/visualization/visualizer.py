@@ -1,108 +1,340 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterable, Union, Tuple
 import os
-import matplotlib.pyplot as plt
+import time
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
 import seaborn as sns
 import pandas as pd
 from loguru import logger
 from matplotlib import font_manager
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from data.frame import build_frame, read_parquet_frame
+from storage.result_cache import code_fingerprint
+from telemetry import metrics
 
 
 class DataVisualizer:
-    def __init__(self, data: List[Dict[str, Any]], output_dir: str = "data/output"):
+    # 绘图用到的字段
+    COLUMNS = ('price', 'location', 'category_id')
+
+    def __init__(self, data: Optional[Union[pd.DataFrame, Iterable[Union[Dict[str, Any], tuple]]]] = None,
+                 output_dir: str = "data/output", summaries: Optional[Dict[str, Any]] = None):
         """初始化数据可视化器
         
         Args:
-            data: 要可视化的数据列表
+            data: 要可视化的DataFrame,或商品字典/字段值元组的列表或迭代器(只保留 COLUMNS 中的列),
+                只使用汇总数据绘图时可以为None
             output_dir: 输出目录
+            summaries: chart_summaries() 返回的汇总数据,存在对应图表的汇总时优先使用
         """
-        self.df = pd.DataFrame(data)
+        if data is None:
+            self.df = None
+        elif isinstance(data, pd.DataFrame):
+            self.df = build_frame(data, columns=None)
+        else:
+            self.df = build_frame(data, self.COLUMNS)
+        self.summaries = summaries or {}
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
         self._setup_plot_style()
         logger.info(f"Initialized visualizer, output directory: {output_dir}")
     
-    def _setup_plot_style(self):
-        """设置图表全局样式"""
-        plt.rcParams['font.sans-serif'] = ['Microsoft YaHei']
-        plt.rcParams['axes.unicode_minus'] = False
+    @classmethod
+    def from_mongo(cls, db, output_dir: str = "data/output", query: Optional[Dict[str, Any]] = None,
+                   batch_size: int = 10000) -> 'DataVisualizer':
+        """从MongoDB分批读取绘图所需的字段并创建可视化器
         
-    def _save_plot(self, filename: str, tight_layout: bool = True) -> str:
-        """保存图表到文件
+        Args:
+            db: MongoDB 实例
+            output_dir: 输出目录
+            query: 可选的过滤条件
+            batch_size: 每次网络往返读取的文档数
+            
+        Returns:
+            数据可视化器
+        """
+        return cls(build_frame(db.iter_frames(query, cls.COLUMNS, batch_size), cls.COLUMNS), output_dir)
+
+    @classmethod
+    def from_parquet(cls, root: str, output_dir: str = "data/output",
+                     filters: Optional[List[tuple]] = None) -> 'DataVisualizer':
+        """从Parquet存储读取绘图所需的列并创建可视化器
         
         Args:
-            filename: 文件名
-            tight_layout: 是否使用紧凑布局
+            root: Parquet存储根目录
+            output_dir: 输出目录
+            filters: 过滤条件,例如 [('keyword', '=', 'iphone')]
             
         Returns:
-            保存的文件路径
+            数据可视化器
         """
-        if tight_layout:
-            plt.tight_layout()
+        return cls(read_parquet_frame(root, cls.COLUMNS, filters), output_dir)
+
+    @classmethod
+    def from_analyzer(cls, analyzer, output_dir: str = "data/output") -> 'DataVisualizer':
+        """与 DataAnalyzer 共用同一个DataFrame创建可视化器,不复制数据
         
-        output_path = os.path.join(self.output_dir, filename)
-        plt.savefig(output_path)
-        plt.close()
+        Args:
+            analyzer: DataAnalyzer 实例
+            output_dir: 输出目录
+            
+        Returns:
+            数据可视化器
+        """
+        return cls(analyzer.df, output_dir)
+
+    @classmethod
+    def from_summaries(cls, summaries: Dict[str, Any], output_dir: str = "data/output") -> 'DataVisualizer':
+        """只用汇总数据创建可视化器,绘图代价与原始数据量无关
         
+        Args:
+            summaries: DataAnalyzer/MongoAnalyzer/IncrementalAnalyzer 的 chart_summaries() 结果,
+                或从 analysis_results.json 中读取的 chart_summaries
+            output_dir: 输出目录
+            
+        Returns:
+            数据可视化器
+        """
+        return cls(None, output_dir, summaries)
+
+    def _setup_plot_style(self):
+        """设置图表全局样式"""
+        setup_plot_style()
+
+    def _chart_data(self, name: str, summary: Any = None) -> Any:
+        """返回图表的输入:传入的汇总、已有的汇总或原始数据中需要的列,都没有时返回None"""
+        if summary is not None:
+            return summary
+        if name in self.summaries:
+            return self.summaries[name]
+        if self.df is not None:
+            return self.df[list(CHARTS[name][1])]
+        return None
+
+    def _render(self, name: str, summary: Any = None) -> Optional[str]:
+        """在当前进程中渲染一个图表并返回保存的文件路径"""
+        data = self._chart_data(name, summary)
+        if data is None:
+            logger.warning(f"No data or summary available for plot {name}")
+            return None
+        with metrics.span(f'visualization.{name}'):
+            output_path = render_chart(name, data, self.output_dir)
         logger.info(f"Plot saved to {output_path}")
         return output_path
 
-    def plot_price_distribution(self) -> str:
+    def plot_price_distribution(self, histogram: Optional[Dict[str, List[float]]] = None) -> Optional[str]:
         """绘制价格分布图
         
+        Args:
+            histogram: 预先分箱的 {'edges': 边界, 'counts': 计数},为None时使用已有的汇总或原始数据
+            
         Returns:
             保存的文件路径
         """
-        plt.figure(figsize=(12, 6))
-        sns.histplot(data=self.df, x='price', bins=30)
-        plt.title('商品价格分布')
-        plt.xlabel('价格')
-        plt.ylabel('数量')
-        
-        return self._save_plot('price_distribution.png')
+        return self._render('price_distribution', histogram)
 
-    def plot_location_distribution(self) -> str:
+    def plot_location_distribution(self, location_counts: Optional[Dict[str, int]] = None) -> Optional[str]:
         """绘制地理位置分布图
         
+        Args:
+            location_counts: 按数量降序排列的地区计数,只绘制前10个
+            
         Returns:
             保存的文件路径
         """
-        plt.figure(figsize=(12, 6))
-        location_counts = self.df['location'].value_counts().head(10)
-        location_counts.plot(kind='bar')
-        plt.title('Top 10 地区分布')
-        plt.xlabel('地区')
-        plt.ylabel('数量')
-        plt.xticks(rotation=45)
-        
-        return self._save_plot('location_distribution.png')
+        return self._render('location_distribution', location_counts)
 
-    def plot_category_distribution(self) -> str:
+    def plot_category_distribution(self, category_counts: Optional[Dict[str, int]] = None) -> Optional[str]:
         """绘制类别分布图
         
+        Args:
+            category_counts: 按数量降序排列的类别计数,只绘制前10个
+            
         Returns:
             保存的文件路径
         """
-        plt.figure(figsize=(12, 6))
-        category_counts = self.df['category_id'].value_counts().head(10)
-        category_counts.plot(kind='bar')
-        plt.title('Top 10 类别分布')
-        plt.xlabel('类别')
-        plt.ylabel('数量')
-        plt.xticks(rotation=45)
-        
-        return self._save_plot('category_distribution.png')
+        return self._render('category_distribution', category_counts)
 
-    def plot_price_by_location(self) -> str:
+    def plot_price_by_location(self, boxes: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
         """绘制各地区价格分布图
         
+        Args:
+            boxes: 各地区的箱线图统计,见 analysis.pushdown.box_summary
+            
         Returns:
             保存的文件路径
         """
-        plt.figure(figsize=(12, 6))
-        sns.boxplot(data=self.df, x='location', y='price')
-        plt.title('各地区价格分布')
-        plt.xlabel('地区')
-        plt.ylabel('价格')
-        plt.xticks(rotation=45)
+        return self._render('price_by_location', boxes)
+
+    @metrics.traced('visualization.render_all')
+    def render_all(self, charts: Optional[List[str]] = None, workers: Optional[int] = None,
+                   cache=None) -> Dict[str, Dict[str, Any]]:
+        """并行渲染多个图表
+        
+        每个图表在独立进程中用 Agg 后端渲染,有汇总数据时只传入汇总,否则只传入该图表
+        需要的列,总耗时接近最慢的单个图表。workers 为1时在当前进程中依次渲染。
+        没有输入数据的图表会被跳过。
+        
+        传入 cache 时,由汇总数据绘制的图表以 (图表名, 汇总, 代码指纹) 为键缓存,
+        汇总没有变化的图表直接从缓存复制,不再渲染。
+        
+        Args:
+            charts: 要渲染的图表名称,默认为全部图表
+            workers: 进程数,默认为待渲染图表数与CPU核数中的较小值
+            cache: 可选的 storage.result_cache.ResultCache
+            
+        Returns:
+            图表名称到 {'path': 文件路径, 'seconds': 渲染耗时, 'cached': 是否来自缓存,
+            'key': 缓存键} 的字典
+        """
+        start = time.perf_counter()
+        report = {}
+        tasks, keys = [], {}
+        for name in list(charts or CHARTS):
+            data = self._chart_data(name)
+            if data is None:
+                logger.warning(f"No data or summary available for plot {name}, skipping")
+                continue
+            if cache is not None and not isinstance(data, pd.DataFrame):
+                key = keys[name] = cache.key('chart', name, data, code_fingerprint())
+                output_path = os.path.join(self.output_dir, CHARTS[name][0])
+                if cache.get_file(key, output_path):
+                    report[name] = {'path': output_path, 'seconds': 0.0, 'cached': True, 'key': key}
+                    continue
+            tasks.append((name, data, self.output_dir))
+
+        if tasks:
+            workers = workers or min(len(tasks), os.cpu_count() or 1)
+            if workers == 1:
+                results = [_timed_render(*task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=setup_plot_style) as executor:
+                    results = list(executor.map(_timed_render, *zip(*tasks)))
+            for name, path, seconds in results:
+                # 工作进程中的渲染耗时计入主进程的指标
+                metrics.add(f'visualization.{name}', seconds=seconds, calls=1)
+                report[name] = {'path': path, 'seconds': seconds, 'cached': False, 'key': keys.get(name)}
+                if name in keys:
+                    cache.put_file(keys[name], path)
+
+        wall = time.perf_counter() - start
+        for name, entry in report.items():
+            if entry['cached']:
+                logger.info(f"Plot {name} unchanged, restored {entry['path']} from cache")
+            else:
+                logger.info(f"Plot {name} saved to {entry['path']} in {entry['seconds']:.2f}s")
+        logger.info(f"Rendered {len(tasks)} charts ({len(report) - len(tasks)} cached) in {wall:.2f}s")
+        return report
+
+
+def setup_plot_style():
+    """设置图表全局样式,只需在每个进程中调用一次"""
+    matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+
+
+def _new_axes():
+    """创建不依赖pyplot全局状态的Figure和Axes"""
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
+
+
+def draw_price_distribution(ax, data: Union[pd.DataFrame, Dict[str, List[float]]]) -> None:
+    """绘制价格分布直方图,data 为原始价格列或预先分箱的 {'edges', 'counts'}"""
+    if isinstance(data, pd.DataFrame):
+        sns.histplot(data=data, x='price', bins=30, ax=ax)
+    else:
+        edges = data['edges']
+        sns.histplot(x=edges[:-1], weights=data['counts'], bins=edges, ax=ax)
+    ax.set_title('商品价格分布')
+    ax.set_xlabel('价格')
+    ax.set_ylabel('数量')
+
+
+def _top_counts(data: Union[pd.DataFrame, Dict[str, int]], column: str, top_n: int = 10) -> pd.Series:
+    """原始列的取值计数或预先计算的计数中的前 top_n 个"""
+    if isinstance(data, pd.DataFrame):
+        counts = data[column].value_counts()
+        # category列的计数包含未出现的类别
+        return counts[counts > 0].head(top_n)
+    return pd.Series(data, dtype='int64').head(top_n)
+
+
+def draw_location_distribution(ax, data: Union[pd.DataFrame, Dict[str, int]]) -> None:
+    """绘制Top 10地区柱状图"""
+    location_counts = _top_counts(data, 'location')
+    location_counts.plot(kind='bar', ax=ax)
+    ax.set_title('Top 10 地区分布')
+    ax.set_xlabel('地区')
+    ax.set_ylabel('数量')
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+def draw_category_distribution(ax, data: Union[pd.DataFrame, Dict[str, int]]) -> None:
+    """绘制Top 10类别柱状图"""
+    category_counts = _top_counts(data, 'category_id')
+    category_counts.plot(kind='bar', ax=ax)
+    ax.set_title('Top 10 类别分布')
+    ax.set_xlabel('类别')
+    ax.set_ylabel('数量')
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+# Axes.bxp 接受的统计字段
+BOX_STAT_KEYS = ('label', 'whislo', 'q1', 'med', 'q3', 'whishi')
+
+
+def draw_price_by_location(ax, data: Union[pd.DataFrame, List[Dict[str, Any]]]) -> None:
+    """绘制各地区价格箱线图,data 为原始列或每个地区的箱线图统计"""
+    if isinstance(data, pd.DataFrame):
+        sns.boxplot(data=data, x='location', y='price', ax=ax)
+    else:
+        stats = [{key: box[key] for key in BOX_STAT_KEYS} for box in data]
+        ax.bxp(stats, showfliers=False, patch_artist=True,
+               boxprops={'facecolor': sns.color_palette()[0]},
+               medianprops={'color': 'black'})
+    ax.set_title('各地区价格分布')
+    ax.set_xlabel('地区')
+    ax.set_ylabel('价格')
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+# 图表名称 -> (文件名, 需要的列, 绘制函数),绘制函数同时接受原始列和 chart_summaries() 中同名的汇总
+CHARTS = {
+    'price_distribution': ('price_distribution.png', ('price',), draw_price_distribution),
+    'location_distribution': ('location_distribution.png', ('location',), draw_location_distribution),
+    'category_distribution': ('category_distribution.png', ('category_id',), draw_category_distribution),
+    'price_by_location': ('price_by_location.png', ('location', 'price'), draw_price_by_location),
+}
+
+
+def render_chart(name: str, data: Any, output_dir: str, tight_layout: bool = True) -> str:
+    """渲染一个图表并保存到文件
+    
+    Args:
+        name: CHARTS 中的图表名称
+        data: 图表需要的列或汇总数据
+        output_dir: 输出目录
+        tight_layout: 是否使用紧凑布局
         
-        return self._save_plot('price_by_location.png')
\ No newline at end of file
+    Returns:
+        保存的文件路径
+    """
+    filename, _, draw = CHARTS[name]
+    fig, ax = _new_axes()
+    draw(ax, data)
+    if tight_layout:
+        fig.tight_layout()
+
+    output_path = os.path.join(output_dir, filename)
+    fig.savefig(output_path)
+    return output_path
+
+
+def _timed_render(name: str, data: Any, output_dir: str) -> Tuple[str, str, float]:
+    """在工作进程中渲染图表并返回耗时"""
+    start = time.perf_counter()
+    output_path = render_chart(name, data, output_dir)
+    return name, output_path, time.perf_counter() - start
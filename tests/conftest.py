@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+# 与程序入口相同:项目根目录提供 config 包,src 提供其余模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def log_to_tmp(tmp_path_factory):
+    """日志和 ensure_directories 创建的目录都放在临时目录中,测试不在仓库中留下文件"""
+    from config import settings
+
+    root = tmp_path_factory.mktemp('run')
+    settings.LOGS_DIR = str(root / 'logs')
+    settings.RAW_DATA_DIR = str(root / 'raw')
+    settings.OUTPUT_DIR = str(root / 'output')
+    settings.LOG_CONFIG['handlers'][0]['sink'] = os.path.join(settings.LOGS_DIR, 'app.log')
@@ -0,0 +1,59 @@
+"""测试用的本地桩传输和响应构造"""
+from typing import List, Dict, Any, Optional, Tuple
+from crawler.transport import SearchRequest, Transport, TransportError
+
+
+def search_page(keyword: str, item_ids: List[str], has_next: bool, price: float = 10.0) -> Dict[str, Any]:
+    """构造与 response.json 结构相同的搜索结果页"""
+    return {
+        'ret': ['SUCCESS::调用成功'],
+        'data': {
+            'resultInfo': {'sqiControlFields': {'userInputOriginalSearchKeywords': keyword}, 'hasNextPage': has_next},
+            'resultList': [
+                {'data': {'item': {'main': {
+                    'exContent': {
+                        'itemId': item_id,
+                        'title': f"{keyword} {item_id}",
+                        'price': [{'text': '¥'}, {'text': str(price)}],
+                        'area': '杭州'
+                    },
+                    'clickParam': {'args': {'id': item_id, 'keyword': keyword}}
+                }}}}
+                for item_id in item_ids
+            ]
+        }
+    }
+
+
+class StubTransport(Transport):
+    """按 (关键词, 页码) 返回预设响应的传输
+
+    Args:
+        pages: 关键词到每页商品ID列表的字典,最后一页的 hasNextPage 为假
+        failures: (关键词, 页码) 到连续失败次数的字典,失败次数用完之前抛出 TransportError
+        retryable: 失败是否可以重试
+        clock: 传入时每次请求使时钟前进 latency 秒
+        latency: 每次请求的耗时
+    """
+
+    def __init__(self, pages: Dict[str, List[List[str]]], failures: Optional[Dict[Tuple[str, int], int]] = None,
+                 retryable: bool = True, clock=None, latency: float = 0.0):
+        self.pages = pages
+        self.failures = dict(failures or {})
+        self.retryable = retryable
+        self.clock = clock
+        self.latency = latency
+        self.calls: List[Tuple[str, int]] = []
+
+    async def fetch(self, request: SearchRequest) -> Dict[str, Any]:
+        key = (request.keyword, request.page)
+        self.calls.append(key)
+        if self.clock is not None and self.latency:
+            await self.clock.sleep(self.latency)
+        if self.failures.get(key, 0) > 0:
+            self.failures[key] -= 1
+            raise TransportError(f"stub failure for {request}", self.retryable)
+        pages = self.pages.get(request.keyword, [])
+        if request.page > len(pages):
+            return search_page(request.keyword, [], False)
+        return search_page(request.keyword, pages[request.page - 1], request.page < len(pages))
@@ -0,0 +1,65 @@
+from models.item import ITEM_FIELDS
+from storage.change_index import ChangeIndex
+
+
+def item(item_id, price=10.0, title='商品', want_count='1人想要', search_id='s1'):
+    return {'item_id': item_id, 'price': price, 'title': title, 'want_count': want_count,
+            'location': '杭州', 'search_id': search_id}
+
+
+def as_row(record):
+    return tuple(record.get(field) for field in ITEM_FIELDS)
+
+
+def test_split_and_record_round_trip(tmp_path):
+    index = ChangeIndex(str(tmp_path / 'change_index.sqlite'))
+    records = [item('1'), item('2'), item('3')]
+
+    new, changed = index.split(records)
+    assert (new, changed) == (records, [])
+    index.record(new)
+    assert len(index) == 3
+
+    assert index.split(records) == ([], [])
+
+    # 只有指纹字段变化才视为变化
+    updated = [item('1', price=9.0), item('2', search_id='s2'), item('3', title='新标题'), item('4')]
+    new, changed = index.split(updated)
+    assert [record['item_id'] for record in new] == ['4']
+    assert [record['item_id'] for record in changed] == ['1', '3']
+    index.close()
+
+
+def test_dicts_and_rows_share_fingerprints(tmp_path):
+    index = ChangeIndex(str(tmp_path / 'change_index.sqlite'))
+    index.record([item('1'), item('2')])
+
+    rows = [as_row(item('1')), as_row(item('2', price=1.0))]
+    new, changed = index.split(rows)
+    assert new == []
+    assert changed == [rows[1]]
+    index.close()
+
+
+def test_split_deduplicates_within_batch_and_keeps_records_without_id(tmp_path):
+    index = ChangeIndex(str(tmp_path / 'change_index.sqlite'))
+    records = [item('1'), item('1'), item(None), item(None)]
+
+    new, changed = index.split(records)
+    assert new == [records[0], records[2], records[3]]
+    assert changed == []
+    index.close()
+
+
+def test_record_persists_and_clear_resets(tmp_path):
+    path = str(tmp_path / 'change_index.sqlite')
+    index = ChangeIndex(path)
+    index.record([item('1'), item('2', price=5.0)])
+    index.close()
+
+    index = ChangeIndex(path)
+    assert index.split([item('1'), item('2', price=5.0)]) == ([], [])
+    index.clear()
+    assert len(index) == 0
+    assert index.split([item('1')]) == ([item('1')], [])
+    index.close()
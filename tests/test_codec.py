@@ -0,0 +1,113 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from data import codec
+from data.processor import JsonProcessor
+from stubs import search_page
+
+BACKENDS = [name for name, (_, available) in codec.BACKENDS.items() if available()]
+
+DOCUMENT = {
+    '标题': 'iPhone 13 全新 "国行"\n',
+    'price': 3999.5,
+    'count': 12,
+    'big': 2 ** 53 + 1,
+    'flags': [True, False, None],
+    'nested': {'empty': {}, 'list': [], 'emoji': '📱'}
+}
+
+
+@pytest.fixture(autouse=True)
+def restore_backend():
+    previous = codec._codec
+    yield
+    codec._codec = previous
+
+
+def document_with_extra_fields():
+    """搜索结果页,商品主体之外还有部分解码时会被丢弃的字段"""
+    page = search_page('iphone', ['1', '2', '3'], True)
+    page['api'] = 'mtop.taobao.idlemtopsearch.pc.search'
+    page['data']['resultInfo']['tracking'] = {'x': list(range(10))}
+    for item in page['data']['resultList']:
+        item['data']['item']['track'] = {'args': {'a': 1}}
+        item['trace'] = 'abc'
+    return page
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_round_trip(name):
+    json_codec = codec.get_codec(name)
+    data = json_codec.dumps(DOCUMENT)
+
+    assert isinstance(data, bytes)
+    assert '标题'.encode('utf-8') in data
+    assert json_codec.loads(data) == DOCUMENT
+    assert json_codec.loads(data.decode('utf-8')) == DOCUMENT
+    assert json_codec.loads(memoryview(data)) == DOCUMENT
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_backends_agree_with_standard_library(name):
+    json_codec, reference = codec.get_codec(name), codec.JsonCodec()
+
+    expected = reference.dumps(DOCUMENT, indent=True, sort_keys=True)
+    assert json_codec.dumps(DOCUMENT, indent=True, sort_keys=True) == expected
+    assert reference.loads(json_codec.dumps(DOCUMENT)) == json_codec.loads(reference.dumps(DOCUMENT))
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_numpy_and_datetime_values(name):
+    value = {'price': np.float64(1.5), 'count': np.int32(3), 'at': datetime(2026, 10, 1, 8, 30)}
+    assert codec.get_codec(name).loads(codec.get_codec(name).dumps(value)) == {
+        'price': 1.5, 'count': 3, 'at': '2026-10-01T08:30:00'
+    }
+    with pytest.raises(TypeError):
+        codec.get_codec(name).dumps({'value': object()})
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_invalid_json_raises_value_error(name):
+    for payload in (b'{"a": ', b'', b'not json'):
+        with pytest.raises(ValueError):
+            codec.get_codec(name).loads(payload)
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_lazy_decoding_extracts_the_same_items(name):
+    page = document_with_extra_fields()
+    payload = codec.JsonCodec().dumps(page)
+    lazy = codec.get_codec(name).loads_search_result(payload)
+
+    # 跳过每次解析都不同的 created_at 和 updated_at
+    assert [row[:5] + row[7:] for row in JsonProcessor.iter_rows(lazy)] == [
+        row[:5] + row[7:] for row in JsonProcessor.iter_rows(page)
+    ]
+    assert lazy['data']['resultInfo']['hasNextPage'] is True
+
+
+def test_simdjson_keeps_only_item_paths():
+    pytest.importorskip('simdjson')
+    page = document_with_extra_fields()
+    lazy = codec.get_codec('simdjson').loads_search_result(codec.JsonCodec().dumps(page))
+
+    assert 'api' not in lazy
+    assert 'tracking' not in lazy['data']['resultInfo']
+    main = page['data']['resultList'][0]['data']['item']['main']
+    assert lazy['data']['resultList'][0] == {'data': {'item': {'main': main}}}
+    # 不是搜索结果结构的文档完整返回
+    assert codec.get_codec('simdjson').loads_search_result(b'{"ret": ["FAIL"]}') == {'ret': ['FAIL']}
+
+
+def test_backend_selection():
+    with pytest.raises(ValueError, match='Unknown JSON backend'):
+        codec.get_codec('ujson')
+    assert codec.get_codec('json').name == 'json'
+    assert codec.get_codec('auto').name == BACKENDS[0]
+    if 'simdjson' not in BACKENDS:
+        # 未安装的后端回退到 auto
+        assert codec.get_codec('simdjson').name == BACKENDS[0]
+
+    assert codec.set_backend('json') is codec.codec()
+    assert codec.dumps({'a': [1, 2]}) == b'{"a": [1, 2]}'
+    assert codec.loads(b'{"a": 1}') == {'a': 1}
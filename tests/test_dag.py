@@ -0,0 +1,187 @@
+import json
+import threading
+import mongomock
+import pytest
+import cli
+import main
+from database.mongodb import MongoDB
+from runner import stages
+from runner.dag import DONE, FAILED, PENDING, SKIPPED, DagRunner, RunState, Stage
+from runner.stages import BackfillStages
+from stubs import search_page
+
+
+class Recorder:
+    """记录阶段的运行顺序,fail 中的阶段抛出异常"""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, state, name):
+        with self._lock:
+            self.calls.append(name)
+        if name in self.fail:
+            raise RuntimeError(f"{name} failed")
+        return {'stage': name}
+
+
+def diamond(func, **overrides):
+    """ingest → store → {analyze, visualize}"""
+    funcs = {name: overrides.get(name, func) for name in ('ingest', 'store', 'analyze', 'visualize')}
+    return [
+        Stage('ingest', funcs['ingest']),
+        Stage('store', funcs['store'], ('ingest',)),
+        Stage('analyze', funcs['analyze'], ('store',)),
+        Stage('visualize', funcs['visualize'], ('store',))
+    ]
+
+
+@pytest.fixture
+def state_dir(tmp_path):
+    return str(tmp_path / 'run')
+
+
+def test_stages_run_in_dependency_order(state_dir):
+    recorder = Recorder()
+    state = RunState(state_dir, {'source': 'a'})
+    statuses = DagRunner(list(reversed(diamond(recorder))), state).run()
+
+    assert statuses == dict.fromkeys(('ingest', 'store', 'analyze', 'visualize'), DONE)
+    assert recorder.calls[:2] == ['ingest', 'store']
+    assert sorted(recorder.calls[2:]) == ['analyze', 'visualize']
+    assert state.output('store') == {'stage': 'store'}
+
+
+def test_independent_stages_run_concurrently(state_dir):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def meet(state, name):
+        # 两个阶段不同时运行时屏障超时,阶段失败
+        barrier.wait()
+
+    runner = DagRunner(diamond(Recorder(), analyze=meet, visualize=meet), RunState(state_dir, {}), workers=2)
+    assert set(runner.run().values()) == {DONE}
+
+
+def test_invalid_graphs_are_rejected(state_dir):
+    state = RunState(state_dir, {})
+    with pytest.raises(ValueError, match='unknown stages: missing'):
+        DagRunner([Stage('a', Recorder(), ('missing',))], state)
+    with pytest.raises(ValueError, match='cycle'):
+        DagRunner([Stage('a', Recorder(), ('b',)), Stage('b', Recorder(), ('a',))], state)
+
+
+def test_failure_skips_dependents_and_resume_runs_only_unfinished_stages(state_dir):
+    failing = Recorder(fail={'store'})
+    statuses = DagRunner(diamond(failing), RunState(state_dir, {'source': 'a'})).run()
+
+    assert statuses == {'ingest': DONE, 'store': FAILED, 'analyze': SKIPPED, 'visualize': SKIPPED}
+    saved = json.loads(open(f"{state_dir}/state.json", encoding='utf-8').read())
+    assert saved['stages']['store']['error'] == 'RuntimeError: store failed'
+
+    # 新进程从磁盘恢复,跳过已完成的 ingest
+    recorder = Recorder()
+    state = RunState(state_dir, {'source': 'a'})
+    assert state.run_id == saved['run_id']
+    assert set(DagRunner(diamond(recorder), state).run().values()) == {DONE}
+    assert sorted(recorder.calls) == ['analyze', 'store', 'visualize']
+
+
+def test_changed_config_or_restart_starts_a_new_run(state_dir):
+    DagRunner(diamond(Recorder()), RunState(state_dir, {'source': 'a'})).run()
+    run_id = RunState(state_dir, {'source': 'a'}).run_id
+
+    changed = RunState(state_dir, {'source': 'b'})
+    assert changed.run_id != run_id
+    assert changed.status('ingest') == PENDING
+    assert RunState(state_dir, {'source': 'b'}, restart=True).run_id != changed.run_id
+
+    with open(f"{state_dir}/state.json", 'w', encoding='utf-8') as f:
+        f.write('{broken')
+    assert RunState(state_dir, {'source': 'b'}).status('ingest') == PENDING
+
+
+def test_selected_stages_and_rerun(state_dir):
+    state = RunState(state_dir, {})
+    DagRunner(diamond(Recorder()), state).run()
+
+    recorder = Recorder()
+    # 未选中的依赖视为已满足,已完成的阶段只有在 rerun 中才重新运行
+    statuses = DagRunner(diamond(recorder), state).run(['analyze', 'visualize'], rerun=['visualize'])
+    assert statuses == {'analyze': DONE, 'visualize': DONE}
+    assert recorder.calls == ['visualize']
+
+    fresh = RunState(f"{state_dir}-fresh", {})
+    recorder = Recorder()
+    assert DagRunner(diamond(recorder), fresh).run(['visualize']) == {'visualize': DONE}
+    assert recorder.calls == ['visualize']
+
+
+def test_checkpoints_survive_restarts(state_dir):
+    state = RunState(state_dir, {})
+    state.save_checkpoint('store', parts=['part-00000.jsonl'], seen=2)
+    assert RunState(state_dir, {}).checkpoint('store') == {'parts': ['part-00000.jsonl'], 'seen': 2}
+
+    state.reset('store')
+    assert RunState(state_dir, {}).checkpoint('store') == {}
+
+
+@pytest.fixture
+def backfill(tmp_path, monkeypatch):
+    """三个原始文件的批量导入,写入 mongomock"""
+    raw = tmp_path / 'raw'
+    raw.mkdir()
+    for index in range(3):
+        page = search_page('iphone', [f"{index}-{i}" for i in range(3)], False, price=100.0 * (index + 1))
+        for item in page['data']['resultList']:
+            # 类别分布图需要类别
+            item['data']['item']['main']['clickParam']['args']['cCatId'] = str(index)
+        (raw / f"{index}.json").write_text(json.dumps(page), encoding='utf-8')
+    db = MongoDB('', 'goofish_data', 'search_results', client=mongomock.MongoClient())
+    db.close = lambda: None
+    monkeypatch.setattr(stages, 'connect_db', lambda: db)
+    monkeypatch.setattr(stages, 'OUTPUT_DIR', str(tmp_path / 'output'))
+    monkeypatch.setattr(main, 'OUTPUT_DIR', str(tmp_path / 'output'))
+    (tmp_path / 'output').mkdir()
+    return BackfillStages(str(raw), batch_size=4, parse_workers=1, parse_chunk_size=1, chart_workers=1), db
+
+
+def test_backfill_store_resumes_after_the_last_stored_file(backfill, state_dir, monkeypatch):
+    backfill, db = backfill
+    store_batch = main.store_batch
+    calls = []
+
+    def fail_on_second_file(*args, **kwargs):
+        calls.append(len(args[1]))
+        if len(calls) == 2:
+            raise ConnectionError('lost connection')
+        return store_batch(*args, **kwargs)
+
+    monkeypatch.setattr(stages, 'store_batch', fail_on_second_file)
+    statuses = DagRunner(backfill.stages(), RunState(state_dir, {})).run()
+    assert statuses == {'ingest': DONE, 'store': FAILED, 'analyze': SKIPPED, 'visualize': SKIPPED}
+    assert db.collection.count_documents({}) == 4
+
+    monkeypatch.setattr(stages, 'store_batch', store_batch)
+    state = RunState(state_dir, {})
+    assert state.checkpoint('store')['parts'] == ['part-00000.jsonl']
+    assert set(DagRunner(backfill.stages(), state).run().values()) == {DONE}
+
+    # 第一个文件没有重复写入
+    assert db.collection.count_documents({}) == 9
+    assert len(db.collection.distinct('item_id')) == 9
+    assert state.output('store') == {'seen': 9, 'stored': 9}
+    assert state.output('analyze')['basic_stats']['total_items'] == 9
+    path = BackfillStages.save_results(state)
+    results = json.loads(open(path, encoding='utf-8').read())
+    assert list(results) == ['basic_stats', 'price_distribution', 'location_analysis', 'chart_summaries']
+
+
+def test_cli_validates_stage_names(capsys):
+    args = cli.parse_args(['--stages', 'store, analyze', '--rerun', 'analyze'])
+    assert (args.stages, args.rerun) == (['store', 'analyze'], ['analyze'])
+    with pytest.raises(SystemExit):
+        cli.parse_args(['--stages', 'store,report'])
+    assert 'unknown stages: report' in capsys.readouterr().err
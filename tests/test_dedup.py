@@ -0,0 +1,96 @@
+import mongomock
+import pytest
+import main
+from database.mongodb import MongoDB
+from dedup import rebuild
+from storage.dedup_index import DuplicateIndex, normalize_pic
+
+TITLE = '苹果iPhone13 256G 全新未拆封 国行正品'
+
+
+def item(item_id, title=TITLE, seller_id='s1', pic_url=None, price=100.0):
+    return {'item_id': item_id, 'title': title, 'seller_id': seller_id, 'pic_url': pic_url, 'price': price,
+            'location': '杭州', 'keyword': 'iphone'}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DuplicateIndex(str(tmp_path / 'dedup_index.sqlite'))
+    yield index
+    index.close()
+
+
+def test_near_duplicate_from_same_seller_points_to_first_item(index):
+    duplicates, demoted = index.assign([item('1'), item('2', TITLE + ' 包邮'), item('3', TITLE + ' 急出')])
+
+    assert duplicates == [None, '1', '1']
+    assert demoted == {}
+    # 已索引的商品再次出现时返回已有结果
+    assert index.assign([item('2'), item('4', TITLE + '!')])[0] == ['1', '1']
+    assert index.largest_clusters() == [{'item_id': '1', 'size': 4, 'members': ['2', '3', '4']}]
+
+
+def test_same_main_picture_from_different_sellers_clusters(index):
+    records = [
+        item('1', seller_id='a', pic_url='https://img.alicdn.com/bao/uploaded/i1/abc.jpg'),
+        item('2', seller_id='b', pic_url='//img.alicdn.com/bao/uploaded/i1/abc.jpg_300x300.jpg_.webp')
+    ]
+    assert index.assign(records)[0] == [None, '1']
+
+
+def test_same_title_from_different_sellers_does_not_cluster(index):
+    records = [
+        item('1', seller_id='a', pic_url='https://img.alicdn.com/a.jpg'),
+        item('2', seller_id='b', pic_url='https://img.alicdn.com/b.jpg'),
+        item('3', seller_id='c')
+    ]
+    assert index.assign(records)[0] == [None, None, None]
+    assert index.stats() == {'items': 3, 'duplicates': 0, 'clusters': 0}
+
+
+def test_unrelated_titles_and_missing_ids_are_not_duplicates(index):
+    records = [item('1'), item('2', '华为Mate60 Pro 12+512 雅川青'), item(None), item('3', '')]
+    assert index.assign(records)[0] == [None, None, None, None]
+    assert len(index) == 2
+
+
+def test_item_linking_two_clusters_demotes_the_later_representative(index):
+    index.assign([item('1', seller_id='a', pic_url='x.com/1.jpg'), item('2', seller_id='b', pic_url='x.com/2.jpg')])
+
+    # 与商品1卖家相同,与商品2主图相同,两个簇合并到较早的簇
+    duplicates, demoted = index.assign([item('3', seller_id='a', pic_url='x.com/2.jpg')])
+    assert duplicates == ['1']
+    assert demoted == {'2': '1'}
+    assert index.duplicates(['1', '2', '3']) == {'2', '3'}
+    assert [record['item_id'] for record in index.collapse([item('1'), item('2'), item('4')])] == ['1', '4']
+
+
+def test_normalize_pic():
+    assert normalize_pic('https://img.alicdn.com/i1/abc.JPG_300x300.jpg?x=1') == 'img.alicdn.com/i1/abc.jpg'
+    assert normalize_pic(None) == ''
+
+
+def test_rebuild_writes_duplicate_of(index):
+    db = MongoDB('', 'goofish_data', 'search_results', client=mongomock.MongoClient())
+    db.insert_many([item('1'), item('2', TITLE + ' 包邮'), item('3', seller_id='s2')])
+
+    assert rebuild(index, db, batch_size=2) == 1
+    assert {doc['item_id']: doc.get('duplicate_of') for doc in db.collection.find()} == {'1': None, '2': '1', '3': None}
+    # 再次重建时 duplicate_of 没有变化,不更新任何文档
+    assert rebuild(index, db, batch_size=2) == 0
+
+
+@pytest.mark.parametrize('collapse, total', [(False, 3), (True, 2)])
+def test_dedup_collapse_drops_duplicates_before_analysis(tmp_path, monkeypatch, collapse, total):
+    monkeypatch.setattr(main, 'DEDUP_COLLAPSE', collapse)
+    db = MongoDB('', 'goofish_data', 'search_results', client=mongomock.MongoClient())
+    index = DuplicateIndex(str(tmp_path / 'dedup_index.sqlite'))
+
+    main.store_batch(db, [item('1', price=100.0), item('2', TITLE + ' 包邮', price=10.0), item('3', '华为手机 全新')],
+                     dedup_index=index)
+    assert db.collection.find_one({'item_id': '2'})['duplicate_of'] == '1'
+
+    stats = main.load_analyzer(db).basic_statistics()
+    assert stats['total_items'] == total
+    assert stats['price_stats']['min'] == (100.0 if collapse else 10.0)
+    index.close()
@@ -0,0 +1,174 @@
+import math
+import mongomock
+import numpy as np
+import pandas as pd
+import pytest
+import main
+from analysis.analyzer import DataAnalyzer
+from analysis.incremental import IncrementalAnalyzer, KLLSketch, LogHistogram, RunningMoments
+from database.mongodb import MongoDB
+
+# KLLSketch 说明中 k=200 的归一化秩误差界
+RANK_ERROR = 0.0165
+
+QUANTILES = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def prices(count, seed=0):
+    return np.round(np.random.default_rng(seed).lognormal(7, 1.2, count), 2)
+
+
+def items(values, offset=0):
+    locations = ['杭州', '上海', '北京', '广州']
+    return [
+        {'item_id': str(offset + i), 'price': float(price), 'location': locations[(offset + i) % 4],
+         'category_id': str((offset + i) % 7), 'keyword': 'iphone' if i % 3 else 'ipad'}
+        for i, price in enumerate(values)
+    ]
+
+
+def assert_rank_within_bound(data, values):
+    data = np.sort(data)
+    for q, value in zip(QUANTILES, values):
+        low = np.searchsorted(data, value, side='left') / len(data)
+        high = np.searchsorted(data, value, side='right') / len(data)
+        assert low - RANK_ERROR <= q <= high + RANK_ERROR, (q, low, high)
+
+
+def test_running_moments_merge_matches_pandas():
+    data = prices(10000)
+    merged = RunningMoments()
+    for batch in np.array_split(data, 7):
+        part = RunningMoments()
+        part.update(batch)
+        merged.merge(part)
+    series = pd.Series(data)
+
+    assert merged.count == len(data)
+    assert merged.mean == pytest.approx(series.mean())
+    assert merged.std == pytest.approx(series.std())
+    assert (merged.minimum, merged.maximum) == (series.min(), series.max())
+    assert math.isnan(RunningMoments().std)
+
+
+def test_kll_sketch_is_exact_before_compaction():
+    data = prices(150)
+    sketch = KLLSketch()
+    sketch.update(data.tolist())
+
+    assert sketch.quantiles(QUANTILES) == pytest.approx(pd.Series(data).quantile(QUANTILES).tolist())
+    assert math.isnan(KLLSketch().quantiles([0.5])[0])
+
+
+def test_merged_kll_sketches_stay_within_error_bound():
+    data = prices(200000, seed=1)
+    merged = KLLSketch(seed=0)
+    for seed, batch in enumerate(np.array_split(data, 20)):
+        part = KLLSketch(seed=seed)
+        for chunk in np.array_split(batch, 10):
+            part.update(chunk.tolist())
+        merged.merge(part)
+
+    assert merged.count == len(data)
+    assert sum(len(level) for level in merged.levels) < 2000
+    assert_rank_within_bound(data, merged.quantiles(QUANTILES))
+
+
+def test_log_histogram_merge_and_rebin():
+    data = prices(20000, seed=2)
+    whole, merged = LogHistogram(), LogHistogram()
+    whole.update(data)
+    for batch in np.array_split(data, 5):
+        part = LogHistogram()
+        part.update(batch)
+        merged.merge(part)
+
+    assert merged.counts.tolist() == whole.counts.tolist()
+    edges = np.linspace(data.min(), data.max(), 11).tolist()
+    counts = merged.rebin(edges)
+    exact, _ = np.histogram(data, edges)
+    # 每个区间的误差不超过其两端边界所在的固定分箱的计数
+    slack = 2 * merged.counts.max()
+    assert sum(counts) == pytest.approx(len(data), abs=slack)
+    assert all(abs(approx - count) <= slack for approx, count in zip(counts, exact))
+
+    with pytest.raises(ValueError):
+        merged.merge(LogHistogram(bins=10))
+
+
+def test_incremental_analyzer_matches_full_recompute():
+    records = items(prices(30000, seed=3))
+    incremental = IncrementalAnalyzer()
+    for start in range(0, len(records), 4000):
+        incremental.update(records[start:start + 4000])
+    full = DataAnalyzer(records)
+
+    basic, expected = incremental.basic_statistics(), full.basic_statistics()
+    assert basic['total_items'] == expected['total_items']
+    for name in ('mean', 'min', 'max', 'std'):
+        assert basic['price_stats'][name] == pytest.approx(expected['price_stats'][name])
+    assert basic['top_locations'] == expected['top_locations']
+    assert basic['keywords_summary'] == expected['keywords_summary']
+    assert incremental.location_analysis()['location_price_avg'] == pytest.approx(
+        full.location_analysis()['location_price_avg']
+    )
+    data = np.array([record['price'] for record in records])
+    percentiles = incremental.price_distribution()['percentiles']
+    for q, key in ((0.25, '25%'), (0.5, '50%'), (0.75, '75%')):
+        rank = np.searchsorted(np.sort(data), percentiles[key]) / len(data)
+        assert abs(rank - q) <= RANK_ERROR
+
+
+def test_save_load_merge_round_trip(tmp_path):
+    data = prices(30000, seed=4)
+    first, second = items(data[:12000]), items(data[12000:], offset=12000)
+    path = str(tmp_path / 'analysis_state.json')
+
+    saved = IncrementalAnalyzer()
+    saved.update(first)
+    saved.save(path)
+    restored = IncrementalAnalyzer.load(path)
+    assert restored.to_dict() == saved.to_dict()
+
+    shard = IncrementalAnalyzer()
+    shard.update(second)
+    restored.merge(shard)
+    whole = IncrementalAnalyzer()
+    whole.update(first + second)
+
+    merged, expected = restored.to_dict(), whole.to_dict()
+    for name in ('total_items', 'histogram', 'locations', 'categories', 'keywords', 'location_price_counts'):
+        assert merged[name] == expected[name]
+    assert restored.moments.mean == pytest.approx(whole.moments.mean)
+    assert restored.moments.std == pytest.approx(whole.moments.std)
+    assert restored.location_price_sums == pytest.approx(whole.location_price_sums)
+    assert_rank_within_bound(data, restored.sketch.quantiles(QUANTILES))
+    assert set(restored.location_sketches) == {'杭州', '上海', '北京', '广州'}
+    assert sum(sketch.count for sketch in restored.location_sketches.values()) == len(data)
+
+    assert IncrementalAnalyzer.load(str(tmp_path / 'missing.json')).total_items == 0
+
+
+def test_stale_state_is_persisted_merged_and_rebuilt(tmp_path, monkeypatch):
+    path = str(tmp_path / 'analysis_state.json')
+    monkeypatch.setattr(main, 'ANALYSIS_STATE_FILE', path)
+    db = MongoDB('', 'goofish_data', 'search_results', client=mongomock.MongoClient())
+    records = items([100.0, 200.0, 300.0])
+    db.insert_many([dict(record) for record in records])
+
+    incremental = IncrementalAnalyzer()
+    incremental.update(records)
+    incremental.invalidate()
+    incremental.save(path)
+    assert IncrementalAnalyzer.load(path).stale
+
+    fresh = IncrementalAnalyzer()
+    fresh.merge(IncrementalAnalyzer.load(path))
+    assert fresh.stale
+
+    # 集合中的价格已被修改,失效的状态在分析前从集合重新计算
+    db.collection.update_one({'item_id': '0'}, {'$set': {'price': 1000.0}})
+    analyzer = main.load_analyzer(db, IncrementalAnalyzer.load(path))
+    assert not analyzer.stale
+    assert analyzer.basic_statistics()['price_stats']['mean'] == pytest.approx(500.0)
+    assert not IncrementalAnalyzer.load(path).stale
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+import pytest
+from telemetry import metrics
+from telemetry.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    previous = metrics.set_registry(registry)
+    yield registry
+    metrics.set_registry(previous)
+
+
+def test_span_accumulates_per_stage(registry):
+    for _ in range(3):
+        with metrics.span('ingest', items=10):
+            metrics.add('ingest', bytes=100, round_trips=2)
+            time.sleep(0.01)
+
+    record = registry.records['ingest']
+    assert (record.calls, record.items, record.bytes, record.round_trips, record.errors) == (3, 30, 300, 6, 0)
+    assert record.seconds >= 0.03
+    assert record.items_per_second == pytest.approx(30 / record.seconds)
+
+
+def test_errors_are_counted_and_tagged_with_innermost_stage(registry):
+    with pytest.raises(ValueError) as info:
+        with metrics.span('outer'):
+            with metrics.span('inner'):
+                raise ValueError('bad')
+
+    assert metrics.failed_stage(info.value) == 'inner'
+    assert registry.records['inner'].errors == registry.records['outer'].errors == 1
+    assert registry.records['outer'].calls == 1
+    assert metrics.failed_stage(ValueError()) is None
+
+
+def test_iterate_times_only_the_producer(registry):
+    def produce():
+        for index in range(3):
+            time.sleep(0.01)
+            yield [index] * (index + 1)
+
+    batches = []
+    for batch in metrics.iterate('parse', produce(), sized=True):
+        time.sleep(0.05)
+        batches.append(batch)
+
+    record = registry.records['parse']
+    assert len(batches) == record.calls == 3
+    assert record.items == 6
+    assert 0.03 <= record.seconds < 0.15
+
+    def fail():
+        yield 1
+        raise RuntimeError('broken')
+
+    with pytest.raises(RuntimeError):
+        list(metrics.iterate('broken', fail()))
+    assert (registry.records['broken'].calls, registry.records['broken'].errors) == (1, 1)
+
+
+def test_traced_decorator_uses_current_registry(registry):
+    @metrics.traced('work')
+    def work(value):
+        return value * 2
+
+    assert work(2) == 4
+    assert registry.records['work'].calls == 1
+
+    other = MetricsRegistry()
+    previous = metrics.set_registry(other)
+    work(1)
+    metrics.set_registry(previous)
+    assert (registry.records['work'].calls, other.records['work'].calls) == (1, 1)
+
+
+def test_add_is_thread_safe(registry):
+    def worker():
+        for _ in range(1000):
+            metrics.add('shared', items=1)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.records['shared'].items == 8000
+
+
+def test_traced_memory_peaks_include_nested_stages():
+    registry = MetricsRegistry(trace_memory=True)
+    try:
+        with registry.span('outer'):
+            with registry.span('inner'):
+                data = bytearray(5 * 1024 * 1024)
+                del data
+            small = bytearray(1024)
+            del small
+    finally:
+        tracemalloc.stop()
+
+    assert registry.records['inner'].peak_traced_bytes >= 5 * 1024 * 1024
+    assert registry.records['outer'].peak_traced_bytes >= registry.records['inner'].peak_traced_bytes
+
+
+def test_profile_only_outermost_stage(tmp_path):
+    registry = MetricsRegistry(profile_dir=str(tmp_path / 'profiles'))
+    with registry.span('run'):
+        with registry.span('step'):
+            sum(range(1000))
+
+    assert [name.split('-')[0] for name in os.listdir(tmp_path / 'profiles')] == ['run']
+
+
+def test_export_json_and_prometheus(registry, tmp_path):
+    with metrics.span('mongodb.insert', items=5):
+        pass
+    metrics.add('stage "quoted"', errors=1)
+
+    registry.export(str(tmp_path / 'metrics.json'))
+    snapshot = json.loads((tmp_path / 'metrics.json').read_text(encoding='utf-8'))
+    assert snapshot['stages']['mongodb.insert']['items'] == 5
+    assert snapshot['stages']['stage "quoted"']['errors'] == 1
+
+    registry.export(str(tmp_path / 'out' / 'metrics.prom'))
+    text = (tmp_path / 'out' / 'metrics.prom').read_text(encoding='utf-8')
+    assert '# TYPE goofish_stage_items_total counter' in text
+    assert 'goofish_stage_items_total{stage="mongodb.insert"} 5' in text
+    assert 'goofish_stage_errors_total{stage="stage \\"quoted\\""} 1' in text
+    # 没有商品的阶段不导出吞吐量
+    assert 'goofish_stage_items_per_second{stage="stage \\"quoted\\""}' not in text
+    assert not [name for name in os.listdir(tmp_path / 'out') if name.endswith('.tmp')]
+
+
+def test_summary_is_sorted_by_time(registry):
+    metrics.add('fast', seconds=0.1, items=10)
+    metrics.add('slow', seconds=2.0, calls=1, errors=1)
+
+    assert registry.summary().splitlines() == [
+        'slow: 1 calls, 2.000s wall, 0.000s CPU, 1 errors',
+        'fast: 0.100s wall, 0.000s CPU, 10 items, 100 items/s'
+    ]
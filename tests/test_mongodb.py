@@ -0,0 +1,140 @@
+import mongomock
+import pytest
+from database.mongodb import MongoDB
+from telemetry import metrics
+from telemetry.metrics import MetricsRegistry
+
+
+def make_db() -> MongoDB:
+    db = MongoDB('', 'goofish_data', 'search_results', client=mongomock.MongoClient())
+    db.ensure_indexes()
+    return db
+
+
+def item(item_id: str, price: float = 10.0, stamp: str = '2024-01-01T00:00:00') -> dict:
+    return {'item_id': item_id, 'title': f"商品{item_id}", 'price': price, 'location': '杭州',
+            'created_at': stamp, 'updated_at': stamp}
+
+
+def test_upsert_counts_and_idempotence():
+    db = make_db()
+    items = [item('1'), item('2'), item('3')]
+
+    assert db.upsert_many(items) == {'inserted': 3, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+    assert db.upsert_many(items) == {'inserted': 0, 'updated': 0, 'unchanged': 3, 'skipped': 0}
+
+    changed = [item('1'), item('2', price=8.0), item('3'), item('4')]
+    assert db.upsert_many(changed) == {'inserted': 1, 'updated': 1, 'unchanged': 2, 'skipped': 0}
+    assert db.collection.count_documents({}) == 4
+    assert db.collection.find_one({'item_id': '2'})['price'] == 8.0
+
+
+def test_upsert_skips_missing_keys_and_keeps_last_duplicate_in_batch():
+    db = make_db()
+    counts = db.upsert_many([item('1', 5.0), {'title': '没有ID'}, item('1', 6.0)])
+
+    assert counts == {'inserted': 1, 'updated': 0, 'unchanged': 0, 'skipped': 1}
+    assert db.collection.find_one({'item_id': '1'})['price'] == 6.0
+
+
+def test_upsert_in_small_batches():
+    db = make_db()
+    items = [item(str(i)) for i in range(25)]
+
+    assert db.upsert_many(items, batch_size=4)['inserted'] == 25
+    assert db.upsert_many(items, batch_size=4)['unchanged'] == 25
+
+
+def test_upsert_touches_updated_at_only_on_content_change():
+    db = make_db()
+    db.upsert_many([item('1', stamp='2024-01-01T00:00:00')])
+
+    db.upsert_many([item('1', stamp='2024-01-02T00:00:00')])
+    doc = db.collection.find_one({'item_id': '1'})
+    assert doc['created_at'] == doc['updated_at'] == '2024-01-01T00:00:00'
+
+    db.upsert_many([item('1', price=9.0, stamp='2024-01-03T00:00:00')])
+    doc = db.collection.find_one({'item_id': '1'})
+    assert doc['created_at'] == '2024-01-01T00:00:00'
+    assert doc['updated_at'] == '2024-01-03T00:00:00'
+
+
+def test_upsert_reports_inserted_documents():
+    db = make_db()
+    db.upsert_many([item('1')])
+
+    inserted = []
+    db.upsert_many([item('1', price=3.0), item('2'), item('3')], batch_size=2, inserted=inserted)
+    assert [doc['item_id'] for doc in inserted] == ['2', '3']
+
+
+def test_ensure_indexes_with_existing_duplicates():
+    db = MongoDB('', 'goofish_data', 'search_results', client=mongomock.MongoClient())
+    db.insert_many([item('1', 1.0), item('1', 2.0), item('2')])
+
+    with pytest.raises(ValueError, match='UPSERT_REMOVE_DUPLICATES'):
+        db.ensure_indexes()
+
+    db.ensure_indexes(remove_duplicates=True)
+    assert db.collection.count_documents({}) == 2
+    # 保留最后插入的文档
+    assert db.collection.find_one({'item_id': '1'})['price'] == 2.0
+
+
+def test_set_fields():
+    db = make_db()
+    db.upsert_many([item('1'), item('2')])
+
+    assert db.set_fields({'1': {'duplicate_of': '2'}, '9': {'duplicate_of': '2'}}) == 1
+    assert db.collection.find_one({'item_id': '1'})['duplicate_of'] == '2'
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry()
+    previous = metrics.set_registry(registry)
+    yield registry
+    metrics.set_registry(previous)
+
+
+def test_touch_write_errors_are_reported_and_counted(registry):
+    db = make_db()
+    db.upsert_many([item('1', stamp='2024-01-01T00:00:00'), item('2', stamp='2024-01-02T00:00:00')])
+    # 人为制造 updated_at 冲突,使写入前的 updated_at 更新失败
+    db.collection.create_index('updated_at', unique=True)
+
+    counts = db.upsert_many([item('1', price=3.0, stamp='2024-01-02T00:00:00')])
+
+    assert counts['updated'] == 1
+    assert db.collection.find_one({'item_id': '1'})['price'] == 3.0
+    # 每个文档一次 updated_at 更新和一次upsert
+    assert registry.records['mongodb.touch'].items == 3
+    assert registry.records['mongodb.touch'].errors == 1
+    assert registry.records['mongodb.update'].items == 3
+    assert registry.records['mongodb.update'].errors == 0
+
+
+def test_iter_frames_reads_projected_batches(registry):
+    db = make_db()
+    db.insert_many([{**item(str(i), price=float(i)), 'keyword': 'iphone' if i % 2 else 'ipad'} for i in range(25)])
+
+    frames = list(db.iter_frames({'keyword': 'iphone'}, ['item_id', 'price'], batch_size=5))
+    assert [len(frame) for frame in frames] == [5, 5, 2]
+    assert all(list(frame.columns) == ['item_id', 'price'] for frame in frames)
+    assert registry.records['mongodb.find'].items == 12
+
+    frame = db.read_frame(fields=['price', 'location'], batch_size=10)
+    assert list(frame.columns) == ['price', 'location']
+    assert sorted(frame['price']) == [float(i) for i in range(25)]
+    assert list(db.read_frame({'keyword': 'mac'}, ['item_id', 'price']).columns) == ['item_id', 'price']
+
+    # 缺少字段的文档在对应列中为空值
+    db.insert_many([{'item_id': 'x', 'keyword': 'mac'}])
+    [batch] = db.iter_record_batches({'keyword': 'mac'}, ['item_id', 'price'])
+    assert batch.to_pydict() == {'item_id': ['x'], 'price': [None]}
+
+
+def test_build_query():
+    query = MongoDB.build_query('iphone', start_time=1000, end_time=2000, location='杭州')
+    assert query == {'keyword': 'iphone', 'location': '杭州', 'publish_time': {'$gte': 1000, '$lt': 2000}}
+    assert MongoDB.build_query() == {}
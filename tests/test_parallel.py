@@ -0,0 +1,80 @@
+import gzip
+import json
+import pytest
+from data.parallel import ParallelParser, ParseReport, parse_file
+from data.processor import JsonProcessor
+from stubs import search_page
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """12个文件:JSON、gzip压缩的JSON和JSON-lines,其中两个文件有错误"""
+    for index in range(10):
+        ids = [f"{index}-{i}" for i in range(3)]
+        page = search_page(f"k{index}", ids, False)
+        if index % 3 == 0:
+            with open(tmp_path / f"{index:02d}.jsonl", 'w', encoding='utf-8') as f:
+                f.write(json.dumps(page) + '\n\n' + json.dumps(search_page(f"k{index}", [f"{index}-x"], False)) + '\n')
+        elif index % 3 == 1:
+            with gzip.open(tmp_path / f"{index:02d}.json.gz", 'wt', encoding='utf-8') as f:
+                json.dump(page, f)
+        else:
+            (tmp_path / f"{index:02d}.json").write_text(json.dumps(page), encoding='utf-8')
+    (tmp_path / '10.json').write_text('{not json', encoding='utf-8')
+    (tmp_path / '11.jsonl').write_text(json.dumps(search_page('k11', ['11-0'], False)) + '\nbroken\n',
+                                       encoding='utf-8')
+    (tmp_path / 'notes.txt').write_text('ignored', encoding='utf-8')
+    return tmp_path
+
+
+def expected_ids(corpus):
+    return [item['item_id'] for item in JsonProcessor.stream_items(str(corpus))]
+
+
+@pytest.mark.parametrize('workers, chunk_size', [(1, 8), (2, 1), (3, 2), (4, 8)])
+def test_results_follow_file_order_for_any_worker_count(corpus, workers, chunk_size):
+    report = ParallelParser(workers, chunk_size).parse(str(corpus))
+
+    assert [item['item_id'] for item in report.items] == expected_ids(corpus)
+    assert report.files == 12
+    assert report.item_count == len(report.items) == 35
+
+
+def test_errors_are_collected_per_file(corpus):
+    report = ParallelParser(2, 2).parse(str(corpus))
+
+    assert sorted(report.errors) == [str(corpus / '10.json'), str(corpus / '11.jsonl')]
+    assert len(report.errors[str(corpus / '10.json')]) == 1
+    [line_error] = report.errors[str(corpus / '11.jsonl')]
+    assert line_error.startswith('Failed to parse line 2 of')
+    # 出错文件中可以解析的部分照常产出
+    assert '11-0' in [item['item_id'] for item in report.items]
+
+
+def test_parse_file_collects_errors_without_raising(tmp_path):
+    result = parse_file(str(tmp_path / 'missing.json'))
+    assert result.items == []
+    assert len(result.errors) == 1
+
+
+def test_iter_items_fills_worker_stats(corpus):
+    report = ParseReport()
+    items = list(ParallelParser(2, 3).iter_items(str(corpus), report))
+
+    assert [item['item_id'] for item in items] == expected_ids(corpus)
+    assert report.items == []
+    assert report.item_count == 35
+    assert report.files == sum(stats.files for stats in report.worker_stats.values()) == 12
+    assert sum(stats.items for stats in report.worker_stats.values()) == 35
+    assert 1 <= len(report.worker_stats) <= 2
+    assert len(report.errors) == 2
+
+
+def test_no_files(tmp_path):
+    report = ParallelParser(2).parse(str(tmp_path))
+    assert (report.files, report.items, report.errors) == (0, [], {})
+
+
+def test_chunk_size_must_be_positive():
+    with pytest.raises(ValueError):
+        ParallelParser(2, 0)
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+from crawler.pipeline import CrawlPipeline, backoff_delay
+from crawler.scheduler import CrawlScheduler, FakeClock
+from stubs import StubTransport
+
+
+class RecordingSleep:
+    """记录退避时间而不真正等待"""
+
+    def __init__(self):
+        self.delays = []
+
+    async def __call__(self, seconds: float) -> None:
+        self.delays.append(seconds)
+
+
+class Store:
+    """线程安全地收集写入的商品"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, items):
+        if self.fail:
+            raise RuntimeError('store failed')
+        with self._lock:
+            self.batches.append([item['item_id'] for item in items])
+
+    @property
+    def item_ids(self):
+        return sorted(item_id for batch in self.batches for item_id in batch)
+
+
+def run(pipeline: CrawlPipeline, *args, **kwargs):
+    return asyncio.run(pipeline.run(*args, **kwargs))
+
+
+def test_fetches_pages_until_has_next_is_false():
+    transport = StubTransport({'a': [['a1', 'a2'], ['a3'], ['a4']], 'b': [['b1']]})
+    store = Store()
+    pipeline = CrawlPipeline(transport, store, fetch_concurrency=2, store_batch_size=2, sleep=RecordingSleep())
+
+    stats = run(pipeline, ['a', 'b'])
+
+    assert stats.pages_fetched == 4
+    assert stats.items_parsed == stats.items_stored == 5
+    assert store.item_ids == ['a1', 'a2', 'a3', 'a4', 'b1']
+    # 同一关键词的各页依次抓取
+    assert [page for keyword, page in transport.calls if keyword == 'a'] == [1, 2, 3]
+
+
+def test_max_pages_limits_each_keyword():
+    transport = StubTransport({'a': [['a1'], ['a2'], ['a3']]})
+    pipeline = CrawlPipeline(transport, Store(), max_pages=2, sleep=RecordingSleep())
+
+    stats = run(pipeline, ['a'])
+
+    assert stats.pages_fetched == 2
+    assert transport.calls == [('a', 1), ('a', 2)]
+
+
+def test_retryable_errors_are_retried_with_backoff():
+    transport = StubTransport({'a': [['a1'], ['a2']]}, failures={('a', 1): 2})
+    sleep = RecordingSleep()
+    store = Store()
+    pipeline = CrawlPipeline(transport, store, max_retries=3, backoff_base=0.5, backoff_cap=30.0, sleep=sleep)
+
+    stats = run(pipeline, ['a'])
+
+    assert stats.retries == 2
+    assert stats.pages_failed == 0
+    assert transport.calls == [('a', 1), ('a', 1), ('a', 1), ('a', 2)]
+    assert len(sleep.delays) == 2
+    assert 0 <= sleep.delays[0] <= 0.5 and 0 <= sleep.delays[1] <= 1.0
+    assert store.item_ids == ['a1', 'a2']
+
+
+def test_gives_up_after_max_retries():
+    transport = StubTransport({'a': [['a1']]}, failures={('a', 1): 10})
+    pipeline = CrawlPipeline(transport, Store(), max_retries=2, sleep=RecordingSleep())
+
+    stats = run(pipeline, ['a'])
+
+    assert stats.pages_failed == 1
+    assert stats.retries == 2
+    assert len(transport.calls) == 3
+
+
+def test_non_retryable_errors_are_not_retried():
+    transport = StubTransport({'a': [['a1']]}, failures={('a', 1): 1}, retryable=False)
+    sleep = RecordingSleep()
+    pipeline = CrawlPipeline(transport, Store(), sleep=sleep)
+
+    stats = run(pipeline, ['a'])
+
+    assert stats.pages_failed == 1
+    assert stats.retries == 0
+    assert sleep.delays == []
+
+
+def test_store_errors_are_counted():
+    pipeline = CrawlPipeline(StubTransport({'a': [['a1', 'a2']]}), Store(fail=True), sleep=RecordingSleep())
+
+    stats = run(pipeline, ['a'])
+
+    assert stats.items_parsed == 2
+    assert stats.items_stored == 0
+    assert stats.items_failed == 2
+
+
+def test_small_queues_do_not_lose_pages():
+    pages = {f"k{k}": [[f"k{k}-{p}-{i}" for i in range(3)] for p in range(4)] for k in range(6)}
+    store = Store()
+    pipeline = CrawlPipeline(StubTransport(pages), store, fetch_concurrency=4, parse_concurrency=2,
+                             store_concurrency=2, queue_size=1, store_batch_size=5, sleep=RecordingSleep())
+
+    stats = run(pipeline, list(pages))
+
+    assert stats.pages_fetched == 24
+    assert store.item_ids == sorted(item_id for keyword in pages.values() for page in keyword for item_id in page)
+
+
+def test_scheduler_with_fake_clock_measures_latency():
+    clock = FakeClock(1000.0)
+    transport = StubTransport({'a': [['a1'], ['a2']]}, clock=clock, latency=0.25)
+    scheduler = CrawlScheduler(['a'], clock=clock, max_pages=5)
+    pipeline = CrawlPipeline(transport, Store(), sleep=clock.sleep)
+
+    stats = run(pipeline, scheduler=scheduler)
+
+    assert stats.pages_fetched == 2
+    assert clock.now() == 1000.5
+    # 本轮结束,第1页按变化程度延后到下一轮
+    [(not_before, _, request)] = scheduler.delayed
+    assert (request.keyword, request.page) == ('a', 1)
+    assert not_before == clock.now() + scheduler.interval('a')
+
+
+def test_backoff_delay_is_bounded():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base=0.5, cap=4.0) <= min(4.0, 0.5 * 2 ** attempt)
@@ -0,0 +1,119 @@
+import os
+from datetime import datetime
+import pandas as pd
+import pytest
+from analysis.analyzer import DataAnalyzer
+from storage.price_history import PriceHistoryStore, observations_table
+
+
+def observation(item_id, price, day, hour=12, keyword='iphone', want_count='3'):
+    return {'item_id': item_id, 'price': price, 'keyword': keyword, 'want_count': want_count,
+            'created_at': datetime(2026, 10, day, hour).isoformat()}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceHistoryStore(str(tmp_path / 'price_history'))
+
+
+@pytest.fixture
+def history(store):
+    """三天的观测:商品1持续降价,商品2先涨后跌,商品3只出现一次,商品4属于另一个关键词"""
+    store.append([observation('1', 1000.0, 1), observation('2', 500.0, 1), observation('4', 80.0, 1, keyword='ipad')])
+    store.append([observation('1', 900.0, 2), observation('2', 600.0, 2), observation('3', 50.0, 2)])
+    store.append([observation('1', 700.0, 3), observation('2', 570.0, 3), observation('4', 60.0, 3, keyword='ipad')])
+    return store
+
+
+def test_observations_table_drops_items_without_id_or_price():
+    table = observations_table([
+        observation('2', 10.0, 1), observation('1', '9.5', 1), observation(None, 1.0, 1),
+        observation('3', None, 1), {'item_id': '4', 'price': 1.0, 'created_at': 'not a time'}
+    ])
+
+    assert table['item_id'].to_pylist() == ['1', '2', '4']
+    assert table['price'].to_pylist() == [9.5, 10.0, 1.0]
+    # 无法解析的抓取时间取当前时间
+    assert table['ts'][2].as_py() > datetime(2026, 10, 2)
+
+
+def test_item_history_and_partitions(history):
+    frame = history.item_history('1')
+    assert frame['price'].tolist() == [1000.0, 900.0, 700.0]
+    assert frame['ts'].is_monotonic_increasing
+    window = history.item_history('1', start=datetime(2026, 10, 2), end=datetime(2026, 10, 3))
+    assert window['price'].tolist() == [900.0]
+    assert history.item_history('4', keyword='ipad')['price'].tolist() == [80.0, 60.0]
+    assert history.item_history('4', keyword='iphone').empty
+
+    assert sorted(os.listdir(history.observations_dir)) == ['keyword=ipad', 'keyword=iphone']
+    frame = history.read_frame([('price', '<', 100)], columns=['item_id', 'price'])
+    assert list(frame.columns) == ['item_id', 'price']
+    assert sorted(frame['item_id']) == ['3', '4', '4']
+
+
+def test_daily_rollups_match_observations(history):
+    rollups = history.daily_rollups()
+    observations = history.keyword_history(None)
+    observations['day'] = observations['ts'].dt.date
+    expected = observations.groupby(['keyword', 'day'])['price'].agg(['min', 'max', 'median', 'count']).reset_index()
+    expected['keyword'] = expected['keyword'].astype(str)
+
+    assert rollups[list(expected.columns)].to_dict('records') == expected.to_dict('records')
+    assert len(history.daily_rollups('ipad', start=datetime(2026, 10, 2))) == 1
+
+
+def test_late_observation_updates_only_its_day(history):
+    before = history.daily_rollups('iphone')
+    history.append([observation('5', 10.0, 2, hour=23)])
+    after = history.daily_rollups('iphone')
+
+    changed = after[after['day'] == pd.Timestamp(2026, 10, 2).date()].iloc[0]
+    assert (changed['min'], changed['count']) == (10.0, 4)
+    others = after[after['day'] != changed['day']].reset_index(drop=True)
+    assert others.equals(before[before['day'] != changed['day']].reset_index(drop=True))
+
+
+def test_compact_merges_small_files(history):
+    before = history.keyword_history('iphone').sort_values(['item_id', 'ts'], ignore_index=True)
+
+    assert history.compact(min_files=2) == 2
+    partition = os.path.join(history.observations_dir, 'keyword=iphone')
+    assert len(os.listdir(partition)) == 1
+    after = history.keyword_history('iphone')
+    # 合并后的文件按 (item_id, ts) 排序
+    assert after.equals(before)
+    assert history.compact(min_files=2) == 0
+
+
+def test_price_drops_from_store(history):
+    result = DataAnalyzer.from_price_history(history).price_drops(min_ratio=0.1)
+
+    assert (result['total_items'], result['dropped_items']) == (4, 2)
+    assert [(drop['item_id'], drop['keyword'], drop['peak_price'], drop['price']) for drop in result['drops']] == [
+        ('1', 'iphone', 1000.0, 700.0), ('4', 'ipad', 80.0, 60.0)
+    ]
+    assert result['drops'][0]['drop_ratio'] == pytest.approx(0.3)
+    assert result['drops'][0]['observed_at'] == '2026-10-03T12:00:00'
+
+    # 商品2从600降到570,降幅恰好为5%
+    assert DataAnalyzer.from_price_history(history, 'iphone').price_drops(min_ratio=0.05)['dropped_items'] == 2
+    limited = DataAnalyzer.from_price_history(history).price_drops(min_ratio=0.1, limit=1)
+    assert (limited['dropped_items'], len(limited['drops'])) == (2, 1)
+    since = DataAnalyzer.from_price_history(history).price_drops(since=datetime(2026, 10, 2))
+    assert [drop['item_id'] for drop in since['drops']] == ['1']
+
+
+def test_price_drops_does_not_depend_on_row_order(history):
+    frame = history.keyword_history(None)
+    analyzer = DataAnalyzer.from_price_history(history)
+    shuffled = frame.sample(frac=1, random_state=0).reset_index(drop=True)
+
+    assert analyzer.price_drops(shuffled) == analyzer.price_drops(frame)
+    assert analyzer.price_drops(frame.iloc[0:0])['error'] == 'No price history available'
+
+
+def test_empty_store(store):
+    assert store.append([{'item_id': None, 'price': None}]) == 0
+    assert store.daily_rollups().empty
+    assert store.keyword_history(None).empty
@@ -0,0 +1,177 @@
+import statistics
+import mongomock
+import numpy as np
+import pytest
+from pymongo.errors import OperationFailure
+from analysis.analyzer import DataAnalyzer, create_analyzer
+from analysis.pushdown import MongoAnalyzer, cut_edges, range_label
+from database.mongodb import MongoDB
+
+
+class ServerCollection:
+    """让 mongomock 集合的聚合行为与真实服务端一致,并按需让 $percentile 失败
+
+    $stdDevSamp 改写为 $push 后在客户端计算;没有输入文档时 {_id: None} 分组不返回结果
+    (mongomock 会返回一个累加值为空的文档);percentile_error 为None时 $percentile 由
+    mongomock 抛出 NotImplementedError。
+    """
+
+    def __init__(self, collection, percentile_error=None):
+        self.collection = collection
+        self.percentile_error = percentile_error
+        self.pipelines = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        if self.percentile_error is not None and '$percentile' in str(pipeline):
+            raise self.percentile_error
+        rewritten, samples = [], []
+        for stage in pipeline:
+            group = stage.get('$group')
+            if group:
+                if group['_id'] is None and not list(self.collection.aggregate(rewritten + [{'$limit': 1}])):
+                    return []
+                group = dict(group)
+                for name, spec in group.items():
+                    if isinstance(spec, dict) and '$stdDevSamp' in spec:
+                        group[name] = {'$push': spec['$stdDevSamp']}
+                        samples.append(name)
+                stage = {'$group': group}
+            rewritten.append(stage)
+        results = list(self.collection.aggregate(rewritten, **kwargs))
+        for doc in results:
+            for name in samples:
+                doc[name] = statistics.stdev(doc[name]) if len(doc[name]) > 1 else None
+        return results
+
+
+def records(count=600, seed=0, missing_price=False):
+    rng = np.random.default_rng(seed)
+    locations = ['杭州', '上海', '北京', '广州', '深圳', '成都', None]
+    result = []
+    for i in range(count):
+        price = None if missing_price and i % 23 == 0 else float(np.round(rng.lognormal(6, 1), 2))
+        result.append({
+            'item_id': str(i), 'price': price, 'location': locations[int(rng.integers(len(locations)))],
+            'category_id': str(i % 4), 'keyword': ['iphone', 'ipad', 'mac'][i % 3]
+        })
+    return result
+
+
+@pytest.fixture
+def data():
+    return records()
+
+
+@pytest.fixture
+def collection(data):
+    collection = mongomock.MongoClient().goofish_data.search_results
+    collection.insert_many([dict(record) for record in data])
+    return collection
+
+
+def assert_close(actual, expected):
+    """递归比较结果,数值允许浮点误差"""
+    if isinstance(expected, dict):
+        assert list(actual) == list(expected)
+        for key in expected:
+            assert_close(actual[key], expected[key])
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, nan_ok=True)
+    else:
+        assert actual == expected
+
+
+@pytest.mark.parametrize('percentile_error', [None, OperationFailure('$percentile is not allowed')])
+def test_pushdown_matches_pandas(data, collection, percentile_error):
+    server = ServerCollection(collection, percentile_error)
+    pushdown, pandas = MongoAnalyzer(server), DataAnalyzer(data)
+
+    assert_close(pushdown.basic_statistics(), pandas.basic_statistics())
+    assert_close(pushdown.price_distribution(), pandas.price_distribution())
+    assert_close(pushdown.location_analysis(), pandas.location_analysis())
+    assert_close(pushdown.chart_summaries()['category_distribution'], pandas.chart_summaries()['category_distribution'])
+    # 退化为精确分位数,只尝试一次 $percentile
+    assert not pushdown._percentile_supported
+    assert sum('$percentile' in str(pipeline) for pipeline in server.pipelines) == 1
+
+
+def test_chart_summaries_match_pandas(data, collection):
+    pushdown = MongoAnalyzer(ServerCollection(collection)).chart_summaries(bins=20, top_n=3, box_top_n=4)
+    pandas = DataAnalyzer(data).chart_summaries(bins=20, top_n=3, box_top_n=4)
+
+    assert pushdown['price_distribution']['edges'] == pytest.approx(pandas['price_distribution']['edges'])
+    assert pushdown['price_distribution']['counts'] == pandas['price_distribution']['counts']
+    assert pushdown['location_distribution'] == pandas['location_distribution']
+    assert pushdown['category_distribution'] == pandas['category_distribution']
+    # 只有五数概括时须线端点可能与真实数据点不同,四分位数和数量必须一致
+    for box, expected in zip(pushdown['price_by_location'], pandas['price_by_location']):
+        assert box['label'] == expected['label']
+        assert box['count'] == expected['count']
+        for key in ('q1', 'med', 'q3'):
+            assert box[key] == pytest.approx(expected[key])
+    assert len(pushdown['price_by_location']) == len(pandas['price_by_location']) == 4
+
+
+def test_supported_percentile_is_used_without_fallback(collection):
+    server = ServerCollection(collection)
+    # 模拟支持 $percentile 的服务端:返回固定的近似值
+    original = server.aggregate
+    server.aggregate = lambda pipeline, **kwargs: (
+        [{'_id': None, 'values': [1.0, 2.0, 3.0]}] if '$percentile' in str(pipeline) else original(pipeline, **kwargs)
+    )
+    analyzer = MongoAnalyzer(server)
+
+    assert analyzer.price_distribution()['percentiles'] == {'25%': 1.0, '50%': 2.0, '75%': 3.0}
+    assert analyzer._percentile_supported
+
+
+def test_items_without_price_count_in_total_only():
+    data = records(missing_price=True)
+    collection = mongomock.MongoClient().goofish_data.search_results
+    collection.insert_many([dict(record) for record in data])
+    pushdown, pandas = MongoAnalyzer(ServerCollection(collection)), DataAnalyzer(data)
+
+    stats = pushdown.basic_statistics()
+    assert stats['total_items'] == len(data)
+    assert_close(stats, pandas.basic_statistics())
+    assert_close(pushdown.location_analysis(), pandas.location_analysis())
+
+
+def test_query_restricts_all_statistics(data, collection):
+    query = {'keyword': 'ipad'}
+    pushdown = MongoAnalyzer(ServerCollection(collection), query)
+    pandas = DataAnalyzer([record for record in data if record['keyword'] == 'ipad'])
+
+    assert_close(pushdown.basic_statistics(), pandas.basic_statistics())
+    assert_close(pushdown.price_distribution(), pandas.price_distribution())
+
+
+def test_empty_collection():
+    analyzer = MongoAnalyzer(ServerCollection(mongomock.MongoClient().db.empty))
+    assert analyzer.basic_statistics() == {'error': 'No data available'}
+    assert analyzer.price_distribution() == {'error': 'No data available'}
+    assert analyzer.location_analysis() == {'error': 'No data available'}
+    assert analyzer.chart_summaries() == {}
+
+
+def test_cut_edges_and_labels_match_pandas():
+    import pandas as pd
+
+    for values in ([1.0, 2.5, 7.25, 100.0], [5.0, 5.0], [0.0, 0.0]):
+        intervals = pd.cut(pd.Series(values), bins=4).cat.categories
+        edges = cut_edges(min(values), max(values), 4)
+        assert [range_label(left, right) for left, right in zip(edges[:-1], edges[1:])] == [
+            f"{interval.left:.2f}-{interval.right:.2f}" for interval in intervals
+        ]
+
+
+def test_create_analyzer_switches_on_threshold(collection):
+    db = MongoDB('', 'goofish_data', 'search_results', client=collection.database.client)
+
+    assert isinstance(create_analyzer(db, pushdown_threshold=len(records())), DataAnalyzer)
+    assert isinstance(create_analyzer(db, pushdown_threshold=10), MongoAnalyzer)
+    assert isinstance(create_analyzer(db, pushdown_threshold=10, query={'keyword': 'none'}), DataAnalyzer)
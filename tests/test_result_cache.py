@@ -0,0 +1,150 @@
+import os
+import time
+import mongomock
+import pytest
+import main
+from analysis.analyzer import DataAnalyzer
+from storage.result_cache import ResultCache, collection_fingerprint, file_fingerprint
+from visualization.visualizer import CHARTS, DataVisualizer
+
+RECORDS = [
+    {'item_id': str(i), 'price': float(100 + i * 7 % 900), 'location': ['杭州', '上海', '北京'][i % 3],
+     'category_id': str(i % 4), 'keyword': 'iphone'}
+    for i in range(60)
+]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    path = tmp_path / 'output'
+    path.mkdir()
+    monkeypatch.setattr(main, 'OUTPUT_DIR', str(path))
+    monkeypatch.setattr(main, 'CHART_WORKERS', 1)
+    return path
+
+
+def test_get_and_put(cache, tmp_path):
+    assert cache.get_bytes('a' * 64) is None
+    cache.put_json('a' * 64, {'价格': 1})
+    assert cache.get_json('a' * 64) == {'价格': 1}
+
+    source = tmp_path / 'chart.png'
+    source.write_bytes(b'png')
+    cache.put_file('b' * 64, str(source))
+    assert cache.get_file('b' * 64, str(tmp_path / 'copy.png'))
+    assert (tmp_path / 'copy.png').read_bytes() == b'png'
+    assert not cache.get_file('c' * 64, str(tmp_path / 'missing.png'))
+
+    assert ResultCache.key('run', {'b': 1, 'a': 2}) == ResultCache.key('run', {'a': 2, 'b': 1})
+    assert ResultCache.key('run', 1) != ResultCache.key('run', 2)
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), max_entries=2)
+    for index, key in enumerate(('a' * 64, 'b' * 64, 'c' * 64)):
+        cache.put_bytes(key, b'x')
+        path = cache._path(key)
+        os.utime(path, ns=(index * 10 ** 9, index * 10 ** 9))
+    # 读取 a 使其成为最近使用的条目
+    assert cache.get_bytes('a' * 64) == b'x'
+
+    assert cache.evict() == 1
+    assert cache.get_bytes('b' * 64) is None
+    assert cache.get_bytes('a' * 64) == cache.get_bytes('c' * 64) == b'x'
+
+    small = ResultCache(str(tmp_path / 'cache'), max_bytes=1)
+    assert small.evict() == 1
+
+
+def test_file_fingerprint_detects_changes(tmp_path):
+    path = tmp_path / 'response.json'
+    path.write_text('{"a": 1}', encoding='utf-8')
+    stat = path.stat()
+    before = file_fingerprint([str(path)])
+    contents = file_fingerprint([str(path)], hash_contents=True)
+
+    # 大小和修改时间都不变的修改只有内容摘要能发现
+    path.write_text('{"a": 2}', encoding='utf-8')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert file_fingerprint([str(path)]) == before
+    assert file_fingerprint([str(path)], hash_contents=True) != contents
+
+    path.write_text('{"a": 22}', encoding='utf-8')
+    assert file_fingerprint([str(path)]) != before
+
+
+def test_collection_fingerprint_changes_on_insert():
+    collection = mongomock.MongoClient().goofish_data.search_results
+    empty = collection_fingerprint(collection)
+    assert empty['latest_id'] is None
+
+    collection.insert_one({'item_id': '1'})
+    first = collection_fingerprint(collection)
+    assert first != empty
+    assert collection_fingerprint(collection) == first
+
+
+def test_charts_render_in_parallel_and_hit_the_cache(cache, tmp_path):
+    summaries = DataAnalyzer(RECORDS).chart_summaries()
+    output = tmp_path / 'charts'
+    output.mkdir()
+
+    report = DataVisualizer.from_summaries(summaries, str(output)).render_all(workers=2, cache=cache)
+    assert set(report) == set(CHARTS)
+    assert sorted(os.listdir(output)) == sorted(filename for filename, _, _ in CHARTS.values())
+    assert not any(entry['cached'] for entry in report.values())
+
+    for path in output.iterdir():
+        path.unlink()
+    report = DataVisualizer.from_summaries(summaries, str(output)).render_all(workers=2, cache=cache)
+    assert all(entry['cached'] for entry in report.values())
+    assert sorted(os.listdir(output)) == sorted(filename for filename, _, _ in CHARTS.values())
+
+    # 只有汇总变化的图表重新渲染
+    summaries['category_distribution'] = {'1': 3}
+    report = DataVisualizer.from_summaries(summaries, str(output)).render_all(workers=2, cache=cache)
+    assert [name for name, entry in report.items() if not entry['cached']] == ['category_distribution']
+
+
+def test_run_is_restored_on_hit_and_recomputed_after_input_change(cache, tmp_path, output_dir):
+    raw = tmp_path / 'response.json'
+    raw.write_text('{}', encoding='utf-8')
+    key = main.run_key(cache, file_fingerprint([str(raw)]))
+    assert not main.restore_cached_run(cache, key)
+
+    main.analyze_and_visualize(DataAnalyzer(RECORDS), cache, key)
+    results = (output_dir / 'analysis_results.json').read_bytes()
+    charts = sorted(os.listdir(output_dir))
+    for path in output_dir.iterdir():
+        path.unlink()
+
+    assert main.run_key(cache, file_fingerprint([str(raw)])) == key
+    assert main.restore_cached_run(cache, key)
+    assert (output_dir / 'analysis_results.json').read_bytes() == results
+    assert sorted(os.listdir(output_dir)) == charts
+
+    # 输入文件变化后键不同,不再命中
+    time.sleep(0.01)
+    raw.write_text('{"changed": true}', encoding='utf-8')
+    assert main.run_key(cache, file_fingerprint([str(raw)])) != key
+    assert not main.restore_cached_run(cache, main.run_key(cache, file_fingerprint([str(raw)])))
+
+
+def test_evicted_chart_makes_the_run_a_miss(cache, output_dir):
+    key = main.run_key(cache, 'inputs')
+    main.analyze_and_visualize(DataAnalyzer(RECORDS), cache, key)
+    chart_key = cache.get_json(key)['charts']['price_distribution']['key']
+    os.remove(cache._path(chart_key))
+
+    assert not main.restore_cached_run(cache, key)
+
+
+def test_run_key_depends_on_config(cache, monkeypatch):
+    key = main.run_key(cache, 'inputs')
+    monkeypatch.setattr(main, 'DEDUP_COLLAPSE', not main.DEDUP_COLLAPSE)
+    assert main.run_key(cache, 'inputs') != key
@@ -0,0 +1,138 @@
+import asyncio
+import json
+from crawler.pipeline import CrawlPipeline
+from crawler.scheduler import AdaptiveConcurrency, CrawlScheduler, FakeClock, TokenBucket
+from stubs import StubTransport
+
+
+def items(*item_ids, price=10.0):
+    return [{'item_id': item_id, 'price': price} for item_id in item_ids]
+
+
+def queued(scheduler: CrawlScheduler):
+    """就绪和延迟任务的 (关键词, 页码)"""
+    return sorted((entry[-1].keyword, entry[-1].page) for entry in scheduler.ready + scheduler.delayed)
+
+
+def test_token_bucket_paces_requests():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=2, clock=clock)
+
+    async def acquire_all():
+        times = []
+        for _ in range(6):
+            await bucket.acquire()
+            times.append(clock.now())
+        return times
+
+    # 突发容量内立即返回,之后每0.5秒一个令牌
+    assert asyncio.run(acquire_all()) == [0.0, 0.0, 0.5, 1.0, 1.5, 2.0]
+
+
+def test_host_rate_limits_pipeline():
+    clock = FakeClock()
+    scheduler = CrawlScheduler(['a', 'b'], clock=clock, max_pages=3, host_rate=1.0, host_burst=1)
+    transport = StubTransport({'a': [['a1'], ['a2'], ['a3']], 'b': [['b1'], ['b2'], ['b3']]})
+    pipeline = CrawlPipeline(transport, lambda batch: None, fetch_concurrency=4, sleep=clock.sleep)
+
+    stats = asyncio.run(pipeline.run(scheduler=scheduler))
+
+    assert stats.pages_fetched == 6
+    # 6个请求,容量为1、每秒1个令牌,最后一个请求在第5秒发出
+    assert clock.now() == 5.0
+
+
+def test_higher_volatility_is_crawled_first_and_sooner():
+    clock = FakeClock()
+    scheduler = CrawlScheduler(clock=clock, min_interval=100, max_interval=1000)
+    scheduler.add_keyword('calm', 0.1)
+    scheduler.add_keyword('busy', 0.9)
+
+    async def first():
+        return await scheduler.next_job()
+
+    assert asyncio.run(first()).keyword == 'busy'
+    assert scheduler.interval('busy') < scheduler.interval('calm')
+
+
+def test_completed_round_is_rescheduled_after_interval():
+    clock = FakeClock()
+    scheduler = CrawlScheduler(['a'], clock=clock, min_interval=100, max_interval=100)
+
+    async def crawl_round():
+        request = await scheduler.next_job()
+        await scheduler.complete(request, items('a1'), has_next=False)
+        return await scheduler.next_job()
+
+    assert asyncio.run(crawl_round()) is None
+    assert queued(scheduler) == [('a', 1)]
+
+    clock.advance(100)
+    request = asyncio.run(scheduler.next_job())
+    assert (request.keyword, request.page) == ('a', 1)
+
+
+def test_volatility_follows_changes():
+    clock = FakeClock()
+    scheduler = CrawlScheduler(['a'], clock=clock, smoothing=0.5)
+    scheduler.keywords['a'].volatility = 0.5
+
+    async def crawl(page_items):
+        request = await scheduler.next_job(wait_for_delayed=True)
+        await scheduler.complete(request, page_items, has_next=False)
+
+    asyncio.run(crawl(items('1', '2')))
+    # 两个都是新商品:0.5 + 0.5 * (1 - 0.5)
+    assert scheduler.keywords['a'].volatility == 0.75
+    asyncio.run(crawl(items('1', '2')))
+    assert scheduler.keywords['a'].volatility == 0.375
+
+
+def test_save_and_load_restart_without_repeating_pages(tmp_path):
+    state_file = str(tmp_path / 'crawl_state.json')
+    clock = FakeClock()
+    scheduler = CrawlScheduler(['a', 'b'], state_file=state_file, clock=clock, max_pages=3)
+
+    async def first_page_of_a():
+        request = await scheduler.next_job()
+        while request.keyword != 'a':
+            # b 第1页开始抓取但没有完成,模拟中断
+            request = await scheduler.next_job()
+        await scheduler.complete(request, items('a1'), has_next=True)
+
+    asyncio.run(first_page_of_a())
+    scheduler.save()
+    saved = json.load(open(state_file, encoding='utf-8'))
+    assert sorted((job['keyword'], job['page']) for job in saved['jobs']) == [('a', 2), ('b', 1)]
+
+    # 重启后传入同样的关键词不会重复入队
+    restored = CrawlScheduler(['a', 'b'], state_file=state_file, clock=clock, max_pages=3)
+    assert queued(restored) == [('a', 2), ('b', 1)]
+    assert restored.keywords['a'].snapshot == {'a1': 10.0}
+
+    transport = StubTransport({'a': [['a1'], ['a2'], ['a3']], 'b': [['b1']]})
+    pipeline = CrawlPipeline(transport, lambda batch: None, sleep=clock.sleep)
+    asyncio.run(pipeline.run(scheduler=restored))
+
+    assert sorted(transport.calls) == [('a', 2), ('a', 3), ('b', 1)]
+    # 运行结束时保存状态,两个关键词都只剩下一轮的第1页
+    saved = json.load(open(state_file, encoding='utf-8'))
+    assert sorted((job['keyword'], job['page'], job['not_before'] is not None) for job in saved['jobs']) == [
+        ('a', 1, True), ('b', 1, True)
+    ]
+
+
+def test_adaptive_concurrency_halves_on_errors_and_grows_back():
+    concurrency = AdaptiveConcurrency(initial=8, minimum=1, maximum=8, latency_target=1.0, window=4)
+
+    async def requests(count, latency, error):
+        for _ in range(count):
+            await concurrency.acquire()
+            await concurrency.release(latency, error)
+
+    asyncio.run(requests(4, 0.1, True))
+    assert concurrency.limit == 4
+    asyncio.run(requests(4, 5.0, False))
+    assert concurrency.limit == 2
+    asyncio.run(requests(20, 0.1, False))
+    assert concurrency.limit > 4
@@ -0,0 +1,192 @@
+import copy
+import pytest
+from data.processor import JsonProcessor
+from data.schema import SCHEMA_V1, ExtractionSpec, FieldSpec, compile_spec, detect_schema
+from models.item import ITEM_FIELDS
+from stubs import search_page
+
+
+def reference_row(item, keyword, timestamp):
+    """编译规则之前手写的 JsonProcessor._extract_row,作为对照"""
+    item_main = item.get('data', {}).get('item', {}).get('main', {})
+    ex_content = item_main.get('exContent', {})
+    click_param = item_main.get('clickParam', {}).get('args', {})
+
+    price_info = ex_content.get('price', [{'text': '0'}, {'text': '0'}])
+    price = float(price_info[1].get('text', '0'))
+
+    user_fish_shop_label = ex_content.get('userFishShopLabel', {}).get('tagList', [])
+    reviews_count = user_fish_shop_label[0].get('data', {}).get('content', '0条评价').replace(
+        '条评价', '') if user_fish_shop_label else '0'
+    good_rating = user_fish_shop_label[1].get('data', {}).get('content', '0%').replace(
+        '好评率', '') if len(user_fish_shop_label) > 1 else '0%'
+
+    want_count_content = ex_content.get('fishTags', {}).get('r3', {}).get('tagList', [{}])[0].get(
+        'data', {}).get('content', '0')
+
+    pic_url = ex_content.get('picUrl')
+    return (
+        ex_content.get('itemId'),
+        ex_content.get('title'),
+        price,
+        '',
+        pic_url,
+        timestamp,
+        timestamp,
+        int(click_param.get('publishTime', 0)),
+        click_param.get('cCatId'),
+        click_param.get('tbCatId'),
+        click_param.get('item_type'),
+        click_param.get('seller_id'),
+        ex_content.get('userNickName'),
+        ex_content.get('userAvatarUrl'),
+        None,
+        int(reviews_count) if reviews_count.isdigit() else 0,
+        good_rating,
+        want_count_content.replace('人想要', '') if '人想要' in want_count_content else '0',
+        'freeship' in (click_param.get('tag', '') or ''),
+        pic_url,
+        ex_content.get('area'),
+        ex_content.get('oriPrice', '').replace('¥', ''),
+        price,
+        keyword,
+        click_param.get('search_id'),
+        click_param.get('biz_type')
+    )
+
+
+FULL_ITEM = {'data': {'item': {'main': {
+    'exContent': {
+        'itemId': '7001',
+        'title': 'iPhone 13 256G 全新',
+        'price': [{'text': '¥'}, {'text': '3999.5'}],
+        'picUrl': 'https://img.alicdn.com/bao/uploaded/i1/7001.jpg',
+        'userNickName': '卖家',
+        'userAvatarUrl': 'https://img.alicdn.com/avatar.jpg',
+        'userFishShopLabel': {'tagList': [{'data': {'content': '35条评价'}}, {'data': {'content': '好评率99%'}}]},
+        'fishTags': {'r3': {'tagList': [{'data': {'content': '12人想要'}}]}},
+        'area': '杭州',
+        'oriPrice': '¥5999'
+    },
+    'clickParam': {'args': {
+        'publishTime': '1700000000000', 'cCatId': '50', 'tbCatId': '1512', 'item_type': 'normal',
+        'seller_id': '88', 'tag': 'freeship', 'search_id': 'q1', 'biz_type': 'goods'
+    }}
+}}}}
+
+
+def variant(change):
+    """复制 FULL_ITEM 并修改其 main 节点"""
+    item = copy.deepcopy(FULL_ITEM)
+    change(item['data']['item']['main'])
+    return item
+
+
+def drop(*path):
+    def change(node):
+        for key in path[:-1]:
+            node = node[key]
+        del node[path[-1]]
+    return change
+
+
+def replace(value, *path):
+    def change(node):
+        for key in path[:-1]:
+            node = node[key]
+        node[path[-1]] = value
+    return change
+
+
+# 手写映射能够处理的结构:两者的结果必须完全相同
+PARSEABLE = {
+    'full': FULL_ITEM,
+    'empty item': {},
+    'no main': {'data': {'item': {}}},
+    'no exContent': variant(drop('exContent')),
+    'no clickParam': variant(drop('clickParam')),
+    'clickParam without args': variant(replace({}, 'clickParam')),
+    'no publishTime': variant(drop('clickParam', 'args', 'publishTime')),
+    'tag None': variant(replace(None, 'clickParam', 'args', 'tag')),
+    'no tag': variant(drop('clickParam', 'args', 'tag')),
+    'no price': variant(drop('exContent', 'price')),
+    'price without text': variant(replace([{}, {}], 'exContent', 'price')),
+    'one shop label': variant(replace([{'data': {'content': '3条评价'}}], 'exContent', 'userFishShopLabel', 'tagList')),
+    'no shop labels': variant(replace([], 'exContent', 'userFishShopLabel', 'tagList')),
+    'shop labels without data': variant(replace([{}, {}], 'exContent', 'userFishShopLabel', 'tagList')),
+    'reviews not a number': variant(replace({'content': '很多条评价'}, 'exContent', 'userFishShopLabel', 'tagList', 0,
+                                            'data')),
+    'no fishTags': variant(drop('exContent', 'fishTags')),
+    'want count without suffix': variant(replace({'content': '热门'}, 'exContent', 'fishTags', 'r3', 'tagList', 0,
+                                                 'data')),
+    'no oriPrice': variant(drop('exContent', 'oriPrice')),
+    'itemId None': variant(replace(None, 'exContent', 'itemId')),
+}
+
+# 手写映射会抛出异常并跳过整个商品的结构:编译规则把形状不对或为None的节点视为不存在,
+# 结果与去掉该节点后手写映射的结果相同
+ODD_SHAPES = {
+    'main None': ({'data': {'item': {'main': None}}}, {'data': {'item': {}}}),
+    'main is a list': ({'data': {'item': {'main': []}}}, {'data': {'item': {}}}),
+    'clickParam None': (variant(replace(None, 'clickParam')), variant(drop('clickParam'))),
+    'args None': (variant(replace(None, 'clickParam', 'args')), variant(drop('clickParam', 'args'))),
+    'args is a string': (variant(replace('x', 'clickParam', 'args')), variant(drop('clickParam', 'args'))),
+    'publishTime None': (variant(replace(None, 'clickParam', 'args', 'publishTime')),
+                         variant(drop('clickParam', 'args', 'publishTime'))),
+    'price list too short': (variant(replace([{'text': '¥'}], 'exContent', 'price')),
+                             variant(drop('exContent', 'price'))),
+    'no want tags': (variant(replace([], 'exContent', 'fishTags', 'r3', 'tagList')),
+                     variant(drop('exContent', 'fishTags'))),
+    'oriPrice None': (variant(replace(None, 'exContent', 'oriPrice')), variant(drop('exContent', 'oriPrice'))),
+}
+
+
+def document(items, keyword='iphone'):
+    return {'data': {'resultInfo': {'sqiControlFields': {'userInputOriginalSearchKeywords': keyword}},
+                     'resultList': items}}
+
+
+@pytest.mark.parametrize('name', PARSEABLE)
+def test_compiled_spec_matches_hand_written_mapping(name):
+    item = PARSEABLE[name]
+    assert SCHEMA_V1.extractor(item, 'iphone', 'ts') == reference_row(item, 'iphone', 'ts')
+
+
+@pytest.mark.parametrize('name', ODD_SHAPES)
+def test_odd_shapes_fall_back_like_missing_fields(name):
+    item, missing = ODD_SHAPES[name]
+    with pytest.raises((AttributeError, IndexError, TypeError)):
+        reference_row(item, 'iphone', 'ts')
+    assert SCHEMA_V1.extractor(item, 'iphone', 'ts') == reference_row(missing, 'iphone', 'ts')
+
+
+def test_iter_rows_matches_hand_written_mapping_per_document():
+    items = list(PARSEABLE.values()) + [search_page('ipad', ['1', '2'], False)['data']['resultList'][0]]
+    rows = list(JsonProcessor.iter_rows(document(items)))
+
+    assert len(rows) == len(items)
+    timestamp = rows[0][ITEM_FIELDS.index('created_at')]
+    assert rows == [reference_row(item, 'iphone', timestamp) for item in items]
+
+
+def test_items_with_unconvertible_values_are_skipped():
+    bad = variant(replace([{}, {'text': '面议'}], 'exContent', 'price'))
+    with pytest.raises(ValueError):
+        reference_row(bad, 'iphone', 'ts')
+
+    rows = list(JsonProcessor.iter_rows(document([bad, FULL_ITEM])))
+    assert [row[0] for row in rows] == ['7001']
+
+
+def test_documents_without_items_or_keyword():
+    assert list(JsonProcessor.iter_rows({'data': {}})) == []
+    assert list(JsonProcessor.iter_rows(document([]))) == []
+    rows = list(JsonProcessor.iter_rows({'data': {'resultList': [FULL_ITEM]}}))
+    assert rows[0][ITEM_FIELDS.index('keyword')] == ''
+    assert detect_schema({'data': {}}) is None
+
+
+def test_compile_spec_rejects_unknown_fields():
+    spec = ExtractionSpec('test', ('items',), (), ('keyword',), (FieldSpec('no_such_field', ('x',)),))
+    with pytest.raises(ValueError, match='no_such_field'):
+        compile_spec(spec)
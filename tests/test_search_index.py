@@ -0,0 +1,112 @@
+import mongomock
+import pytest
+from database.mongodb import MongoDB
+from storage import search_index, sinks
+from storage.search_index import BLOCK_SIZE, PostingList, SearchIndex, decode_postings, encode_postings
+
+
+def item(item_id, title, price=10.0, location='杭州'):
+    return {'item_id': str(item_id), 'title': title, 'price': price, 'location': location}
+
+
+def ids(results):
+    return [result['item_id'] for result in results]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search_index.sqlite'))
+    yield index
+    index.close()
+
+
+@pytest.mark.parametrize('gap, typecode', [(1, 'B'), (255, 'B'), (256, 'H'), (70000, 'I'), (2 ** 33, 'Q')])
+def test_encode_postings_round_trip_for_each_width(gap, typecode):
+    doc_ids = [5, 6, 6 + gap, 7 + gap]
+    data = encode_postings(doc_ids)
+
+    assert chr(data[0]) == typecode
+    assert decode_postings(doc_ids[0], data) == doc_ids
+
+
+def test_encode_single_doc():
+    assert decode_postings(42, encode_postings([42])) == [42]
+
+
+def test_multi_block_intersection(index):
+    count = 10 * BLOCK_SIZE
+    titles = {i: ' '.join(['iphone'] + ['pro'] * (i % 3 == 0) + ['max'] * (i % 7 == 0)) for i in range(count)}
+    assert index.update([item(i, title) for i, title in titles.items()]) == count
+
+    expected = [str(i) for i in reversed(range(count)) if i % 21 == 0]
+    assert ids(index.search('iphone pro max', limit=count)) == expected
+    assert ids(index.search('max pro', limit=5)) == expected[:5]
+    assert len(PostingList(index.connection, 'iphone').firsts) == 10
+
+
+def test_intersect_with_no_candidates(index):
+    index.update([item(1, 'iphone')])
+    assert PostingList(index.connection, 'iphone').intersect([]) == []
+
+
+def test_price_and_location_filters(index):
+    index.update([
+        item(1, 'iPhone 13 全新', 3000.0, '杭州'),
+        item(2, 'iphone 13 二手', 1500.0, '上海'),
+        item(3, 'IPHONE13 配件', 50.0, '杭州'),
+        item(4, '华为 手机', 2000.0, '杭州')
+    ])
+
+    assert ids(index.search('iphone')) == ['3', '2', '1']
+    assert ids(index.search('iphone', min_price=100)) == ['2', '1']
+    assert ids(index.search('iphone', max_price=2000, location='杭州')) == ['3']
+    assert ids(index.search('', location='杭州', min_price=1000)) == ['4', '1']
+    assert index.search('iphone', max_price=1) == []
+    assert index.search('iphone', location='北京') == []
+
+
+def test_filter_first_with_empty_filter_result(index, monkeypatch):
+    monkeypatch.setattr(search_index, 'FILTER_FIRST_THRESHOLD', 2)
+    index.update([item(i, f"iphone {i}", 100.0 + i) for i in range(10)])
+
+    assert index.search('iphone', max_price=1) == []
+    assert ids(index.search('iphone', max_price=101)) == ['1', '0']
+
+
+def test_second_ingest_updates_index(index):
+    index.update([item(1, 'iphone 13'), item(2, 'iphone 14'), item(3, '华为 手机')])
+
+    # 标题变化的商品分配新的文档ID,只有价格变化时原地更新
+    assert index.update([item(1, 'iphone 15'), item(2, 'iphone 14', 5.0), item(3, '华为 手机'), item(4, 'iphone 13')]) == 2
+    assert len(index) == 4
+    assert ids(index.search('iphone 13')) == ['4']
+    assert ids(index.search('iphone')) == ['4', '1', '2']
+    assert index.search('iphone 14')[0]['price'] == 5.0
+
+    index.compact()
+    assert index.connection.execute('SELECT COUNT(*) FROM deleted').fetchone()[0] == 0
+    assert ids(index.search('iphone')) == ['4', '1', '2']
+
+
+def test_open_search_index_clears_index_when_collection_is_empty(tmp_path, monkeypatch):
+    path = str(tmp_path / 'search_index.sqlite')
+    monkeypatch.setattr(sinks, 'SEARCH_INDEX', True)
+    monkeypatch.setattr(sinks, 'SEARCH_INDEX_FILE', path)
+    db = MongoDB('', 'goofish_data', 'search_results', client=mongomock.MongoClient())
+    index = SearchIndex(path)
+    index.update([item(1, 'iphone')])
+    index.close()
+
+    db.insert_many([item(1, 'iphone')])
+    index = sinks.open_search_index(db)
+    assert len(index) == 1
+    index.close()
+
+    db.collection.drop()
+    index = sinks.open_search_index(db)
+    assert len(index) == 0
+    assert index.search('iphone') == []
+    index.close()
+
+    monkeypatch.setattr(sinks, 'SEARCH_INDEX', False)
+    assert sinks.open_search_index(db) is None
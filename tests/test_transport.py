@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from crawler.transport import HttpTransport, SearchRequest, TransportError
+from stubs import search_page
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """按服务器上预设的 (状态码, 响应体) 应答,并记录收到的请求体和请求头"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.server.requests.append((json.loads(self.rfile.read(length)), dict(self.headers)))
+        status, body = self.server.reply
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """在本地随机端口启动的HTTP桩服务"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.requests = []
+    server.reply = (200, b'{}')
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/search"
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def fetch(server, **kwargs):
+    return asyncio.run(HttpTransport(server.url, **kwargs).fetch(SearchRequest('iphone', 2, 10)))
+
+
+def test_successful_response_is_decoded(server):
+    page = search_page('iphone', ['1', '2'], True)
+    server.reply = (200, json.dumps(page).encode('utf-8'))
+
+    assert fetch(server, headers={'X-Sign': 'abc'}) == page
+    [(body, headers)] = server.requests
+    assert body == {'keyword': 'iphone', 'pageNumber': 2, 'rowsPerPage': 10}
+    assert headers['X-Sign'] == 'abc'
+    assert headers['Content-Type'] == 'application/json'
+
+
+@pytest.mark.parametrize('status, retryable', [
+    (408, True), (429, True), (500, True), (502, True), (503, True), (504, True),
+    (400, False), (403, False), (404, False)
+])
+def test_http_status_maps_to_retryable(server, status, retryable):
+    server.reply = (status, b'{}')
+
+    with pytest.raises(TransportError, match=f"HTTP {status}") as info:
+        fetch(server)
+    assert info.value.retryable is retryable
+
+
+def test_invalid_json_is_retryable(server):
+    server.reply = (200, b'<html>blocked</html>')
+
+    with pytest.raises(TransportError, match='Invalid JSON response') as info:
+        fetch(server)
+    assert info.value.retryable
+
+
+@pytest.mark.parametrize('ret', [['FAIL_SYS_USER_VALIDATE::哎哟喂,被挤爆啦'], ['RGV587_ERROR::SM']])
+def test_mtop_ret_error_in_http_200(server, ret):
+    server.reply = (200, json.dumps({'ret': ret, 'data': {}}).encode('utf-8'))
+
+    with pytest.raises(TransportError, match=f"API error for .*{ret[0].split('::')[0]}") as info:
+        fetch(server)
+    assert info.value.retryable
+
+
+def test_response_without_ret_is_accepted(server):
+    server.reply = (200, b'{"data": {"resultList": []}}')
+    assert fetch(server) == {'data': {'resultList': []}}
+
+
+def test_connection_refused_is_retryable(server):
+    url = server.url
+    server.shutdown()
+    server.server_close()
+
+    with pytest.raises(TransportError, match='Request failed') as info:
+        asyncio.run(HttpTransport(url, timeout=1.0).fetch(SearchRequest('iphone')))
+    assert info.value.retryable